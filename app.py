@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify
 import threading
+import json
 import sys
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -11,8 +12,20 @@ import tkinter as tk
 from tkinter import simpledialog
 from tkinter import ttk
 import tkinter.font as tkFont
-import requests
 from clicker import Clicker
+from signal_queue import SignalQueue, entry_deadline
+from notifier import Notifier
+from driver_actor import DriverActor, PLACE, SETTLE
+from tab_pool import CurrencyTabPool
+from session_pool import SessionPool, TradingSession
+from deal_tracker import DealTracker
+from trade_history import TradeHistory
+from market_tap import MarketTap
+from screenshot_archive import ScreenshotArchive
+from tracing import traced, tracer
+from correlation import last_stamp, stamp, trace_of
+from metrics import REGISTRY, Counter, Histogram
+import screenshot_logger
 from screenshot_logger import (
     capture_before_critical_operation,
     capture_after_critical_operation, 
@@ -28,178 +41,470 @@ logging.basicConfig(
 app = Flask(__name__)
 
 # Global variables 
-driver = None  
-clicker = None  
-telebot_response = None
 bid_value = 4
 cannary_bid = 0
-request_lock = threading.Lock()
-is_processing = False
 is_max_lose_set = False
 max_lose = 1000000000000
 session_gain = 0
 on_lost_logic = False
 loosing_bid_value = 12
 on_lost_count = -1
+# Sum of the bids of the deals open right now, in every session
+at_risk = 0
+# Guards session_gain, at_risk and the on-loss state, shared by all chains
+accounting_lock = threading.Lock()
 
-execution_data = {
-    'initial_bid': bid_value,
-    'bid_amount': 0,
-    'pay_out': "",
-    'action': "",
-    'bid_result': "",
-    'number_of_iterations': 0,
-    'bid_gain': ""
-}
-
-def initialize_driver():
-    """Initialize the WebDriver exactly as in original code"""
-    global driver
+# Pending signals, earliest entry_time first, drained by trading_worker
+ARM_GRACE_SECONDS = 30  # How long past entry_time a signal is still traded
+# An armed signal is taken by a worker (and prepared) this long before its
+# entry_time, until then the worker trades signals due earlier
+PREPARE_LEAD_SECONDS = 20
+# signal_id -> threading.Event, set by /fire once the entry time is reached
+# (and by /cancel, which also adds the signal to cancelled_signals)
+fire_events = {}
+cancelled_signals = set()
+# signal_id -> the signal's correlation trace (see correlation.py), until reported
+signal_traces = {}
+
+def forget_signal(signal_id, reason):
+    """Drop the state of a signal that left the queue without being traded."""
+    print("Signal", signal_id, "left the queue:", reason)
+    fire_events.pop(signal_id, None)
+    signal_traces.pop(signal_id, None)
+
+signal_queue = SignalQueue(maxsize=20, grace_seconds=ARM_GRACE_SECONDS, on_drop=forget_signal)
+# One Chrome per entry, each with its own user data dir (Chrome locks it)
+# logged in to the site. Signals that do not conflict trade in parallel
+DRIVER_PROFILES = [
+    ("Path to Your chrome userData", "Profile 1"),
+]
+# The browsers (driver, actor, Clicker, tabs) and the scheduler handing them signals
+session_pool = SessionPool(signal_queue)
+# Signals a session trades at once, on different assets in different tabs
+CHAINS_PER_SESSION = 1
+# Placed deals matched to their Closed rows, shared since all sessions see the same list
+deal_tracker = DealTracker()
+# Every Closed row any session read, with the bot's deal when it is one
+trade_history = TradeHistory("trade_history.jsonl")
+# Deals settled since then count towards /reconcile
+session_started_at = time.time()
+# Tabs with a currency already selected, for the most recently traded pairs
+CURRENCY_TABS = 4
+# (currency, is_otc) pairs to open tabs for at startup
+WARM_CURRENCY_TABS = []
+# Every screenshot frame, deduplicated and compressed, searchable by /screenshots
+screenshot_archive = ScreenshotArchive("screenshots", max_bytes=500 * 1024 * 1024, max_age=7 * 24 * 3600)
+# Oldest page snapshot /get-balance answers from, in seconds
+BALANCE_MAX_AGE = 10
+# Read balance, payouts and deal results from the site's websocket (Chrome
+# performance log) instead of the page while it streams, see market_tap.DECODERS
+MARKET_TAP = False
+# Trading-path metrics served by /metrics; recording takes no lock (see metrics.py)
+trigger_to_order_seconds = Histogram(
+    "moneybot_trigger_to_order_seconds", "Fire (or trigger) received to the first order placed")
+order_to_settlement_seconds = Histogram(
+    "moneybot_order_to_settlement_seconds", "Order placed to its result known", ["level"])
+clicker_method_seconds = Histogram(
+    "moneybot_clicker_method_seconds", "Duration of Clicker methods", ["method"])
+wait_timeouts_total = Counter(
+    "moneybot_wait_for_element_timeouts_total", "Element waits that timed out", ["selector"])
+deals_total = Counter("moneybot_deals_total", "Settled deals by result (win, loss, error)", ["result"])
+canary_trips_total = Counter("moneybot_canary_trips_total", "Bids stopped by the canary check")
+rejections_total = Counter("moneybot_rejections_total", "Signals rejected with 429", ["reason"])
+# Notifications to telebot, sent in the background so the bid loop never waits
+notifier = Notifier("http://localhost:5001")
+
+def record_span(span):
+    """Tracer listener: Clicker method durations and element wait timeouts."""
+    if span.name.startswith("Clicker."):
+        clicker_method_seconds.observe(span.duration, span.name[len("Clicker."):])
+        if span.attrs.get("timed_out"):
+            wait_timeouts_total.inc(span.attrs.get("selector"))
+
+tracer.listeners.append(record_span)
+
+def new_execution_data():
+    return {
+        'initial_bid': bid_value,
+        'bid_amount': 0,
+        'pay_out': "",
+        'action': "",
+        'bid_result': "",
+        'number_of_iterations': 0,
+        'bid_gain': ""
+    }
+
+def initialize_driver(user_data_dir, profile_directory, actor):
+    """
+    Initialize a WebDriver exactly as in original code.
     
+    Args:
+        user_data_dir: Chrome user data dir argument of this session
+        profile_directory: Chrome profile inside it
+        actor: DriverActor that will own the driver
+        
+    Returns:
+        The WebDriver, attached to actor
+    """
     print("Initializing WebDriver...")
     options = Options()
-    options.add_argument("Path to Your chrome userData")
-    options.add_argument("profile-directory=Profile 1")
+    options.add_argument(user_data_dir)
+    options.add_argument(f"profile-directory={profile_directory}")
     options.add_experimental_option("detach", True)
+    if MARKET_TAP:
+        # DevTools network events, websocket frames included, for MarketTap
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
     
     driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    actor.attach(driver)
     driver.get("Trading Website Url")
     driver.maximize_window()
     print("WebDriver initialized successfully")
+    return driver
+
+def initialize_sessions():
+    """Start one browser session per DRIVER_PROFILES entry and add it to the pool"""
+    for user_data_dir, profile_directory in DRIVER_PROFILES:
+        name = f"session-{len(session_pool.sessions) + 1}"
+        # Owns the WebDriver: every browser command runs on its thread, by priority
+        actor = DriverActor(name=f"{name}-driver")
+        driver = initialize_driver(user_data_dir, profile_directory, actor)
+        screenshot_logger.register_driver(driver, actor, archive=screenshot_archive, source=name)
+        session = init_clicker(name, driver, actor)
+        if MARKET_TAP:
+            market = MarketTap(driver)
+            if market.start():
+                session.clicker.market = market
+        if WARM_CURRENCY_TABS:
+            with actor.priority(PLACE):
+                session.tab_pool.warm(WARM_CURRENCY_TABS)
+        # Deals closed before the bot started are never taken for its own
+        session.clicker.baseline_closed_deals()
+        session_pool.add(session)
+        print(f"{name} ready ({profile_directory})")
     
-    # Now initialize the Clicker with our driver
-    init_clicker()
-    
-def init_clicker():
-    """Initialize the Clicker with the existing driver"""
-    global clicker, driver, bid_value, on_lost_logic, loosing_bid_value
-    
+def init_clicker(name, driver, actor):
+    """Initialize a Clicker with an existing driver and wrap both in a session"""
     print("Initializing Clicker...")
     clicker = Clicker(driver=driver)
+    tab_pool = CurrencyTabPool(clicker, capacity=CURRENCY_TABS)
     
     # Set the Clicker variables
     clicker.bid_value = bid_value
     clicker.on_lost_logic = on_lost_logic
     clicker.loosing_bid_value = loosing_bid_value
+    clicker.deals = deal_tracker
+    clicker.history = trade_history
     print("Clicker initialized successfully")
+    return TradingSession(name, driver, actor, clicker, tab_pool)
 
-def send_execution_data():
+def send_execution_data(chain):
     """
-    Sends the global execution_data dictionary to telebot's endpoint.
+    Queues a chain's execution data for telebot's endpoint.
     """
-    global execution_data
-    print(execution_data)
-    url = "http://localhost:5001/notify-results"
-    try:
-        response = requests.post(url, json=execution_data)
-        response.raise_for_status() 
-        print("Execution data sent successfully:", response.text)
-    except Exception as e:
-        print("Error sending execution data:", e)
-        
-    # Reset execution data
-    execution_data.clear()
-    execution_data = {
-        'initial_bid': bid_value,
-        'bid_amount': 0,
-        'pay_out': "",
-        'action': "",
-        'bid_result': "",
-        'number_of_iterations': 0,
-        'bid_gain': ""
-    }
+    print(chain.execution_data)
+    payload = dict(chain.execution_data, signal_id=chain.signal_id)
+    trace = stamp(chain.signal.get("trace"), "reported")
+    if trace is not None:
+        payload["trace"] = dict(trace, hops=list(trace["hops"]))
+    notifier.post("/notify-results", payload)
 
-@app.route('/trigger', methods=['POST'])
-def trigger():
-    global telebot_response, driver, is_processing, session_gain, max_lose
+def loss_limit_reached():
+    """
+    True once the session lost max_lose. Bids of open deals count as lost.
+    """
+    with accounting_lock:
+        return is_max_lose_set and session_gain - at_risk <= (-max_lose)
+
+def reserve_bid(x):
+    """
+    Count a bid about to be placed as at risk until release_bid. Every
+    martingale level of every chain reserves its bid, so chains running in
+    parallel can not together go past max_lose.
+    
+    Returns:
+        False (and nothing is reserved) if losing x on top of the losses so
+        far and the other bids at risk would go past max_lose
+    """
+    global at_risk
+    with accounting_lock:
+        if is_max_lose_set and at_risk + x - session_gain > max_lose:
+            return False
+        at_risk += x
+        return True
+
+def release_bid(x):
+    global at_risk
+    with accounting_lock:
+        at_risk -= x
+
+def add_gain(amount):
+    """Add amount (negative for a loss) to session_gain."""
+    global session_gain
+    with accounting_lock:
+        session_gain += amount
+
+def admit_signal(signal, fire_now):
+    """
+    Queue a signal for the trading worker.
     
-    # Check if the bot is already processing a request
-    if is_processing:
-        print("Already processing a request. Ignoring this one.")
-        return "Bot is busy with another request. Try again later.", 429
+    Args:
+        signal: Signal dict from telebot
+        fire_now: True to place the order as soon as the signal is prepared
         
+    Returns:
+        Tuple: (message, status_code)
+    """
     if is_max_lose_set:
-        print("session gained so far", session_gain, "max_lose is", -max_lose)
-        if session_gain <= (-max_lose):
+        print("session gained so far", session_gain, "at risk", at_risk, "max_lose is", -max_lose)
+        if loss_limit_reached():
             print("lost more then allowed, not proceeding")
-            driver.quit()
+            session_pool.quit_all()
+            rejections_total.inc("loss_limit")
             return "lost more then allowed, no more betting for today.", 429
-            
-    # Set processing flag to true and acquire the lock
-    if request_lock.acquire(blocking=False):
-        try:
-            is_processing = True
-            telebot_response = request.get_json()
-            print("Received telebot_response:", telebot_response)
-            # Start the main logic in a separate thread
-            threading.Thread(target=run_program_with_lock_release).start()
-            return "Triggered", 200
-        except Exception as e:
-            # Release the lock if something goes wrong
-            is_processing = False
-            request_lock.release()
-            return f"Error: {str(e)}", 500
-    else:
-        return "Bot is busy with another request. Try again later.", 429
+    
+    if not signal.get("signal_id"):
+        signal["signal_id"] = f"trigger-{time.time()}"
+    signal_id = signal["signal_id"]
+    
+    # A re-armed signal (e.g. after a telebot restart) that is already being traded
+    if session_pool.is_running(signal_id):
+        return "Already armed", 200
+    
+    fire_event = threading.Event()
+    if fire_now:
+        fire_event.set()
+    fire_events[signal_id] = fire_event
+    signal_traces[signal_id] = signal["trace"]
+    
+    deadline = entry_deadline(signal)
+    ready_at = deadline - PREPARE_LEAD_SECONDS if deadline is not None and not fire_now else None
+    accepted, reason = signal_queue.put(signal, ready_at=ready_at)
+    if not accepted:
+        print("Signal", signal_id, "dropped:", reason)
+        rejections_total.inc(reason)
+        if fire_events.get(signal_id) is fire_event:
+            del fire_events[signal_id]
+            signal_traces.pop(signal_id, None)
+        return f"Signal dropped: {reason}", 429
+    
+    print("Queued signal", signal_id, "queue depth:", signal_queue.stats()["depth"])
+    return "Queued", 200
+
+@app.route('/trigger', methods=['POST'])
+def trigger():
+    try:
+        signal = request.get_json()
+        print("Received telebot_response:", signal)
+        signal["trace"] = stamp(trace_of(signal, request.headers), "trigger_received")
+        message, status = admit_signal(signal, fire_now=True)
+        return ("Triggered", 200) if status == 200 else (message, status)
+    except Exception as e:
+        return f"Error: {str(e)}", 500
+
+@app.route('/arm', methods=['POST'])
+def arm():
+    """
+    Queue a signal ahead of its entry time. A worker picks it up
+    PREPARE_LEAD_SECONDS before the entry time (or when it is fired), then
+    selects the currency, reads the payout and prefills the bid amount; the
+    order itself is placed by /fire.
+    """
+    try:
+        signal = request.get_json()
+        print("Arming telebot_response:", signal)
+        signal["trace"] = stamp(trace_of(signal, request.headers), "arm_received")
+        return admit_signal(signal, fire_now=False)
+    except Exception as e:
+        return f"Error: {str(e)}", 500
+
+@app.route('/fire', methods=['POST'])
+def fire():
+    """Place the order of an armed signal (now, or as soon as it is prepared)."""
+    data = request.get_json(silent=True) or {}
+    fire_event = fire_events.get(data.get("signal_id"))
+    if fire_event is None:
+        print("Fire for", data.get("signal_id"), "but it is not armed")
+        return "Signal is not armed.", 404
+    trace = signal_traces.get(data.get("signal_id"))
+    if data.get("fire_sent_at"):
+        stamp(trace, "fire_sent", data["fire_sent_at"])
+    stamp(trace, "fire_received")
+    fire_event.set()
+    # Fired before its prepare time: a worker takes it now
+    signal_queue.release(data.get("signal_id"))
+    return "Fired", 200
+
+@app.route('/cancel', methods=['POST'])
+def cancel():
+    """Drop an armed signal, queued or prepared and waiting for /fire."""
+    data = request.get_json(silent=True) or {}
+    signal_id = data.get("signal_id")
+    fire_event = fire_events.get(signal_id)
+    if fire_event is None:
+        return "Signal is not armed.", 404
+    if signal_queue.remove(signal_id):
+        # forget_signal dropped its fire event and trace
+        print("Cancelled queued signal", signal_id)
+        return "Cancelled", 200
+    if fire_event.is_set():
+        return "Signal was already fired.", 409
+    # Being prepared or waiting for /fire: wake its worker, run_program drops
+    # it after preparing and execute_program before the first order
+    cancelled_signals.add(signal_id)
+    fire_event.set()
+    print("Cancelled armed signal", signal_id)
+    return "Cancelled", 200
+
+@app.route('/queue-stats', methods=['GET'])
+def queue_stats():
+    try:
+        stats = signal_queue.stats()
+        stats["pending"] = [signal.get("signal_id") for signal in signal_queue.pending()]
+        stats["running"] = session_pool.running()
+        stats["is_processing"] = bool(stats["running"])
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notifier-stats', methods=['GET'])
+def notifier_stats():
+    return jsonify(notifier.stats()), 200
+
+@app.route('/driver-stats', methods=['GET'])
+def driver_stats():
+    stats = session_pool.stats()
+    stats["deals"] = deal_tracker.stats()
+    stats["trade_history"] = trade_history.stats()
+    stats["screenshots"] = screenshot_logger.stats()
+    stats["screenshot_archive"] = screenshot_archive.stats()
+    return jsonify(stats), 200
+
+@app.route('/harvest-history', methods=['GET'])
+def harvest_history():
+    """Store every closed deal the site still lists in the trade history."""
+    try:
+        listed, added = session_pool.primary().clicker.harvest_closed_deals()
+        return jsonify({"listed": listed, "added": added, **trade_history.stats()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/reconcile', methods=['GET'])
+def reconcile():
+    """Compare session_gain with the site's results for the deals of this session."""
+    try:
+        site = trade_history.reconcile(since=session_started_at)
+        site["session_gain"] = session_gain
+        site["difference"] = round(session_gain - site["site_gain"], 2)
+        site["unmatched_deals"] = deal_tracker.abandoned
+        return jsonify(site), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/screenshots', methods=['GET'])
+def screenshots():
+    """
+    Archived screenshot records, newest first. Query parameters: operation,
+    since and until (epoch seconds), session and errors=1 for errors only.
+    """
+    try:
+        since = request.args.get("since", type=float)
+        until = request.args.get("until", type=float)
+        records = screenshot_archive.find(
+            operation=request.args.get("operation"), since=since, until=until,
+            source=request.args.get("session"), errors_only=request.args.get("errors") == "1",
+            limit=request.args.get("limit", 200, type=int),
+        )
+        for record in records:
+            if record["op"] == "frame":
+                record["path"] = screenshot_archive.blob_path(record["blob"])
+            else:
+                record["paths"] = [screenshot_archive.blob_path(blob) for blob in record["frames"]]
+        return jsonify(records), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/trace', methods=['GET'])
+def trace():
+    """
+    Recent tracing spans: Chrome trace-event JSON (load it in chrome://tracing
+    or Perfetto), or one span per line with format=jsonl.
+    """
+    if request.args.get("format") == "jsonl":
+        spans, _ = tracer.spans()
+        lines = (json.dumps(span.as_dict(), ensure_ascii=False, default=str) for span in spans)
+        return "\n".join(lines) + "\n", 200, {"Content-Type": "application/x-ndjson"}
+    return jsonify(tracer.chrome_trace()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Trading-path histograms and counters in the Prometheus text format."""
+    return REGISTRY.render(), 200, {"Content-Type": REGISTRY.CONTENT_TYPE}
 
 @app.route('/loss-limit', methods=['POST'])
 def loss_limit():   
-    global telebot_response, driver, is_processing, max_lose, is_max_lose_set
-    
-    # Check if the bot is already processing a request
-    if is_processing:
-        print("Already processing a request. Ignoring this one.")
-        return "Bot is busy with another request. Try again later.", 429
-    
-    if request_lock.acquire(blocking=False):
-        try:
-            is_processing = True
-            telebot_response = request.get_json()
-            print("Received telebot_response:", telebot_response)
-            # Set the loss limit
+    global max_lose, is_max_lose_set
+    try:
+        data = request.get_json()
+        print("Received telebot_response:", data)
+        # Set the loss limit; chains running right now check it before their next signal
+        with accounting_lock:
             is_max_lose_set = True
-            max_lose = int(telebot_response["limit"])
-            is_processing = False
-            if request_lock.locked():
-                request_lock.release()
-            return f"Limited losses to {max_lose}", 200
-        except Exception as e:
-            # Release the lock if something goes wrong
-            is_processing = False
-            request_lock.release()
-            return f"Error: {str(e)}", 500
-    else:
-        return "Bot is busy with another request. Try again later.", 429 
+            max_lose = int(data["limit"])
+        return f"Limited losses to {max_lose}", 200
+    except Exception as e:
+        return f"Error: {str(e)}", 500
 
-def run_program_with_lock_release():
-    global is_processing
-    try:
-        # Run the actual program
-        run_program()
-    finally:
-        send_execution_data()
-        # Make sure to release the lock and reset the flag when done
-        is_processing = False
-        if request_lock.locked():
-            request_lock.release()
+def trading_worker(session):
+    """
+    Consumer of signal_queue for one session: trades one signal at a time,
+    earliest entry deadline first, skipping signals that conflict with a
+    chain running in another session.
+    
+    Args:
+        session: TradingSession this worker trades with
+    """
+    screenshot_logger.bind_driver(session.driver)
+    while True:
+        chain = session_pool.next_chain(session)
+        signal_id = chain.signal_id
+        try:
+            if loss_limit_reached():
+                print("lost more then allowed, dropping signal", signal_id)
+                signal_queue.note_drop("loss_limit")
+                continue
+            
+            chain.execution_data = new_execution_data()
+            stamp(chain.signal.get("trace"), "dequeued")
+            print("Processing signal", signal_id, "on", session.name, "waited", signal_queue.stats()["wait_seconds"]["last"], "seconds")
+            try:
+                run_program(chain, fire_events.get(signal_id))
+            finally:
+                send_execution_data(chain)
+        finally:
+            fire_events.pop(signal_id, None)
+            signal_traces.pop(signal_id, None)
+            cancelled_signals.discard(signal_id)
+            session_pool.finish(chain)
         
 @app.route('/test', methods=['GET'])
 def test():
-    global telebot_response, clicker
     threading.Thread(target=test_feature).start()
     return "tested", 200
 
 @app.route('/kill', methods=['GET'])
 def kill():
-    global driver
-    driver.quit()
+    # Ahead of anything queued for the browsers
+    session_pool.quit_all()
     return "bot session killed due to user request", 200
 
 @app.route('/get-balance', methods=['GET'])
 def get_balance():
-    global clicker
     try:
-        x = clicker.get_current_balance()
+        # The balance is the account's, any session can read it. Mid-trade
+        # the trading thread keeps the snapshot fresh, so this rarely needs
+        # the driver
+        x = session_pool.primary().clicker.get_current_balance(max_age=BALANCE_MAX_AGE)
         # Return the balance in a JSON response
         return jsonify({"session_gain": x}), 200
     except Exception as e:
@@ -208,7 +513,6 @@ def get_balance():
     
 @app.route('/get-current-gain', methods=['GET'])
 def get_current_gain():
-    global session_gain
     try:
         # Return the gain in a JSON response
         return jsonify({"session_gain": session_gain}), 200
@@ -217,60 +521,63 @@ def get_current_gain():
         return jsonify({"error": str(e)}), 500
 
 def test_feature():
-    global clicker
     # Test whatever feature you need to test
-    clicker.get_current_balance()
+    session_pool.primary().clicker.get_current_balance()
 
-def initial_script():
-    global clicker, telebot_response
-    capture_before_critical_operation("initial_script")
+def get_currency(chain):
+    """
+    Returns:
+        Tuple: (currency, is_otc) of the chain's signal
+    """
+    signal = chain.signal
+    # Get the currency from the signal - keep original spelling
+    currency = signal.get("currancy")
+    if not currency:
+        error_msg = "Currency not provided in telebot_response. Exiting program."
+        print(error_msg)
+        capture_error_state(error_msg, "initial_script")
+        sys.exit("Missing currency in telebot_response")
     
-    try:
-        clicker.open_currency_component()
-        time.sleep(1)
-        
-        # Get the currency from telebot_response - keep original spelling
-        currency = telebot_response.get("currancy")
-        if not currency:
-            error_msg = "Currency not provided in telebot_response. Exiting program."
-            print(error_msg)
-            capture_error_state(error_msg, "initial_script")
-            sys.exit("Missing currency in telebot_response")
-        
-        # Check if we should look for OTC option - match original logic
+    # Check if we should look for OTC option - match original logic
+    is_otc = True
+    if "is_otc" not in signal:
+        is_otc = True
+    elif signal.get("is_otc") is True:
         is_otc = True
-        if "is_otc" not in telebot_response:
-            is_otc = True
-        elif telebot_response.get("is_otc") is True:
-            is_otc = True
-        else:
-            is_otc = False
+    else:
+        is_otc = False
+    return currency, is_otc
+
+@traced()
+def initial_script(chain):
+    capture_before_critical_operation("initial_script")
+    try:
+        currency, is_otc = get_currency(chain)
         
-        flag = clicker.set_currency(currency, is_otc)
+        # Switches to a tab that already shows the currency when there is one
+        flag = chain.session.tab_pool.select(currency, is_otc)
         if not flag:
             print("251 flag is ",flag, "  returning false")
             return False
-        time.sleep(2)
-        clicker.refresh_page()
         
         capture_after_critical_operation("initial_script", success=True)
+        return True
     except Exception as e:
         error_msg = f"Error in initial script: {str(e)}"
         print(error_msg)
         capture_error_state(error_msg, "initial_script")
+        return False
 
-def get_levels():
-    global telebot_response
-    levels = telebot_response.get("levels")
+def get_levels(chain):
+    levels = chain.signal.get("levels")
     if not levels:
         print("Levels not provided in telebot_response. Exiting program.")
         sys.exit("Missing levels in telebot_response")
     print("Using levels:", levels)
     return levels
     
-def get_actions():
-    global telebot_response
-    action = telebot_response.get("action")
+def get_actions(chain):
+    action = chain.signal.get("action")
     if not action:
         print("Action not provided in telebot_response. Exiting program.")
         sys.exit("Missing action in telebot_response")
@@ -279,11 +586,13 @@ def get_actions():
 
 def get_bid_amount():
     global bid_value, on_lost_logic, loosing_bid_value, on_lost_count
-    print("on loss logic is:", on_lost_logic, "loosing bid value is:", loosing_bid_value, "onlost count is:", on_lost_count)
-    if on_lost_logic and (on_lost_count < 0):
+    with accounting_lock:
+        lost_logic, lost_count = on_lost_logic, on_lost_count
+    print("on loss logic is:", lost_logic, "loosing bid value is:", loosing_bid_value, "onlost count is:", lost_count)
+    if lost_logic and (lost_count < 0):
         print("on_lost_logic and (on_lost_count < 0):")
         return bid_value
-    elif on_lost_logic and (on_lost_count > 0):
+    elif lost_logic and (lost_count > 0):
         print("elif on_lost_logic and (on_lost_count > 0):")
         return loosing_bid_value
     else:
@@ -292,7 +601,9 @@ def get_bid_amount():
     
 def compare_x_to_cannary(to_comp):
     global bid_value, on_lost_logic, loosing_bid_value
-    if on_lost_logic:
+    with accounting_lock:
+        lost_logic = on_lost_logic
+    if lost_logic:
         if to_comp > (loosing_bid_value * 16):
             return 1
         else: 
@@ -303,8 +614,8 @@ def compare_x_to_cannary(to_comp):
         else: 
             return 0
 
-def set_execution_data(bid_amount, pay_out, action, bid_result, number_of_iterations, bid_gain):
-    global execution_data
+def set_execution_data(chain, bid_amount, pay_out, action, bid_result, number_of_iterations, bid_gain):
+    execution_data = chain.execution_data
     execution_data["bid_amount"] = bid_amount
     execution_data["pay_out"] = str(pay_out)
     execution_data["action"] = action
@@ -313,135 +624,238 @@ def set_execution_data(bid_amount, pay_out, action, bid_result, number_of_iterat
     if execution_data["bid_gain"] == "":
         execution_data["bid_gain"] = str(bid_gain)
 
-def handle_cannary_error(bidval, payOut, action, iterations):
-    global driver
-    set_execution_data(bidval, payOut, action, "ERROR_X_GT_MAX_VALUE", iterations, "")
+def handle_cannary_error(chain, bidval, payOut, action, iterations):
+    canary_trips_total.inc()
+    set_execution_data(chain, bidval, payOut, action, "ERROR_X_GT_MAX_VALUE", iterations, "")
     print("x > cannary_Bid this is a severe error that occurred shutting down to prevent money loss")
     time.sleep(10)
-    driver.quit()
+    chain.session.quit()
 
-def handle_winning_bid(bidval, payOut, action, iterations):
-    global clicker, session_gain, on_lost_logic, on_lost_count, execution_data
-    set_execution_data(bidval, payOut, action, "win", iterations, "")
-    bid_gain_str = execution_data["bid_gain"]
+def handle_winning_bid(chain, bidval, payOut, action, iterations):
+    global on_lost_logic, on_lost_count
+    set_execution_data(chain, bidval, payOut, action, "win", iterations, "")
+    bid_gain_str = chain.execution_data["bid_gain"]
     # Remove the currency symbol (₪) and any extra spaces
     bid_gain_clean = bid_gain_str.replace("₪", "").strip()
-    session_gain += float(bid_gain_clean)
-    session_gain -= bidval
-    if on_lost_logic:
-        on_lost_count -= 1
-        if on_lost_count <= 0:
-            on_lost_logic = False
-            on_lost_count = -1
-    clicker.refresh_page()
+    add_gain(float(bid_gain_clean) - bidval)
+    with accounting_lock:
+        if on_lost_logic:
+            on_lost_count -= 1
+            if on_lost_count <= 0:
+                on_lost_logic = False
+                on_lost_count = -1
+    with chain.clicker.page_lock:
+        chain.clicker.refresh_page()
     print("Nice Win!")
     
-def handle_error_bid(bidval, payOut, action, iterations):
-    global clicker
-    set_execution_data(bidval, payOut, action, "ERROR", iterations, "")
-    clicker.refresh_page()
+def handle_error_bid(chain, bidval, payOut, action, iterations):
+    set_execution_data(chain, bidval, payOut, action, "ERROR", iterations, "")
+    with chain.clicker.page_lock:
+        chain.clicker.refresh_page()
     print("Error happened!")
 
-def handle_losing_deal(bidval, payOut, action, iterations):
-    global clicker, on_lost_logic, on_lost_count, session_gain
+def handle_losing_deal(chain, bidval, payOut, action, iterations):
+    global on_lost_logic, on_lost_count
     print("in handle losing deal")
-    set_execution_data(bidval, payOut, action, "LOSE", iterations, "")
-    on_lost_logic = True
-    on_lost_count = 5  # Keep as 5 from original
-    session_gain -= bidval
-    clicker.refresh_page()
+    set_execution_data(chain, bidval, payOut, action, "LOSE", iterations, "")
+    with accounting_lock:
+        on_lost_logic = True
+        on_lost_count = 5  # Keep as 5 from original
+    add_gain(-bidval)
+    with chain.clicker.page_lock:
+        chain.clicker.refresh_page()
     print("you lost")
 
-def run_program():
-    global telebot_response, clicker, bid_value, execution_data, session_gain, on_lost_logic, loosing_bid_value, on_lost_count
+@traced()
+def prepare_program(chain):
+    """
+    Everything that happens before the first order: currency selection, payout
+    check and setting the first bid amount.
     
-    try:
-        capture_before_critical_operation("run_program")
-        
-        # Update clicker with the latest values
-        clicker.bid_value = bid_value
-        clicker.on_lost_logic = on_lost_logic
-        clicker.loosing_bid_value = loosing_bid_value
-        
-        is_first_run = True
-        if is_first_run:
-            flag = initial_script()
-            if not flag:
-                set_execution_data(0, "", "no action taken", "unable to set currency", 0, 0)
-                capture_after_critical_operation("run_program", success=True)
-                return
-            is_first_run = False
+    Args:
+        chain: Chain of the signal, in its session
     
-        pay_out = clicker.get_payout_value()
-        if pay_out < 75:
-            set_execution_data(0, str(pay_out), "no action taken", "no bid no result", 0, 0)
-            capture_after_critical_operation("run_program", success=True)
-            return
+    Returns:
+        (pay_out, action, x) if the signal should be traded, None otherwise
+    """
+    clicker = chain.clicker
     
-        action = get_actions()
-        x = get_bid_amount()
-        iterations = 0
+    # Update clicker with the latest values
+    clicker.bid_value = bid_value
+    clicker.on_lost_logic = on_lost_logic
+    clicker.loosing_bid_value = loosing_bid_value
     
-        for i in range(4):
-            iterations = i
-            if compare_x_to_cannary(x) == 1:
-                handle_cannary_error(x, pay_out, action, iterations)
-                capture_error_state(f"Cannary error with bid value: {x}", "run_program")
-                return
-        
-            if not clicker.make_bid(x, action):
-                handle_error_bid(x, pay_out, action, iterations)
-                capture_error_state("Make bid failed", "run_program")
-                return
+    flag = initial_script(chain)
+    if not flag:
+        set_execution_data(chain, 0, "", "no action taken", "unable to set currency", 0, 0)
+        return None
+
+    pay_out = clicker.get_payout_value()
+    if pay_out is None or pay_out < 75:
+        set_execution_data(chain, 0, str(pay_out), "no action taken", "no bid no result", 0, 0)
+        return None
+
+    action = get_actions(chain)
+    x = get_bid_amount()
+    
+    if compare_x_to_cannary(x) == 1:
+        handle_cannary_error(chain, x, pay_out, action, 0)
+        capture_error_state(f"Cannary error with bid value: {x}", "prepare_program")
+        return None
+    if not clicker.prepare_bid(x):
+        handle_error_bid(chain, x, pay_out, action, 0)
+        capture_error_state("Prepare bid failed", "prepare_program")
+        return None
+    
+    return pay_out, action, x
+
+@traced()
+def execute_program(chain, pay_out, action, x):
+    """
+    Run the martingale loop of a prepared signal.
+    
+    Args:
+        chain: Chain of the signal, in its session
+        pay_out: Payout read during preparation
+        action: "Buy" or "Sell"
+        x: First bid amount, already set in the page by prepare_program
+    """
+    clicker = chain.clicker
+    actor = chain.session.actor
+    currency, is_otc = get_currency(chain)
+    
+    iterations = 0
+
+    for i in range(4):
+        iterations = i
+        if i == 0 and chain.signal_id in cancelled_signals:
+            print("Signal was cancelled before its first order, dropping it")
+            set_execution_data(chain, 0, str(pay_out), "no action taken", "cancelled", 0, 0)
+            return
+        if compare_x_to_cannary(x) == 1:
+            handle_cannary_error(chain, x, pay_out, action, iterations)
+            capture_error_state(f"Cannary error with bid value: {x}", "run_program")
+            return
+    
+        # Counts against the loss limit of every other chain until settled
+        if not reserve_bid(x):
+            print(f"Bid of {x} would go past max_lose {max_lose}, stopping the chain")
+            set_execution_data(chain, x, pay_out, action, "loss limit reached", iterations, "")
+            capture_after_critical_operation("run_program", success=True)
+            return
+        try:
+            # Other chains of the session stay off the page until the deal is
+            # placed in this chain's currency tab. Only the first level can
+            # use the amount set while arming. The whole placement runs as
+            # one job on the session's driver actor
+            with clicker.page_lock:
+                placed = (chain.session.tab_pool.ensure(currency, is_otc)
+                          and actor.call(PLACE, clicker.make_bid, x, action, prefilled=(i == 0), owner=chain.signal_id))
+                if not placed:
+                    handle_error_bid(chain, x, pay_out, action, iterations)
+                    capture_error_state("Make bid failed", "run_program")
+                    return
+                stamp(chain.signal.get("trace"), f"order_placed_{i + 1}")
+                if i == 0:
+                    fired_at = last_stamp(chain.signal.get("trace"), "fire_received", "trigger_received")
+                    if fired_at is not None:
+                        trigger_to_order_seconds.observe(time.time() - fired_at)
                 
-            sleep_time = clicker.validate_sleep_time()
-        
-            if not sleep_time:
-                error_msg = "No sleep time returned, shutting down"
-                print(error_msg)
-                capture_error_state(error_msg, "run_program")
-                driver.quit()
-                return
+                deal = clicker.deals.last(chain.signal_id)
+                if deal["expires_at"] is None:
+                    sleep_time = clicker.validate_sleep_time()
+                
+                    if not sleep_time:
+                        error_msg = "No sleep time returned, shutting down"
+                        print(error_msg)
+                        capture_error_state(error_msg, "run_program")
+                        chain.session.quit()
+                        return
+                    clicker.deals.set_expiry(deal, sleep_time)
             
-            time.sleep(sleep_time)
-            result = clicker.get_bid_result()
+            # Returns as soon as the Closed list shows this deal
+            result = clicker.settle_deal(deal)
+            stamp(chain.signal.get("trace"), f"settled_{i + 1}")
+            order_to_settlement_seconds.observe(time.time() - deal["opened_at"], str(i + 1))
+            deals_total.inc({0: "win", 1: "loss"}.get(result, "error"))
             
             if result == 0:
-                handle_winning_bid(x, pay_out, action, iterations)
+                handle_winning_bid(chain, x, pay_out, action, iterations)
                 capture_after_critical_operation("run_program", success=True)
                 return
             if result == -1:
-                handle_error_bid(x, pay_out, action, iterations)
+                handle_error_bid(chain, x, pay_out, action, iterations)
                 capture_error_state("Bid result returned -1 (error)", "run_program")
                 return
             
-            session_gain -= x
-            notify_lost_bid(x)  # Using original direct function call
-            x *= 2
-            
-        handle_losing_deal(x, pay_out, action, 4)
-        capture_after_critical_operation("run_program", success=True)
+            add_gain(-x)
+        finally:
+            release_bid(x)
+        notify_lost_bid(x, chain.signal_id)  # Using original direct function call
+        x *= 2
+        
+    handle_losing_deal(chain, x, pay_out, action, 4)
+    capture_after_critical_operation("run_program", success=True)
+
+@traced()
+def run_program(chain, fire_event=None):
+    """
+    Prepare a signal right away, then wait for fire_event (or for the entry
+    time to pass) before placing the first order.
+    
+    Args:
+        chain: Chain of the signal, in its session
+        fire_event: threading.Event set by /fire, None to fire immediately
+    """
+    actor = chain.session.actor
+    tracer.annotate(signal=chain.signal_id, session=chain.session.name)
+    try:
+        capture_before_critical_operation("run_program")
+        
+        # Browser commands of the arm phase run at placement priority, those
+        # of the martingale loop (countdown and result reads) at settlement
+        with actor.priority(PLACE), chain.clicker.page_lock:
+            prepared = prepare_program(chain)
+        if prepared is None:
+            capture_after_critical_operation("run_program", success=True)
+            return
+        stamp(chain.signal.get("trace"), "prepared")
+        pay_out, action, x = prepared
+        
+        if fire_event is not None and not fire_event.is_set():
+            print("Signal armed, waiting for fire")
+            deadline = entry_deadline(chain.signal)
+            remaining = deadline - time.time() if deadline is not None else 0
+            if not fire_event.wait(max(0, remaining) + ARM_GRACE_SECONDS):
+                print("Armed signal was never fired, dropping it")
+                set_execution_data(chain, 0, str(pay_out), "no action taken", "armed signal expired", 0, 0)
+                capture_after_critical_operation("run_program", success=True)
+                return
+        
+        # /cancel sets the fire event, also while the signal is being prepared
+        if chain.signal_id in cancelled_signals:
+            print("Armed signal was cancelled, dropping it")
+            set_execution_data(chain, 0, str(pay_out), "no action taken", "cancelled", 0, 0)
+            capture_after_critical_operation("run_program", success=True)
+            return
+        
+        with actor.priority(SETTLE):
+            execute_program(chain, pay_out, action, x)
     except Exception as e:
         error_msg = f"Error in run_program: {str(e)}"
         print(error_msg)
         capture_error_state(error_msg, "run_program")
-        set_execution_data(0, "0", "error", f"EXCEPTION: {str(e)}", 0, "0")
+        set_execution_data(chain, 0, "0", "error", f"EXCEPTION: {str(e)}", 0, "0")
 
-def notify_lost_bid(bid_value):
+def notify_lost_bid(bid_value, signal_id=None):
     """
-    Sends a notification about a lost bid by calling the /notify-lost endpoint.
+    Queues a notification about a lost bid for the /notify-lost endpoint.
     
     Args:
         bid_value: The value of the lost bid.
+        signal_id: Signal of the chain, telebot groups its messages by it
     """
-    url = "http://localhost:5001/notify-lost"
-    payload = {"bid_value": bid_value}
-    response = requests.post(url, json=payload)
-    
-    if response.status_code == 200:
-        print("Notification sent successfully:", response.json())
-    else:
-        print("Failed to send notification:", response.text)
+    notifier.post("/notify-lost", {"bid_value": bid_value, "signal_id": signal_id})
 
 if __name__ == '__main__':
     try:
@@ -465,9 +879,19 @@ if __name__ == '__main__':
             except Exception as e:
                 print(f"Error getting user input: {e}")
         
+        restored = trade_history.load()
+        print("Trade history:", restored, "closed deals")
+        print("Screenshot archive:", screenshot_archive.load(), "records")
+        tracer.start_writer("traces.jsonl")
+        
         # Initialize the driver exactly as in original code
         print("Initializing WebDriver...")
-        initialize_driver()
+        initialize_sessions()
+        
+        # CHAINS_PER_SESSION trading workers per session, together they drain the signal queue
+        for session in session_pool.sessions:
+            for worker in range(CHAINS_PER_SESSION):
+                threading.Thread(target=trading_worker, args=(session,), name=f"{session.name}-worker-{worker + 1}", daemon=True).start()
         
         # Now that the user has provided a number, start the Flask server
         print("Starting Flask server on port 5000...")
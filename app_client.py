@@ -0,0 +1,99 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Per endpoint (read timeout in seconds, concurrent calls). Endpoints that wait
+# on the WebDriver get long timeouts and one call at a time.
+DEFAULT_LIMITS = (10, 4)
+ENDPOINT_LIMITS = {
+    "/arm": (10, 4),
+    "/fire": (5, 4),
+    "/cancel": (5, 2),
+    "/trigger": (10, 2),
+    "/get-balance": (60, 1),
+    "/get-current-gain": (10, 2),
+    "/kill": (30, 1),
+    "/test": (60, 1),
+    "/loss-limit": (10, 1),
+    "/queue-stats": (5, 2),
+}
+CONNECT_TIMEOUT = 3
+# Endpoints with threads (and connections) of their own, so slow calls to the
+# other endpoints can never hold every worker while a signal is armed or fired
+URGENT_ENDPOINTS = ("/arm", "/fire")
+
+
+class AppClient:
+    """
+    Async client for the trading bot (app.py) used from the Telethon loop.
+
+    Calls run on a small thread pool over one keep-alive requests.Session, so
+    a slow endpoint never blocks the event loop. Every endpoint has its own
+    timeout and concurrency limit (ENDPOINT_LIMITS), and URGENT_ENDPOINTS
+    run on a separate pool sized to their limits.
+    """
+
+    def __init__(self, base_url="http://localhost:5000", max_workers=8):
+        """
+        Args:
+            base_url: Base URL of the trading bot
+            max_workers: Threads (and pooled connections) for requests to
+                the endpoints other than URGENT_ENDPOINTS
+        """
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        urgent_workers = sum(ENDPOINT_LIMITS.get(path, DEFAULT_LIMITS)[1] for path in URGENT_ENDPOINTS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers + urgent_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="app-client")
+        self._urgent_executor = ThreadPoolExecutor(
+            max_workers=urgent_workers, thread_name_prefix="app-client-urgent"
+        )
+        self._semaphores = {}
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, json=None, **kwargs):
+        return await self.request("POST", path, json=json, **kwargs)
+
+    async def request(self, method, path, **kwargs):
+        """
+        Send a request to the trading bot without blocking the loop.
+
+        Args:
+            method: HTTP method
+            path: Endpoint path, e.g. "/arm"
+            **kwargs: Passed to requests.Session.request
+
+        Returns:
+            requests.Response
+
+        Raises:
+            requests.RequestException: On connection errors and timeouts
+        """
+        read_timeout, _ = ENDPOINT_LIMITS.get(path, DEFAULT_LIMITS)
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, read_timeout))
+        url = self.base_url + path
+        executor = self._urgent_executor if path in URGENT_ENDPOINTS else self._executor
+        async with self._semaphore(path):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor, lambda: self.session.request(method, url, **kwargs)
+            )
+
+    def _semaphore(self, path):
+        # Created lazily so they belong to the loop that uses them
+        semaphore = self._semaphores.get(path)
+        if semaphore is None:
+            _, limit = ENDPOINT_LIMITS.get(path, DEFAULT_LIMITS)
+            semaphore = self._semaphores[path] = asyncio.Semaphore(limit)
+        return semaphore
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._urgent_executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,93 @@
+"""
+Messages/sec of the old regex cascade vs signal_parser.
+
+Checks that both parsers give identical output on every sample first, then
+times them. Run from the repository root:
+
+    python benchmarks/bench_signal_parser.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from signal_parser import parse_signal, parse_whatsapp_message
+from legacy_signal_parser import legacy_parse_signal, legacy_parse_whatsapp_message
+
+SAMPLES = {
+    "hebrew": (
+        "🇪🇺 EUR/USD OTC\n"
+        "⏱ תוקף: 5M\n"
+        "🔴 למטה\n"
+        "כניסה בשעה 14:30\n"
+        "רמה 1️⃣ בשעה 14:35\n"
+        "רמה 2️⃣ בשעה 14:40\n"
+        "רמה 3️⃣ בשעה 14:45"
+    ),
+    "english": (
+        "💰 AUD/CAD OTC\n"
+        "⌛️ Expiration 5M\n"
+        "⏺️ Entry at 14:30\n"
+        "🟩 BUY\n\n"
+        "Martingale levels\n"
+        "1️⃣ level at 14:35\n"
+        "2️⃣ level at 14:40\n"
+        "3️⃣ level at 14:45"
+    ),
+    "whatsapp": (
+        "📱 WhatsApp Message:\n\n"
+        "Litecoin OTC\n"
+        "תפוגה 5M\n"
+        "🟢 קנה\n"
+        "כניסה בשעה 14:30\n"
+        "רמה 1 בשעה 14:35\n"
+        "רמה 2 בשעה 14:40"
+    ),
+    "chatter": "Good morning everyone! Yesterday was a great day, 8 wins out of 10 🚀",
+    "long_chatter": ("Market recap: " + "the EURUSD trend held at the level we discussed " * 80)[:4000],
+    # One long run of letters: the old pair regex backtracks over it from every position
+    "letter_run": "GBPUSD" * 600 + " / check",
+}
+
+
+def parse_new(name, text):
+    if name == "whatsapp":
+        return parse_whatsapp_message(text)
+    return parse_signal(text, "bench", -5, "UTC+7")
+
+
+def parse_legacy(name, text):
+    if name == "whatsapp":
+        return legacy_parse_whatsapp_message(text)
+    return legacy_parse_signal(text, "bench", -5, "UTC+7")
+
+
+def messages_per_second(parse, name, text, min_seconds=0.5):
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            parse(name, text)
+        count += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return count / elapsed
+
+
+def main():
+    for name, text in SAMPLES.items():
+        if parse_new(name, text) != parse_legacy(name, text):
+            print(f"MISMATCH on {name}:\n  new:    {parse_new(name, text)}\n  legacy: {parse_legacy(name, text)}")
+            return 1
+
+    print(f"{'format':<14}{'before msg/s':>14}{'after msg/s':>14}{'speedup':>10}")
+    for name, text in SAMPLES.items():
+        before = messages_per_second(parse_legacy, name, text)
+        after = messages_per_second(parse_new, name, text)
+        print(f"{name:<14}{before:>14,.0f}{after:>14,.0f}{after / before:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
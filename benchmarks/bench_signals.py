@@ -0,0 +1,215 @@
+"""
+Signal-parsing benchmark suite driven by benchmarks/signal_corpus.jsonl.
+
+The corpus holds real-shaped messages per format (hebrew, english, whatsapp
+and non-signal chatter, which is most of the traffic) together with the
+output extract_data is expected to give for them. For every format the suite
+checks that output, then times each function on the message path:
+
+    maybe_reverse   - run twice per message (handler and extract_data)
+    extract         - extract_data's parse path: source lookup + grammar
+    whatsapp        - parse_whatsapp_message (whatsapp format only)
+    format          - format_bid_message on the complete signals
+
+and reports throughput and p50/p99 latency. Results are compared with
+benchmarks/signal_baseline.json and the run fails on a regression. Timings
+are machine specific: record a new baseline when the machine changes.
+
+    python benchmarks/bench_signals.py             # run and check against the baseline
+    python benchmarks/bench_signals.py --record    # record a new baseline
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from signal_parser import maybe_reverse, parse_whatsapp_message, format_bid_message, WHATSAPP_HEADER
+from signal_sources import default_registry
+
+CORPUS_PATH = os.path.join(BENCH_DIR, "signal_corpus.jsonl")
+BASELINE_PATH = os.path.join(BENCH_DIR, "signal_baseline.json")
+# Latencies of a microsecond or two are mostly timer noise, never flag those
+LATENCY_SLACK_US = 1.0
+# --record keeps the median of this many runs
+RECORD_RUNS = 3
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def make_extract(registry):
+    def extract(message):
+        # group_message_handler and extract_data both call maybe_reverse
+        processed_text = maybe_reverse(maybe_reverse(message["text"]))
+        if processed_text.strip().startswith(WHATSAPP_HEADER):
+            data = registry.sources["whatsapp"].parse(processed_text, message["chat_title"])
+            if data and data["currancy"] is not None:
+                return data
+        source = registry.resolve(message["chat_id"], message["chat_title"])
+        return source.parse(processed_text, message["chat_title"])
+    return extract
+
+
+def is_complete(data):
+    return bool(data and data.get("currancy") is not None and data.get("action") is not None
+                and data.get("bid_wait_time") is not None and data.get("levels", 0) > 0
+                and data.get("entry_time") is not None)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(function, messages, rounds, repeats=5):
+    """
+    Time function over every message, rounds times. The whole run is repeated
+    and the fastest repeat is kept, which filters out scheduler noise.
+
+    Returns:
+        Dictionary with msgs_per_sec, p50_us and p99_us
+    """
+    clock = time.perf_counter_ns
+    for message in messages:  # warm up caches (source lookup, time shifts)
+        function(message)
+    best = None
+    gc.disable()  # as timeit does, keep collection pauses out of the samples
+    try:
+        for _ in range(repeats):
+            samples = []
+            for _ in range(rounds):
+                for message in messages:
+                    start = clock()
+                    function(message)
+                    samples.append(clock() - start)
+            if best is None or sum(samples) < sum(best):
+                best = samples
+    finally:
+        gc.enable()
+    samples = sorted(best)
+    total_seconds = sum(samples) / 1e9
+    return {
+        "msgs_per_sec": round(len(samples) / total_seconds, 1),
+        "p50_us": round(percentile(samples, 0.50) / 1000, 2),
+        "p99_us": round(percentile(samples, 0.99) / 1000, 2),
+    }
+
+
+def run(corpus, rounds):
+    registry = default_registry()
+    extract = make_extract(registry)
+    results = {}
+    errors = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for message in corpus:
+            actual = extract(message)
+            if actual != message["expected"]:
+                errors.append((message, actual))
+
+    by_format = {}
+    for message in corpus:
+        by_format.setdefault(message["format"], []).append(message)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, messages in sorted(by_format.items()):
+            benchmarks = {
+                "maybe_reverse": lambda message: maybe_reverse(maybe_reverse(message["text"])),
+                "extract": extract,
+            }
+            if name == "whatsapp":
+                benchmarks["whatsapp"] = lambda message: parse_whatsapp_message(message["text"])
+            complete = [message for message in messages if is_complete(message["expected"])]
+            for function_name, function in benchmarks.items():
+                results[f"{name}/{function_name}"] = measure(function, messages, rounds)
+            if complete:
+                results[f"{name}/format"] = measure(
+                    lambda message: format_bid_message(message["expected"]), complete, rounds
+                )
+    return results, errors
+
+
+def median_results(runs):
+    """Per benchmark median of each metric over several runs."""
+    merged = {}
+    for key in runs[0]:
+        merged[key] = {
+            metric: sorted(run[key][metric] for run in runs)[len(runs) // 2]
+            for metric in runs[0][key]
+        }
+    return merged
+
+
+def compare(results, baseline, tolerance, slack_us=LATENCY_SLACK_US):
+    """
+    Returns:
+        List of regression descriptions
+    """
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        if result["msgs_per_sec"] < expected["msgs_per_sec"] * (1 - tolerance):
+            regressions.append(f"{key}: {result['msgs_per_sec']:,.0f} msg/s, baseline {expected['msgs_per_sec']:,.0f}")
+        if result["p50_us"] > expected["p50_us"] * (1 + tolerance) + slack_us:
+            regressions.append(f"{key}: p50 {result['p50_us']}us, baseline {expected['p50_us']}us")
+        # p99 is noisy on a shared machine, allow twice the tolerance
+        if result["p99_us"] > expected["p99_us"] * (1 + 2 * tolerance) + slack_us:
+            regressions.append(f"{key}: p99 {result['p99_us']}us, baseline {expected['p99_us']}us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--rounds", type=int, default=200, help="times each message is parsed")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown vs the baseline (0.3 = 30%%)")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    results, errors = run(corpus, args.rounds)
+    if args.record:
+        # A baseline from one lucky (or unlucky) run flags noise later on
+        runs = [results] + [run(corpus, args.rounds)[0] for _ in range(RECORD_RUNS - 1)]
+        results = median_results(runs)
+
+    for message, actual in errors:
+        print(f"WRONG OUTPUT ({message['format']}) for {message['text']!r}:\n"
+              f"  expected: {message['expected']}\n  actual:   {actual}")
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(f"{'benchmark':<26}{'msg/s':>12}{'p50 us':>10}{'p99 us':>10}{'baseline msg/s':>16}")
+    for key, result in results.items():
+        base = baseline.get(key, {}).get("msgs_per_sec")
+        base_text = f"{base:,.0f}" if base else "-"
+        print(f"{key:<26}{result['msgs_per_sec']:>12,.0f}{result['p50_us']:>10}{result['p99_us']:>10}{base_text:>16}")
+
+    if args.record:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 1 if errors else 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    return 1 if errors or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
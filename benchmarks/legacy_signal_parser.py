@@ -0,0 +1,287 @@
+"""
+The regex cascade that telebot.extract_data and extract_whatsapp_message used
+before signal_parser, kept verbatim as the reference for equivalence checks
+and as the "before" side of the parser benchmarks.
+"""
+import re
+from datetime import datetime, timedelta
+
+
+def legacy_parse_whatsapp_message(message_text: str) -> dict:
+    """
+    Specialized function to extract trading data from messages that start with "📱 WhatsApp Message:"
+    
+    Args:
+        message_text: The full message text
+        
+    Returns:
+        dict: Dictionary with extracted trading signal data or None if not a WhatsApp message
+    """
+    if "📱 WhatsApp Message:" not in message_text:
+        return None  # Not a WhatsApp message, don't process
+    
+    # Split the message into lines
+    lines = message_text.strip().split('\n')
+    if len(lines) < 3:  # Need at least 3 lines (header, maybe empty line, currency)
+        return None  # Not enough content
+    
+    # Find the WhatsApp header line
+    header_index = -1
+    for i, line in enumerate(lines):
+        if "📱 WhatsApp Message:" in line:
+            header_index = i
+            break
+    
+    if header_index == -1:
+        return None
+    
+    # Search for the currency line - it should be the first non-empty line after the header
+    currency_index = -1
+    for i in range(header_index + 1, min(header_index + 4, len(lines))):
+        if i < len(lines) and lines[i].strip():  # If line is not empty
+            currency_index = i
+            break
+    
+    if currency_index == -1:
+        return None  # No currency line found
+        
+    currency_line = lines[currency_index].strip()
+    
+    # Initialize result data
+    result = {
+        "currancy": None,
+        "action": None,
+        "levels": 0,
+        "bid_wait_time": None,
+        "entry_time": None,
+        "is_otc": "OTC" in currency_line,
+        "source_chat": "WhatsApp"
+    }
+    
+    # Extract currency
+    # Handle currency pair with slash (like EUR/USD)
+    currency_match = re.search(r'([A-Z]{2,})/([A-Z]{2,})', currency_line, re.IGNORECASE)
+    if currency_match:
+        result["currancy"] = (currency_match.group(1) + currency_match.group(2)).lower()
+    elif result["is_otc"]:
+        # Extract the part before "OTC"
+        parts = currency_line.split("OTC")
+        result["currancy"] = parts[0].strip().lower()
+    else:
+        # Just use the whole line as currency
+        result["currancy"] = currency_line.lower()
+    
+    # Extract bid wait time (expiration)
+    for line in lines:
+        time_match = re.search(r'(?:תוקף|תפוגה|Expiration)[^\d]*(\d+)M', line, re.IGNORECASE)
+        if time_match:
+            minutes = time_match.group(1)
+            result["bid_wait_time"] = f"M{minutes}"
+            break
+    
+    # Extract action
+    for line in lines:
+        if "למטה" in line or "למכור" in line or "SELL" in line.upper() or "🔴" in line or "🟥" in line:
+            result["action"] = "Sell"
+            break
+        elif ("למעלה" in line or "BUY" in line.upper() or "קנה" in line or
+              "🟢" in line or "🟩" in line):
+            result["action"] = "Buy"
+            break
+    
+    # Extract entry time
+    for line in lines:
+        entry_match = re.search(r'כניסה\s+בשעה\s+(\d{1,2}:\d{2})', line)
+        if entry_match:
+            result["entry_time"] = entry_match.group(1)
+            break
+        
+        # Try simpler Hebrew pattern if previous pattern doesn't match
+        entry_match = re.search(r'כניסה(?:\s*בשעה)?\s*(\d{1,2}:\d{2})', line)
+        if entry_match:
+            result["entry_time"] = entry_match.group(1)
+            break
+    
+    # Count and extract martingale levels
+    martingale_times = []
+    for line in lines:
+        # Match Hebrew format
+        martingale_match = re.search(r'רמה\s+(?:\d️⃣|\d+)?\s+בשעה\s+(\d{1,2}:\d{2})', line)
+        if martingale_match:
+            martingale_times.append(martingale_match.group(1))
+    
+    result["levels"] = len(martingale_times)
+    if martingale_times:
+        result["martingale_times"] = martingale_times
+    
+    return result
+
+
+def legacy_parse_signal(processed_text: str, chat_title: str, time_conversion_hours: int = 0,
+                        source_timezone: str = "UTC+0") -> dict:
+    """
+    The signal parsing part of the old telebot.extract_data, after the
+    command handling and time zone selection.
+    """
+    # Check if "OTC" appears in the message
+    is_otc = "OTC" in processed_text
+    
+    # --- Extract currency ---
+    currency = None
+    
+    # Check for currency pair with slash format (like BHD/CNY)
+    currency_match = re.search(r'([A-Z]{2,})/([A-Z]{2,})', processed_text, re.IGNORECASE)
+    if currency_match:
+        if is_otc:
+            # For OTC pairs like BHD/CNY OTC, use both parts
+            currency = (currency_match.group(1) + currency_match.group(2)).lower()
+        else:
+            # For regular pairs like EUR/USD
+            currency = (currency_match.group(1) + currency_match.group(2)).lower()
+    else:
+        # Try to extract single currency followed by OTC (like "Litecoin OTC")
+        otc_currency_match = re.search(r'^([A-Za-z0-9]+)\s+OTC', processed_text, re.IGNORECASE)
+        if otc_currency_match:
+            currency = otc_currency_match.group(1).lower()
+            is_otc = True
+        else:
+            # Extract currency from the first line for any message format
+            lines = processed_text.split('\n')
+            first_line = lines[0] if len(lines) > 0 else processed_text
+            
+            # Try to extract currency based on common patterns
+            # Pattern 1: Currency after emoji and space (like "🌎 US100")
+            emoji_pattern = re.compile(r'[\U00010000-\U0010ffff]', flags=re.UNICODE)
+            emojis = emoji_pattern.findall(first_line)
+            
+            if emojis:
+                # Split by emoji
+                parts = emoji_pattern.split(first_line)
+                if len(parts) > 1:
+                    # Get the text after the first emoji
+                    potential_currency = parts[1].strip()
+                    
+                    # Handle case where OTC is in the same part (like "EUR/USD OTC")
+                    if "OTC" in potential_currency:
+                        currency = potential_currency.split("OTC")[0].strip().lower()
+                        is_otc = True
+                    else:
+                        currency = potential_currency.lower()
+            
+            # Pattern 2: OTC specific extraction if not found yet
+            if currency is None and is_otc:
+                otc_match = re.search(r'[^\w]([A-Za-z0-9]+)[\s]+OTC', processed_text)
+                if otc_match:
+                    currency = otc_match.group(1).lower()
+
+    # --- Determine action ---
+    # For Hebrew: "למטה" means Sell, "למעלה" or "קנה" means Buy, "למכור" means Sell
+    # For English: check for "SELL" or "BUY" or emoji indicators
+    if "למטה" in processed_text or "למכור" in processed_text or "SELL" in processed_text.upper() or "🔴" in processed_text or "🟥" in processed_text:
+        action = "Sell"
+    elif ("למעלה" in processed_text or "BUY" in processed_text.upper() or "קנה" in processed_text or
+          "🟢" in processed_text or "🟩" in processed_text):
+        action = "Buy"
+    else:
+        action = None
+
+    # --- Extract bid wait time ---
+    # Accepts "תוקף", "תפוגה", or "Expiration" followed by a number.
+    bid_wait_time = None
+    time_match = re.search(r'(?:תוקף|תפוגה|Expiration)[^\d]*(\d+)M', processed_text, re.IGNORECASE)
+    if time_match:
+        minutes = time_match.group(1)
+        bid_wait_time = f"M{minutes}"
+    
+    # --- Extract martingale levels ---
+    # New pattern for Hebrew format with emoji numbers (e.g., "רמה 1️⃣ בשעה 19:30")
+    martingale_regex = re.compile(r'רמה\s+(?:\d️⃣|\d+)\s+בשעה\s+(\d{1,2}:\d{2})', re.UNICODE)
+    martingale_matches = martingale_regex.findall(processed_text)
+    
+    # Older patterns for fallback
+    levels_hebrew = re.findall(r'^(?=.*רמה)(?=.*בשעה).*$', processed_text, re.MULTILINE)
+    levels_english = re.findall(r'(\d+)️⃣\s+level(?:\s+\d+)?\s+at\s+(\d{1,2}:\d{2})', processed_text)
+    
+    if not levels_english:
+        # Try alternative pattern without emoji (just in case)
+        alt_levels = re.findall(r'level\s+(\d+)\s+at\s+(\d{1,2}:\d{2})', processed_text, re.IGNORECASE)
+        if alt_levels:
+            levels_english = alt_levels
+    
+    # Determine number of levels and times based on available matches
+    if martingale_matches:
+        levels = len(martingale_matches)
+        martingale_times = martingale_matches
+    elif levels_english:
+        levels = len(levels_english)
+        martingale_times = [time for _, time in levels_english]
+    else:
+        # Fallback to the older pattern if emoji pattern doesn't match
+        fallback_levels = re.findall(r'^(?=.*level)(?=.*at).*$', processed_text, re.IGNORECASE | re.MULTILINE)
+        levels = len(levels_hebrew) + len(fallback_levels)
+        martingale_times = []
+    
+    # --- Extract entry time ---
+    # Try Hebrew pattern first for the new formats
+    entry_match = re.search(r'כניסה\s+בשעה\s+(\d{1,2}:\d{2})', processed_text)
+    if not entry_match:
+        # Look for English "Entry at" pattern
+        entry_match = re.search(r'Entry at\s+(\d{1,2}:\d{2})', processed_text, re.IGNORECASE)
+    if not entry_match:
+        # Try with the emoji variant
+        entry_match = re.search(r'⏺️?\s*Entry at\s+(\d{1,2}:\d{2})', processed_text, re.IGNORECASE)
+    if not entry_match:
+        # Try simpler Hebrew pattern if previous patterns don't match
+        entry_match = re.search(r'כניסה(?:\s*בשעה)?\s*(\d{1,2}:\d{2})', processed_text)
+    
+    entry_time = None
+    if entry_match:
+        entry_time_str = entry_match.group(1)
+        try:
+            # Parse entry time
+            entry_time_obj = datetime.strptime(entry_time_str, '%H:%M')
+            
+            # Apply time zone conversion if needed
+            if time_conversion_hours != 0:
+                entry_time_obj = entry_time_obj + timedelta(hours=time_conversion_hours)
+            
+            # Format the adjusted time
+            entry_time = entry_time_obj.strftime('%H:%M')
+        except Exception as e:
+            print(f"Error converting entry time: {e}")
+            entry_time = entry_time_str
+    
+    # Convert martingale times based on source timezone
+    converted_martingale_times = []
+    for time_str in martingale_times:
+        try:
+            # Parse martingale time
+            martingale_time_obj = datetime.strptime(time_str, '%H:%M')
+            
+            # Apply time zone conversion if needed
+            if time_conversion_hours != 0:
+                martingale_time_obj = martingale_time_obj + timedelta(hours=time_conversion_hours)
+            
+            # Format the adjusted time
+            converted_martingale_times.append(martingale_time_obj.strftime('%H:%M'))
+        except Exception as e:
+            print(f"Error converting martingale time: {e}")
+            converted_martingale_times.append(time_str)
+            
+    result = {
+        "currancy": currency,
+        "action": action,
+        "levels": levels,
+        "bid_wait_time": bid_wait_time,
+        "entry_time": entry_time,
+        "source_chat": chat_title,
+        "is_otc": is_otc
+    }
+    
+    # Add martingale times if available
+    if converted_martingale_times:
+        result["martingale_times"] = converted_martingale_times
+        result["original_timezone"] = source_timezone
+        result["converted_to_utc_plus2"] = True
+        
+    return result
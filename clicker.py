@@ -7,8 +7,13 @@ from selenium.common.exceptions import (
     ElementClickInterceptedException,
     StaleElementReferenceException
 )
+import re
 import time
 import logging
+import threading
+
+from deal_tracker import DealTracker, normalize_asset, row_numbers
+from tracing import trace_methods, tracer
 
 # Import screenshot logger functions at the module level
 try:
@@ -28,6 +33,261 @@ except ImportError:
     def capture_error_state(error_message, operation_name):
         pass
 
+# Injected once per page load. Watches the deals list and buffers events in
+# window.__dealFeed.queue (oldest first, bounded):
+#   countdown    {text, seconds}  first open deal's time left changed
+#   deal_opened  {count}          more open deals than before
+#   deal_closed  {count}          fewer open deals than before
+#   result       {amount, signature, id, asset, values}
+#                                 first closed deal changed: its result cell,
+#                                 text (signature), data-id and value cells
+# Every event has "at", the page's Date.now() when it was seen.
+DEAL_FEED_SCRIPT = """
+if (window.__dealFeed && window.__dealFeed.version === 2) { return false; }
+var feed = window.__dealFeed = {version: 2, queue: [], countdown: null, result: null, openCount: 0, view: null};
+function push(event) {
+    event.at = Date.now();
+    feed.queue.push(event);
+    if (feed.queue.length > 500) { feed.queue.shift(); }
+}
+function cells(item, row, direct) {
+    var rows = item.querySelectorAll('div.item-row');
+    if (rows.length <= row) { return []; }
+    if (!direct) { return rows[row].querySelectorAll('div'); }
+    return Array.prototype.filter.call(rows[row].children, function (c) { return c.tagName === 'DIV'; });
+}
+function scan() {
+    var items = document.querySelectorAll('div.deals-list__item');
+    var first = items[0];
+    var timeCell = first ? cells(first, 0, true)[1] : null;
+    var countdown = timeCell ? timeCell.textContent.trim() : null;
+    // Until a tab is clicked, tell the lists apart by the countdown cell
+    var opened = feed.view ? feed.view === 'Opened' : (!first || /^\\d+:\\d{2}$/.test(countdown));
+    if (opened) {
+        // Opened list (or an empty list)
+        if (items.length > feed.openCount) { push({type: 'deal_opened', count: items.length}); }
+        if (items.length < feed.openCount) { push({type: 'deal_closed', count: items.length}); }
+        feed.openCount = items.length;
+        if (countdown && countdown !== feed.countdown) {
+            var parts = countdown.split(':');
+            push({type: 'countdown', text: countdown, seconds: parseInt(parts[0], 10) * 60 + parseInt(parts[1], 10)});
+        }
+        feed.countdown = countdown;
+        return;
+    }
+    // Closed list: the first item is the latest deal
+    var signature = first.textContent;
+    var resultCell = cells(first, 1, false)[1];
+    if (resultCell && signature !== feed.result) {
+        feed.result = signature;
+        var asset = first.querySelector('div.item-row div');
+        push({type: 'result', amount: resultCell.textContent.trim(), signature: signature,
+              id: first.getAttribute('data-id') || first.id || null,
+              asset: asset ? asset.textContent.trim() : null,
+              values: Array.prototype.map.call(cells(first, 1, false), function (c) { return c.textContent.trim(); })});
+    }
+}
+// Follow the Opened/Closed tab clicks
+document.addEventListener('click', function (event) {
+    var link = event.target.closest ? event.target.closest('a') : null;
+    var text = link ? link.textContent.trim() : '';
+    if (text === 'Opened' || text === 'Closed') { feed.view = text; setTimeout(scan, 0); }
+}, true);
+new MutationObserver(scan).observe(document.body, {childList: true, subtree: true, characterData: true});
+scan();
+return true;
+"""
+
+# Hands over the buffered events, the open deal count and the signature of
+# the top Closed row last seen (null if none yet) in one round trip, null if
+# the page has no feed
+DRAIN_DEAL_FEED_SCRIPT = """
+var feed = window.__dealFeed;
+if (!feed) { return null; }
+return {now: Date.now(), openCount: feed.openCount, result: feed.result,
+        events: feed.queue.splice(0, feed.queue.length)};
+"""
+
+# Places a bid in one execute_async_script call. Arguments: amount, action
+# ("Buy"/"Sell"), set_amount (False keeps the amount set by prepare_bid), the
+# confirm timeout in ms and a token stored in window.__lastBidClick right
+# before the click (see Clicker.bid_clicked). Runs the same checks as the step by step path:
+# the amount is verified before the click and the click is confirmed by a new
+# deal in the Opened list. Also installs the deal feed. Reports
+#   {ok, step (failed step), error, deal_id, deal, timings (ms per step), total_ms}
+# where deal is {id, asset, time} of the new Opened row, for the deal tracker.
+PLACE_BID_SCRIPT = "(function () {" + DEAL_FEED_SCRIPT + "})();\n" + """
+var amount = arguments[0], action = arguments[1], setAmount = arguments[2], timeoutMs = arguments[3];
+var clickToken = arguments[4];
+var done = arguments[arguments.length - 1];
+var start = performance.now(), last = start, timings = {};
+function mark(step) {
+    var now = performance.now();
+    timings[step] = Math.round((now - last) * 10) / 10;
+    last = now;
+}
+function finish(result) {
+    result.timings = timings;
+    result.total_ms = Math.round((performance.now() - start) * 10) / 10;
+    done(result);
+}
+function byXPath(xpath) {
+    return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function dealInfo(item) {
+    var asset = item.querySelector('div.item-row div');
+    var row = item.querySelector('div.item-row');
+    var cells = row ? Array.prototype.filter.call(row.children, function (c) { return c.tagName === 'DIV'; }) : [];
+    return {
+        id: item.getAttribute('data-id') || item.id || null,
+        asset: asset ? asset.textContent.trim() : null,
+        time: cells.length > 1 ? cells[1].textContent.trim() : null
+    };
+}
+function dealId(info) {
+    return info.id || ((info.asset || 'deal') + '@' + Date.now());
+}
+try {
+    var tab = byXPath("//div[contains(@class, 'divider')]/ul/li/a[text()='Opened']");
+    if (tab) { tab.click(); }
+    mark('open_tab');
+
+    if (setAmount) {
+        var input = byXPath("//div[contains(@class, 'control__value') and contains(@class, 'value--several-items')]//input[@type='text']");
+        if (!input) { return finish({ok: false, step: 'set_amount', error: 'Input field not found'}); }
+        // Native setter + input/change events, so the page's own handlers see the value
+        var setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+        input.focus();
+        setter.call(input, String(amount));
+        input.dispatchEvent(new Event('input', {bubbles: true}));
+        input.dispatchEvent(new Event('change', {bubbles: true}));
+        input.blur();
+    }
+    mark('set_amount');
+
+    var verifyUntil = performance.now() + 500;
+    (function verify() {
+        var check = byXPath("//div[contains(@class, 'block--bet-amount')]//input[@type='text']");
+        if (!check || parseFloat(check.value) !== amount) {
+            if (performance.now() < verifyUntil) { return setTimeout(verify, 10); }
+            return finish({ok: false, step: 'verify',
+                error: 'input amount is: ' + (check ? check.value : 'missing') + ', But is supposed to be: ' + amount});
+        }
+        mark('verify');
+
+        var button = byXPath("//span[contains(@class, 'payout__text') and contains(text(), '" + action + "')]/ancestor::a");
+        if (!button) { return finish({ok: false, step: 'button', error: action + ' button not found'}); }
+        var before = Array.prototype.slice.call(document.querySelectorAll('div.deals-list__item'));
+        window.__lastBidClick = clickToken;
+        button.click();
+        mark('click');
+
+        var confirmUntil = performance.now() + timeoutMs;
+        (function confirm() {
+            var items = document.querySelectorAll('div.deals-list__item');
+            if (items.length > before.length) {
+                mark('confirm');
+                // The row that was not there before the click, the top one if the list was re-rendered
+                var added = Array.prototype.filter.call(items, function (item) { return before.indexOf(item) < 0; });
+                var info = dealInfo(added.length ? added[0] : items[0]);
+                return finish({ok: true, deal_id: dealId(info), deal: info});
+            }
+            if (performance.now() < confirmUntil) { return setTimeout(confirm, 20); }
+            finish({ok: false, step: 'confirm', error: 'No new trade detected'});
+        })();
+    })();
+} catch (e) {
+    finish({ok: false, step: 'script', error: String(e)});
+}
+"""
+
+# Everything the read paths need, in one call. Texts are parsed in Python
+# (Clicker.snapshot). The deals are those of the list currently shown, which
+# is the Opened or the Closed tab (view, null if no tab was clicked yet).
+SNAPSHOT_SCRIPT = """
+function text(selector) {
+    var element = document.querySelector(selector);
+    return element ? element.textContent.trim() : null;
+}
+function cellText(item, row, direct) {
+    var rows = item.querySelectorAll('div.item-row');
+    if (rows.length <= row) { return null; }
+    var cells = direct
+        ? Array.prototype.filter.call(rows[row].children, function (c) { return c.tagName === 'DIV'; })
+        : rows[row].querySelectorAll('div');
+    return cells.length > 1 ? cells[1].textContent.trim() : null;
+}
+function valueTexts(item) {
+    var rows = item.querySelectorAll('div.item-row');
+    if (rows.length < 2) { return []; }
+    return Array.prototype.map.call(rows[1].querySelectorAll('div'), function (c) { return c.textContent.trim(); });
+}
+var deals = Array.prototype.map.call(document.querySelectorAll('div.deals-list__item'), function (item) {
+    var asset = item.querySelector('div.item-row div');
+    return {
+        id: item.getAttribute('data-id') || item.id || null,
+        asset: asset ? asset.textContent.trim() : null,
+        time: cellText(item, 0, true),
+        result: cellText(item, 1, false),
+        values: valueTexts(item)
+    };
+});
+return {
+    balance: text('span.js-hd.js-balance-real-ILS'),
+    symbol: text('div.currencies-block div.currencies-block__in a.pair-number-wrap span.current-symbol'),
+    payout: text('#put-call-buttons-chart-1 div.value__val-start'),
+    view: window.__dealFeed ? window.__dealFeed.view : null,
+    deals: deals
+};
+"""
+
+# Reads the Closed list from the top down to the high-water mark (arguments[0],
+# the key of the newest row seen before, null for none), so only new rows are
+# parsed. At most arguments[1] rows. Returns {rows (newest first, each with
+# key, id, asset, time, values, result), found (the mark was reached or there
+# is none), truncated (the limit stopped the read before the mark or the end
+# of the list), total (rows listed)}, or null while the Opened list is shown.
+CLOSED_ROWS_SCRIPT = """
+var highWater = arguments[0], limit = arguments[1];
+var feed = window.__dealFeed;
+var items = document.querySelectorAll('div.deals-list__item');
+function cells(item, row, direct) {
+    var rows = item.querySelectorAll('div.item-row');
+    if (rows.length <= row) { return []; }
+    if (!direct) { return rows[row].querySelectorAll('div'); }
+    return Array.prototype.filter.call(rows[row].children, function (c) { return c.tagName === 'DIV'; });
+}
+function text(cell) { return cell ? cell.textContent.trim() : null; }
+var view = feed ? feed.view : null;
+if (!view && items.length) {
+    // No tab clicked since the page loaded, open deals show a MM:SS countdown
+    view = /^\\d+:\\d{2}$/.test(text(cells(items[0], 0, true)[1]) || '') ? 'Opened' : 'Closed';
+}
+if (view === 'Opened') { return null; }
+var rows = [], found = highWater === null;
+for (var i = 0; i < items.length && rows.length < limit; i++) {
+    var item = items[i];
+    var id = item.getAttribute('data-id') || item.id || null;
+    var asset = text(item.querySelector('div.item-row div'));
+    var time = text(cells(item, 0, true)[1]);
+    var values = Array.prototype.map.call(cells(item, 1, false), text);
+    var key = id ? 'id:' + id : [asset, time].concat(values).join('|');
+    if (key === highWater) { found = true; break; }
+    rows.push({key: key, id: id, asset: asset, time: time, values: values, result: values.length > 1 ? values[1] : null});
+}
+return {rows: rows, found: found, truncated: !found && i < items.length, total: items.length};
+"""
+
+# Scrolls the deals list to its end so that the site loads older rows,
+# returns how many rows are listed (-1 without a list)
+SCROLL_DEALS_LIST_SCRIPT = """
+var list = document.querySelector('div.scrollbar-container.deals-list');
+if (!list) { return -1; }
+list.scrollTop = arguments[0] ? list.scrollHeight : 0;
+return document.querySelectorAll('div.deals-list__item').length;
+"""
+
+@trace_methods
 class Clicker:
     def __init__(self, driver):
         """
@@ -44,7 +304,40 @@ class Clicker:
         self.bid_value = 0
         self.on_lost_logic = False
         self.loosing_bid_value = 0
-        
+
+        # Latest countdown event from the deal feed and when it was seen (time.time())
+        self.last_countdown = None
+        self.last_countdown_at = 0
+        # Open deals in the Opened list as of the last drain, None without a feed
+        self.open_deals = None
+        # Signature of the top Closed row the feed last saw, None if unknown
+        self.closed_top = None
+        # Id and per-step timings (ms) of the last single-script placement
+        self.last_deal_id = None
+        self.last_bid_timings = {}
+        # Cached snapshot() result, dropped by every action that changes the page
+        self.snapshot_ttl = 1.0
+        self._snapshot = None
+        self._snapshot_at = 0
+        # Guards the cache only, never held across a driver call: the call is
+        # queued on the driver actor, whose jobs take snapshots themselves
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_generation = 0  # bumped by invalidate_snapshot
+        # Placed deals and their Closed rows; main.py shares one between sessions
+        self.deals = DealTracker()
+        # Held by a trading thread (never the driver actor's) across a sequence
+        # of page actions, so that chains sharing this browser take turns
+        self.page_lock = threading.RLock()
+        # Trade history store (TradeHistory), set from main.py
+        self.history = None
+        # Key of the newest Closed row read_new_closed_deals has seen
+        self.closed_high_water = None
+        self.closed_rows_read = 0
+        self.closed_gaps = 0
+        # Websocket state (MarketTap), set from app.py when the tap is enabled;
+        # reads use it while it is live and scrape the page otherwise
+        self.market = None
+
     def setup_logging(self):
         """Setup logging for the Clicker class"""
         logger = logging.getLogger("Clicker")
@@ -59,8 +352,198 @@ class Clicker:
     def refresh_page(self):
         """Refresh the current page"""
         self.logger.info("Refreshing page")
+        self.invalidate_snapshot()
         self.driver.refresh()
-        
+
+    def invalidate_snapshot(self):
+        """Drop the cached snapshot, called by every action that changes the page."""
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._snapshot_generation += 1
+
+    def snapshot(self, max_age=None):
+        """
+        Page state in one script call (SNAPSHOT_SCRIPT), cached for
+        snapshot_ttl seconds or until Clicker changes the page.
+
+        Args:
+            max_age: Oldest cached snapshot accepted in seconds (default snapshot_ttl),
+                0 forces a new one
+
+        Returns:
+            Dict with balance (float), symbol, payout (int), view ("Opened",
+            "Closed" or None), open_deals ({id, asset, time_left}) and
+            closed_deals ({id, asset, time, values, result}), lists that are
+            None when not shown, and taken_at (time.time()). Values
+            that are missing from the page are None. None if the script failed.
+        """
+        max_age = self.snapshot_ttl if max_age is None else max_age
+        with self._snapshot_lock:
+            cached = self._snapshot
+            generation = self._snapshot_generation
+        if cached is not None and time.time() - cached["taken_at"] <= max_age:
+            return cached
+        try:
+            raw = self.driver.execute_script(SNAPSHOT_SCRIPT)
+        except Exception as e:
+            self.logger.error(f"Error taking page snapshot: {str(e)}")
+            return None
+        snapshot = self._parse_snapshot(raw)
+        with self._snapshot_lock:
+            # Not cached if the page changed while it was taken
+            if self._snapshot_generation == generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    def _parse_snapshot(self, raw):
+        def number(text, parse):
+            try:
+                return parse(text) if text else None
+            except ValueError:
+                return None
+
+        deals = raw.get("deals") or []
+        view = raw.get("view")
+        if view is None and deals:
+            # No tab clicked since the page loaded, open deals show a MM:SS countdown
+            view = "Opened" if self._parse_time_left(deals[0].get("time")) is not None else "Closed"
+        open_deals = closed_deals = None
+        if view == "Opened" or (view is None and not deals):
+            open_deals = [
+                {"id": deal["id"], "asset": deal["asset"], "time_left": self._parse_time_left(deal["time"])}
+                for deal in deals
+            ]
+        else:
+            closed_deals = [
+                {"id": deal["id"], "asset": deal["asset"], "time": deal["time"],
+                 "values": deal.get("values") or [], "result": deal["result"]}
+                for deal in deals
+            ]
+        return {
+            "balance": number(raw.get("balance"), lambda text: float(text.replace(',', ''))),
+            "symbol": raw.get("symbol"),
+            "payout": number(raw.get("payout"), lambda text: int(text.lstrip('+').replace('%', '').strip())),
+            "view": view,
+            "open_deals": open_deals,
+            "closed_deals": closed_deals,
+            "taken_at": time.time(),
+        }
+
+    @staticmethod
+    def _parse_time_left(text):
+        # "MM:SS" to seconds, None for anything else
+        parts = (text or "").split(":")
+        if len(parts) != 2 or not all(part.isdigit() for part in parts):
+            return None
+        return int(parts[0]) * 60 + int(parts[1])
+
+    def install_deal_feed(self):
+        """
+        Inject the deal observer (DEAL_FEED_SCRIPT) into the page. Does
+        nothing if the page already has it.
+
+        Returns:
+            True if the feed is installed, False otherwise
+        """
+        try:
+            if self.driver.execute_script(DEAL_FEED_SCRIPT):
+                self.logger.info("Deal feed installed")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error installing deal feed: {str(e)}")
+            return False
+
+    def drain_deal_feed(self):
+        """
+        Take the events buffered by the deal feed in one round trip. The feed
+        is (re)installed if the page has none, e.g. after a refresh.
+
+        Returns:
+            List of event dicts, oldest first. Each has "type" and "age", the
+            seconds since the page saw it.
+        """
+        try:
+            drained = self.driver.execute_script(DRAIN_DEAL_FEED_SCRIPT)
+        except Exception as e:
+            self.logger.error(f"Error draining deal feed: {str(e)}")
+            return []
+        if drained is None:
+            self.open_deals = None
+            self.closed_top = None
+            self.install_deal_feed()
+            return []
+
+        self.open_deals = drained["openCount"]
+        self.closed_top = drained.get("result")
+        events = drained["events"]
+        for event in events:
+            event["age"] = max(0, (drained["now"] - event["at"]) / 1000)
+            if event["type"] == "countdown":
+                self.last_countdown = event
+                self.last_countdown_at = time.time() - event["age"]
+            elif event["type"] == "deal_closed" and event["count"] == 0:
+                self.last_countdown = None
+        return events
+
+    def feed_time_left(self, max_age=2):
+        """
+        Time left of the open deal according to the deal feed.
+
+        Args:
+            max_age: Seconds after which the last countdown is too old to trust
+
+        Returns:
+            Integer seconds remaining, None if the feed has no fresh countdown
+        """
+        self.drain_deal_feed()
+        if self.last_countdown is None or time.time() - self.last_countdown_at > max_age:
+            return None
+        return max(0, round(self.last_countdown["seconds"] - (time.time() - self.last_countdown_at)))
+
+    def feed_bid_result(self, deal=None, timeout=3):
+        """
+        Show the Closed tab and wait for the deal feed to report the result
+        of the latest deal, without reloading the page.
+
+        Right after the feed is installed the top row is unknown until the
+        click, and before the new deal renders it is the previous deal's.
+        Only a top row other than the one seen before the click is taken,
+        and only if it matches deal (id, else asset and amount).
+
+        Args:
+            deal: The DealTracker deal, None for the latest open one
+
+        Returns:
+            The result cell text (e.g. "₪0"), None if the feed did not report one
+        """
+        if deal is None:
+            open_deals = self.deals.open_deals()
+            deal = open_deals[-1] if open_deals else None
+        if deal is None:
+            self.logger.info("No recorded deal to check the deal feed's result against")
+            return None
+        self.drain_deal_feed()  # Results seen before the click are old deals
+        before = self.closed_top
+        if not self.click_closed_trades_tab():
+            return None
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            for event in self.drain_deal_feed():
+                if event["type"] != "result" or event["signature"] == before:
+                    continue
+                if self._is_row_of(deal, event):
+                    return event["amount"]
+                self.logger.info(f"Top closed row {event['asset']} {event['values']} is not deal {deal['key']}, waiting")
+            time.sleep(0.05)
+        return None
+
+    @staticmethod
+    def _is_row_of(deal, row):
+        if deal["id"] and row.get("id"):
+            return row["id"] == deal["id"]
+        return (normalize_asset(row.get("asset")) == normalize_asset(deal["asset"])
+                and float(deal["amount"]) in row_numbers(row))
+
     def wait_for_element(self, by_method, selector, timeout=10, wait_type="visibility"):
         """
         Wait for an element to be present and return it.
@@ -74,6 +557,7 @@ class Clicker:
         Returns:
             The WebElement if found, None otherwise
         """
+        tracer.annotate(selector=selector, wait_type=wait_type)
         try:
             self.logger.debug(f"Waiting for element: {selector}")
             if wait_type == "visibility":
@@ -89,6 +573,7 @@ class Clicker:
                     EC.element_to_be_clickable((by_method, selector))
                 )
         except (TimeoutException, NoSuchElementException) as e:
+            tracer.annotate(timed_out=True)
             self.logger.error(f"Element not found: {selector}. Error: {str(e)}")
             return None
             
@@ -104,23 +589,33 @@ class Clicker:
         Returns:
             List of WebElements if found, empty list otherwise
         """
+        tracer.annotate(selector=selector)
         try:
             return WebDriverWait(self.driver, timeout).until(
                 EC.presence_of_all_elements_located((by_method, selector))
             )
         except (TimeoutException, NoSuchElementException) as e:
+            tracer.annotate(timed_out=True)
             self.logger.error(f"Elements not found: {selector}. Error: {str(e)}")
             return []
      
-    def get_current_balance(self):
+    def get_current_balance(self, max_age=None):
         """
         Retrieves the balance number from the element with class 'js-hd js-balance-real-ILS'.
         
+        Args:
+            max_age: Oldest snapshot accepted in seconds (see snapshot)
+        
         Returns:
             The balance as a float if found, otherwise None.
         """
+        if self.market is not None and self.market.live() and self.market.balance is not None:
+            return self.market.balance
+        state = self.snapshot(max_age)
+        if state is not None and state["balance"] is not None:
+            return state["balance"]
         try:
-            # Wait up to 10 seconds for the balance element to be visible
+            # Not rendered yet: wait up to 10 seconds for the balance element to be visible
             balance_element = WebDriverWait(self.driver, 10).until(
                 EC.visibility_of_element_located((By.CSS_SELECTOR, "span.js-hd.js-balance-real-ILS"))
             )
@@ -130,8 +625,7 @@ class Clicker:
             return float(clean_balance)
         except (TimeoutException, NoSuchElementException) as e:
             self.logger.error(f"Error retrieving balance: {e}")
-            return None.replace(',', '')
-            return float(clean_balance)
+            return None
         except Exception as e:
             self.logger.error(f"Error retrieving balance: {str(e)}")
             return None
@@ -143,6 +637,7 @@ class Clicker:
         Returns:
             Tuple: (success, currency_name)
         """
+        self.invalidate_snapshot()
         try:
             selector = "div.currencies-block div.currencies-block__in a.pair-number-wrap"
             element = self.wait_for_element(By.CSS_SELECTOR, selector, timeout=10, wait_type="clickable")
@@ -189,6 +684,7 @@ class Clicker:
         Returns:
             True if currency set successfully, False otherwise
         """
+        self.invalidate_snapshot()
         try:
             self.logger.info(f"Setting currency to: {currency} (OTC: {is_otc})")
             
@@ -298,6 +794,15 @@ class Clicker:
         Returns:
             Integer payout percentage if found, None otherwise
         """
+        state = self.snapshot()
+        if state is not None and self.market is not None and self.market.live():
+            payout = self.market.payout(state["symbol"])
+            if payout is not None:
+                self.logger.info(f"Current payout value: {payout}% (websocket)")
+                return int(payout)
+        if state is not None and state["payout"] is not None:
+            self.logger.info(f"Current payout value: {state['payout']}%")
+            return state["payout"]
         try:
             container = self.wait_for_element(
                 By.ID, 
@@ -328,6 +833,7 @@ class Clicker:
         Returns:
             True if successful, False otherwise
         """
+        self.invalidate_snapshot()
         try:
             xpath = "//div[contains(@class, 'divider')]/ul/li/a[text()='Opened']"
             element = self.wait_for_element(By.XPATH, xpath, timeout=10, wait_type="clickable")
@@ -360,6 +866,7 @@ class Clicker:
         Returns:
             True if successful, False otherwise
         """
+        self.invalidate_snapshot()
         try:
             xpath = "//div[contains(@class, 'divider')]/ul/li/a[text()='Closed']"
             element = self.wait_for_element(By.XPATH, xpath, timeout=10, wait_type="clickable")
@@ -395,6 +902,7 @@ class Clicker:
         Returns:
             True if successful, False otherwise
         """
+        self.invalidate_snapshot()
         try:
             if SCREENSHOT_LOGGER_AVAILABLE:
                 capture_before_critical_operation("set_up_input")
@@ -444,6 +952,7 @@ class Clicker:
         Returns:
             True if successful, False otherwise
         """
+        self.invalidate_snapshot()
         try:
             if SCREENSHOT_LOGGER_AVAILABLE:
                 capture_before_critical_operation("buy_button_click")
@@ -498,6 +1007,7 @@ class Clicker:
         Returns:
             True if successful, False otherwise
         """
+        self.invalidate_snapshot()
         try:
             if SCREENSHOT_LOGGER_AVAILABLE:
                 capture_before_critical_operation("sell_button_click")
@@ -553,6 +1063,17 @@ class Clicker:
             Integer seconds remaining if found, None otherwise
         """
         try:
+            # The deal feed knows the countdown without walking the DOM
+            time_left = self.feed_time_left()
+            if time_left:
+                self.logger.info(f"Time left from deal feed: {time_left}")
+                return time_left
+            state = self.snapshot()
+            if state is not None and state["open_deals"] and state["open_deals"][0]["time_left"]:
+                time_left = state["open_deals"][0]["time_left"]
+                self.logger.info(f"Time left from snapshot: {time_left}")
+                return time_left
+
             self.click_opened_trades_tab()
             
             # Verify we have open deals
@@ -640,17 +1161,14 @@ class Clicker:
                 capture_error_state(error_msg, "validate_sleep_time")
             return None
             
-    def get_bid_result(self):
+    def read_last_closed_result(self):
         """
-        Check the result of the last closed bid.
-        
+        Reload the page and read the result cell of the latest closed deal.
+
         Returns:
-            0 if win, 1 if loss, -1 if error
+            The result cell text, None if it could not be read
         """
         try:
-            if SCREENSHOT_LOGGER_AVAILABLE:
-                capture_before_critical_operation("get_bid_result")
-            
             self.click_closed_trades_tab()
             self.refresh_page()
             
@@ -667,7 +1185,7 @@ class Clicker:
                 self.logger.error(error_msg)
                 if SCREENSHOT_LOGGER_AVAILABLE:
                     capture_error_state(error_msg, "get_bid_result")
-                return -1
+                return None
                 
             # Find all deal items
             deal_items = deals_container.find_elements(By.CSS_SELECTOR, "div.deals-list__item")
@@ -677,7 +1195,7 @@ class Clicker:
                 self.logger.error(error_msg)
                 if SCREENSHOT_LOGGER_AVAILABLE:
                     capture_error_state(error_msg, "get_bid_result")
-                return -1
+                return None
                 
             first_deal = deal_items[0]
             
@@ -689,7 +1207,7 @@ class Clicker:
                 self.logger.error(error_msg)
                 if SCREENSHOT_LOGGER_AVAILABLE:
                     capture_error_state(error_msg, "get_bid_result")
-                return -1
+                return None
                 
             # Second row contains the result
             second_row = item_rows[1]
@@ -700,15 +1218,314 @@ class Clicker:
                 self.logger.error(error_msg)
                 if SCREENSHOT_LOGGER_AVAILABLE:
                     capture_error_state(error_msg, "get_bid_result")
-                return -1
+                return None
                 
             # Middle cell has the result
             centered_element = value_cells[1]
-            centered_text = centered_element.text.strip()
+            return centered_element.text.strip()
+        except Exception as e:
+            error_msg = f"Error reading closed deals: {str(e)}"
+            self.logger.error(error_msg)
+            if SCREENSHOT_LOGGER_AVAILABLE:
+                capture_error_state(error_msg, "get_bid_result")
+            return None
+
+    def wait_for_settlement(self, expected_seconds, margin=5, poll_interval=0.05):
+        """
+        Wait for the open deal to settle and return its result.
+
+        Sleeps until shortly before the expected end, then polls the deal feed
+        and returns as soon as the deal leaves the Opened list. Without a feed
+        it falls back to sleeping expected_seconds.
+
+        Args:
+            expected_seconds: Countdown of the deal when the wait starts
+            margin: Extra seconds the site may need, together with
+                expected_seconds this is a hard deadline
+            poll_interval: Seconds between drains near the end
+
+        Returns:
+            0 if win, 1 if loss, -1 if error (see get_bid_result)
+        """
+        start = time.time()
+        expected_end = start + expected_seconds
+        deadline = expected_end + margin
+
+        self.drain_deal_feed()
+        watched = self.open_deals
+        if not watched:
+            self.logger.info("Deal feed does not see the deal, sleeping for the countdown")
+            time.sleep(expected_seconds)
+            return self.get_bid_result()
+
+        settled = False
+        while not settled and time.time() < deadline:
+            now = time.time()
+            time.sleep(min(deadline - now, max(poll_interval, expected_end - 1 - now)))
+            for event in self.drain_deal_feed():
+                if event["type"] == "deal_closed" and event["count"] < watched:
+                    settled = True
+                elif event["type"] == "deal_opened":
+                    watched = event["count"]
+
+        if settled:
+            self.logger.info(f"Deal settled after {time.time() - start:.2f}s (countdown was {expected_seconds}s)")
+        else:
+            self.logger.warning(f"No settlement seen within {expected_seconds + margin}s, reading the result anyway")
+        return self.get_bid_result()
+
+    def record_deal(self, bid, action, opened=None, owner=None):
+        """
+        Record a deal that was just placed in the deal tracker.
+
+        Args:
+            bid: Bid amount
+            action: "Buy" or "Sell"
+            opened: {id, asset, time} of the new Opened row as PLACE_BID_SCRIPT
+                saw it (or {id, asset, time_left} from find_placed_deal), None
+                to read the top Opened row
+            owner: Who placed it, see DealTracker.last
+
+        Returns:
+            The tracked deal dict (expires_at is None if the countdown was not read)
+        """
+        deal_id = asset = time_left = None
+        if opened:
+            deal_id, asset = opened.get("id"), opened.get("asset")
+            time_left = opened["time_left"] if "time_left" in opened else self._parse_time_left(opened.get("time"))
+        else:
+            state = self.snapshot(max_age=0)
+            top = state["open_deals"][0] if state is not None and state["open_deals"] else None
+            # The top row is another chain's deal while the new one is not rendered yet
+            if top is not None and normalize_asset(top["asset"]) == normalize_asset(state["symbol"]):
+                deal_id, asset, time_left = top["id"], top["asset"], top["time_left"]
+        if asset is None:
+            state = self.snapshot()
+            asset = state["symbol"] if state is not None else None
+        deal = self.deals.record(asset, bid, action, time_left=time_left, deal_id=deal_id, owner=owner)
+        self.logger.info(f"Tracking deal {deal['key']}: {deal['asset']} {action} {bid}, time left {time_left}")
+        return deal
+
+    def read_new_closed_deals(self, limit=50, source="poll"):
+        """
+        Rows added to the Closed list since the previous call. The list is
+        read from the top down to the high-water mark, the newest row seen
+        before, so rows are parsed only once. New rows are also stored in
+        self.history.
+
+        Args:
+            limit: Rows read at first; if the mark is further down the rest
+                of the list is read too, so no new row is skipped
+            source: Kept with the rows in self.history ("poll" or "baseline")
+
+        Returns:
+            List of row dicts (key, id, asset, time, values, result), newest
+            first. None if the Closed list is not shown or could not be read.
+        """
+        try:
+            read = self.driver.execute_script(CLOSED_ROWS_SCRIPT, self.closed_high_water, limit)
+        except Exception as e:
+            self.logger.error(f"Error reading closed deals: {str(e)}")
+            return None
+        if read is None:
+            return None
+        if read["truncated"] and self.closed_high_water is not None:
+            # More than limit new rows: read on down to the mark
+            try:
+                read = self.driver.execute_script(CLOSED_ROWS_SCRIPT, self.closed_high_water, read["total"]) or read
+            except Exception as e:
+                self.logger.error(f"Error reading closed deals: {str(e)}")
+        rows = read["rows"]
+        if not read["found"] and self.closed_high_water is not None:
+            # The mark scrolled out of the list, or its texts changed
+            self.closed_gaps += 1
+            self.logger.warning(f"Closed deals high-water mark not found, {len(rows)} of {read['total']} rows read")
+        if rows:
+            self.closed_high_water = rows[0]["key"]
+            if self.history is not None:
+                self.history.add(rows, source=source)
+        self.closed_rows_read += len(rows)
+        return rows
+
+    def baseline_closed_deals(self):
+        """
+        Show the Closed list once: its rows set the high-water mark of
+        read_new_closed_deals and are marked as older than anything the bot
+        places. Then go back to the Opened list.
+        """
+        with self.page_lock:
+            self.install_deal_feed()
+            self.click_closed_trades_tab()
+            rows = self.read_new_closed_deals(source="baseline")
+            if rows:
+                self.deals.baseline(rows)
+            self.logger.info(f"Deal tracker baseline: {len(rows or [])} closed deals")
+            self.click_opened_trades_tab()
+
+    def harvest_closed_deals(self, max_scrolls=30, pause=1.0):
+        """
+        Store the whole trade history the Closed list can show: scroll it to
+        the end until the site loads no more rows, then read every row into
+        self.history. The high-water mark of read_new_closed_deals is kept.
+
+        Args:
+            max_scrolls: Most scrolls to the end of the list
+            pause: Seconds to let the site load rows after a scroll
+
+        Returns:
+            Tuple: (rows listed, rows new to the history)
+        """
+        with self.page_lock:
+            self.click_closed_trades_tab()
+            listed = self.driver.execute_script(SCROLL_DEALS_LIST_SCRIPT, False)
+            for _ in range(max_scrolls):
+                time.sleep(pause)
+                more = self.driver.execute_script(SCROLL_DEALS_LIST_SCRIPT, True)
+                if more <= listed:
+                    break
+                listed = more
+            read = self.driver.execute_script(CLOSED_ROWS_SCRIPT, None, max(listed, 0))
+            self.driver.execute_script(SCROLL_DEALS_LIST_SCRIPT, False)
+        rows = read["rows"] if read is not None else []
+        added = self.history.add(rows, source="harvest") if self.history is not None else 0
+        self.logger.info(f"Harvested {len(rows)} closed deals, {added} new")
+        return len(rows), added
+
+    def match_closed_deals(self):
+        """
+        Read the new rows of the Closed list (showing it if needed) and match
+        them to the tracked deals. Call with page_lock held.
+
+        Returns:
+            The new rows, empty if the list could not be read
+        """
+        rows = self.read_new_closed_deals()
+        if rows is None:
+            self.click_closed_trades_tab()
+            rows = self.read_new_closed_deals()
+        if rows is None:
+            return []
+        for deal in self.deals.match(rows):
+            self.logger.info(f"Deal {deal['key']} ({deal['asset']}) closed: {deal['result']}")
+            if self.history is not None:
+                self.history.attach_deal(deal["row"], deal)
+        return rows
+
+    def settle_deal(self, deal, margin=5, poll_interval=0.1):
+        """
+        Wait for a tracked deal to close and return its result.
+
+        Sleeps until a second before the deal's expiry, then reads the Closed
+        list every poll_interval until the tracker matches a row to this deal
+        (a read by another chain of the session may match it first). Other
+        open deals closing meanwhile do not end the wait. While the market
+        tap is live its deal_closed events settle the deal, and the Closed
+        list is only read from a second after expiry on.
+
+        Args:
+            deal: Deal dict from self.deals, with expires_at set
+            margin: Seconds after expiry before giving up on matching
+            poll_interval: Seconds between reads near the end
+
+        Returns:
+            0 if win, 1 if loss, -1 if error
+        """
+        if deal["asset"] is None and deal["id"] is None:
+            self.logger.warning("Deal has no asset or id to match, waiting for any settlement")
+            self.deals.abandon(deal)
+            return self.wait_for_settlement(max(0, round(deal["expires_at"] - time.time())), margin)
+
+        deadline = deal["expires_at"] + margin
+        time.sleep(max(0, deal["expires_at"] - 1 - time.time()))
+        tap = self.market if self.market is not None and self.market.live() else None
+        read_page_after = deal["expires_at"] + 1 if tap is not None else 0
+        while deal["result"] is None and time.time() < deadline:
+            if tap is not None and self.settle_from_market(deal):
+                break
+            if time.time() >= read_page_after:
+                with self.page_lock:
+                    if deal["result"] is None:
+                        self.match_closed_deals()
+            if deal["result"] is None:
+                if tap is not None:
+                    tap.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+
+        if deal["result"] is None:
+            if len(self.deals.open_deals()) > 1:
+                error_msg = f"Deal {deal['key']} ({deal['asset']}) not found in the Closed list, other deals are open"
+                self.logger.error(error_msg)
+                if SCREENSHOT_LOGGER_AVAILABLE:
+                    capture_error_state(error_msg, "settle_deal")
+                self.deals.abandon(deal)
+                return -1
+            # The only open deal: the latest closed row is the best guess, as before
+            self.logger.warning(f"Deal {deal['key']} not matched within {margin}s of expiry, reading the latest result")
+            with self.page_lock:
+                result = self.get_bid_result(deal)
+                self.deals.abandon(deal, self.match_closed_deals())
+            return result
+
+        self.logger.info(f"Deal {deal['key']} matched {deal['settled_at'] - deal['expires_at']:+.2f}s after expiry")
+        return 1 if self.is_loss_result(deal["result"]) else 0
+
+    def settle_from_market(self, deal):
+        """
+        Settle a deal from a deal_closed event of the market tap.
+
+        Returns:
+            True if the tap reported the deal closed
+        """
+        closed = self.market.take_closed(deal["asset"], deal["amount"], since=deal["opened_at"])
+        if closed is None:
+            return False
+        # Stored as text like the page's results, is_loss_result reads both
+        self.deals.settle(deal, f"{closed['payout']:g}")
+        self.logger.info(f"Deal {deal['key']} ({deal['asset']}) closed: {closed['payout']:g} (websocket)")
+        return True
+
+    @staticmethod
+    def result_payout(text):
+        """Amount of a result text ("₪7.60", "$0", "-₪4"), None if it has no number."""
+        text = (text or "").replace(",", "")
+        match = re.search(r"\d+(?:\.\d+)?", text)
+        if match is None:
+            return None
+        payout = float(match.group())
+        return -payout if re.search(r"[-−]", text[:match.start()]) else payout
+
+    @classmethod
+    def is_loss_result(cls, text):
+        # A lost deal pays nothing (or, as net profit, less than nothing)
+        payout = cls.result_payout(text)
+        return payout is not None and payout <= 0
+
+    def get_bid_result(self, deal=None):
+        """
+        Check the result of the last closed bid.
+        
+        Args:
+            deal: The DealTracker deal, None for the latest open one
+            
+        Returns:
+            0 if win, 1 if loss, -1 if error
+        """
+        try:
+            if SCREENSHOT_LOGGER_AVAILABLE:
+                capture_before_critical_operation("get_bid_result")
+            
+            # The deal feed reports the result as soon as the Closed tab shows it
+            centered_text = self.feed_bid_result(deal)
+            if centered_text is None:
+                self.logger.info("No result from deal feed, reloading the Closed tab")
+                centered_text = self.read_last_closed_result()
+                if centered_text is None:
+                    return -1
             self.logger.info(f"Deal result value: {centered_text}")
             
             # Decision logic
-            if centered_text in ["₪0", "$0"]:
+            if self.is_loss_result(centered_text):
                 self.logger.info("Trade result: LOSS")
                 if SCREENSHOT_LOGGER_AVAILABLE:
                     capture_after_critical_operation("get_bid_result", success=True)
@@ -775,22 +1592,22 @@ class Clicker:
                 capture_error_state(error_msg, "compare_input_amount")
             return -1
             
-    def make_bid(self, bid, action):
+    def prepare_bid(self, bid):
         """
-        Make a bid with the specified amount and action.
+        Prepare a bid without placing it: open the trades tab, set the amount
+        and verify the input. Used by the arm phase so that firing only needs
+        the Buy/Sell click.
         
         Args:
             bid: Bid amount
-            action: "Buy" or "Sell"
             
         Returns:
-            True if successful, False otherwise
+            True if the amount is set and verified, False otherwise
         """
         try:
-            if SCREENSHOT_LOGGER_AVAILABLE:
-                capture_before_critical_operation("make_bid_script")
-            
             self.click_opened_trades_tab()
+            # Observe the deals list before the deal opens
+            self.install_deal_feed()
             time.sleep(0.5)
             
             # Set the input value
@@ -809,7 +1626,26 @@ class Clicker:
                     capture_error_state(error_msg, "make_bid_script")
                 return False
                 
-            # Execute the bid
+            return True
+            
+        except Exception as e:
+            error_msg = f"Error preparing bid: {str(e)}"
+            self.logger.error(error_msg)
+            if SCREENSHOT_LOGGER_AVAILABLE:
+                capture_error_state(error_msg, "make_bid_script")
+            return False
+            
+    def place_bid(self, action):
+        """
+        Place a bid whose amount was already set by prepare_bid.
+        
+        Args:
+            action: "Buy" or "Sell"
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
             click_successful = False
             max_attempts = 3
             
@@ -838,10 +1674,152 @@ class Clicker:
                 if SCREENSHOT_LOGGER_AVAILABLE:
                     capture_error_state(error_msg, "make_bid_script")
                 return False
+                
+            return True
             
+        except Exception as e:
+            error_msg = f"Error placing bid: {str(e)}"
+            self.logger.error(error_msg)
             if SCREENSHOT_LOGGER_AVAILABLE:
-                capture_after_critical_operation("make_bid_script", success=True)
-            return True
+                capture_error_state(error_msg, "make_bid_script")
+            return False
+            
+    def place_bid_script(self, bid, action, set_amount=True, timeout=10):
+        """
+        Set, verify and place a bid in one round trip (PLACE_BID_SCRIPT).
+
+        Args:
+            bid: Bid amount
+            action: "Buy" or "Sell"
+            set_amount: False to keep (but still verify) the amount set by prepare_bid
+            timeout: Seconds to wait for the new deal after the click
+
+        Returns:
+            Dict with ok, step and error (on failure), deal_id, timings, total_ms
+            and token (see bid_clicked)
+        """
+        self.invalidate_snapshot()
+        if action not in ("Buy", "Sell"):
+            return {"ok": False, "step": "action", "error": f"Invalid action: {action}"}
+        token = f"{id(self)}-{time.time()}"
+        start = time.time()
+        try:
+            result = self.driver.execute_async_script(
+                PLACE_BID_SCRIPT, bid, action, set_amount, int(timeout * 1000), token)
+        except Exception as e:
+            result = {"ok": False, "step": "script", "error": str(e)}
+        result["token"] = token
+        result["round_trip_ms"] = round((time.time() - start) * 1000, 1)
+        self.last_bid_timings = result.get("timings", {})
+        self.logger.info(
+            f"Bid placement {action} {bid}: steps {self.last_bid_timings} (ms), "
+            f"in page {result.get('total_ms')}ms, round trip {result['round_trip_ms']}ms"
+        )
+        return result
+
+    def bid_clicked(self, token):
+        """
+        Whether the placement with token got as far as its Buy/Sell click.
+
+        Returns:
+            True or False, None if the page could not be asked
+        """
+        try:
+            return self.driver.execute_script("return window.__lastBidClick || null;") == token
+        except Exception as e:
+            self.logger.error(f"Error checking the last bid click: {str(e)}")
+            return None
+
+    def find_placed_deal(self, timeout=3, poll_interval=0.2):
+        """
+        Look for the deal of a placement whose click may have gone through:
+        an Opened row on the current asset that no tracked deal accounts for.
+
+        Returns:
+            {id, asset, time_left} of the row, None if there is none after timeout
+        """
+        tracked = self.deals.open_deals()
+        deadline = time.time() + timeout
+        while True:
+            state = self.snapshot(max_age=0)
+            if state is not None and state["open_deals"] is None:
+                self.click_opened_trades_tab()
+                state = self.snapshot(max_age=0)
+            if state is not None and state["open_deals"]:
+                asset = normalize_asset(state["symbol"])
+                rows = [row for row in state["open_deals"] if normalize_asset(row["asset"]) == asset]
+                if any(row["id"] for row in rows):
+                    known = {deal["id"] for deal in tracked if deal["id"]}
+                    new = [row for row in rows if row["id"] and row["id"] not in known]
+                else:
+                    # No ids: rows on the asset beyond the tracked deals are new, newest first
+                    known = sum(1 for deal in tracked if normalize_asset(deal["asset"]) == asset)
+                    new = rows[:len(rows) - known]
+                if new:
+                    return new[0]
+            if time.time() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def make_bid(self, bid, action, prefilled=False, owner=None):
+        """
+        Make a bid with the specified amount and action.
+        The bid is placed with one script call (place_bid_script), the step
+        by step path (prepare_bid, place_bid) is the fallback when the script
+        failed before its Buy/Sell click. Once the click may have gone through
+        it is never repeated: the deal is looked up in the Opened list
+        (find_placed_deal) and the bid fails if it is not there. The new deal
+        is recorded in self.deals, see self.deals.last(owner).
+        
+        Args:
+            bid: Bid amount
+            action: "Buy" or "Sell"
+            prefilled: True if prepare_bid already set and verified the amount
+            owner: Who places the bid (e.g. the signal id)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            if SCREENSHOT_LOGGER_AVAILABLE:
+                capture_before_critical_operation("make_bid_script")
+            
+            result = self.place_bid_script(bid, action, set_amount=not prefilled)
+            opened = None
+            if result["ok"]:
+                self.last_deal_id = result.get("deal_id")
+                opened = result.get("deal")
+                self.logger.info(f"Successfully executed {action} action, deal {self.last_deal_id}")
+            elif result["step"] == "action":
+                self.logger.error(result["error"])
+                if SCREENSHOT_LOGGER_AVAILABLE:
+                    capture_error_state(result["error"], "make_bid_script")
+                return False
+            elif result["step"] in ("set_amount", "verify", "button") or (
+                    result["step"] == "script" and self.bid_clicked(result["token"]) is False):
+                # Failed before the click: nothing was bought, the step by step path starts over
+                self.logger.warning(
+                    f"Single-script placement failed at {result['step']}: {result.get('error')}, "
+                    f"using the step by step path"
+                )
+                self.last_deal_id = None
+                if not self.prepare_bid(bid):
+                    return False
+                if not self.place_bid(action):
+                    return False
+            else:
+                # The click may have gone through: never click again, look for the deal instead
+                self.last_deal_id = None
+                opened = self.find_placed_deal()
+                if opened is None:
+                    error_msg = (f"Placement failed at {result['step']} after the {action} click "
+                                 f"({result.get('error')}) and no new deal is listed")
+                    self.logger.error(error_msg)
+                    if SCREENSHOT_LOGGER_AVAILABLE:
+                        capture_error_state(error_msg, "make_bid_script")
+                    return False
+                self.last_deal_id = opened["id"]
+                self.logger.warning(f"Placement failed at {result['step']} but the deal is listed: {opened}")
                 
         except Exception as e:
             error_msg = f"Error making bid: {str(e)}"
@@ -850,6 +1828,21 @@ class Clicker:
                 capture_error_state(error_msg, "make_bid_script")
             return False
 
+        # The order is on the site: a failure to track it must not report it as not placed
+        try:
+            self.record_deal(bid, action, opened, owner)
+        except Exception as e:
+            error_msg = f"Deal placed but not recorded: {str(e)}"
+            self.logger.error(error_msg)
+            if SCREENSHOT_LOGGER_AVAILABLE:
+                capture_error_state(error_msg, "record_deal")
+            # Still tracked, with what is known: settle_deal falls back to the latest result
+            self.deals.record((opened or {}).get("asset"), bid, action,
+                              deal_id=(opened or {}).get("id"), owner=owner)
+        if SCREENSHOT_LOGGER_AVAILABLE:
+            capture_after_critical_operation("make_bid_script", success=True)
+        return True
+
     
          
     def close(self):
@@ -0,0 +1,144 @@
+import bisect
+import collections
+import json
+import re
+import threading
+import time
+import uuid
+
+# HTTP header carrying the correlation id next to the JSON "trace" field
+HEADER = "X-Correlation-Id"
+# Telegram has no headers: relayed messages end with a footer line instead
+FOOTER_MARK = "⏱ cid"
+FOOTER_PATTERN = re.compile(r"\n*" + FOOTER_MARK + r" ([0-9a-f]+)((?: [a-z-]+@\d+(?:\.\d+)?)*)\s*$")
+
+# Latency buckets (seconds) of the per-hop histograms
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900)
+
+
+def new_trace(trace_id=None):
+    """
+    A signal's trace: the correlation id minted where the signal enters the
+    system and the (stage, epoch seconds) stamps of every hop after it.
+    """
+    return {"id": trace_id or uuid.uuid4().hex[:12], "hops": []}
+
+
+def stamp(trace, stage, at=None):
+    """Record that trace reached stage (now, or at epoch seconds at)."""
+    if trace is not None:
+        trace["hops"].append([stage, round(time.time() if at is None else at, 3)])
+    return trace
+
+
+def last_stamp(trace, *stages):
+    """Time of the latest stamp of any of stages, None if there is none."""
+    for stage, at in reversed((trace or {}).get("hops") or []):
+        if stage in stages:
+            return at
+    return None
+
+
+def to_footer(trace):
+    """Footer line carrying trace through a Telegram message (Markdown safe, no underscores)."""
+    hops = "".join(f" {stage.replace('_', '-')}@{at}" for stage, at in trace["hops"])
+    return f"\n\n{FOOTER_MARK} {trace['id']}{hops}"
+
+
+def split_footer(text):
+    """
+    Separate a to_footer() line from a message.
+
+    Returns:
+        (text without the footer, trace or None)
+    """
+    match = FOOTER_PATTERN.search(text or "")
+    if match is None:
+        return text, None
+    trace = new_trace(match.group(1))
+    for hop in match.group(2).split():
+        stage, at = hop.split("@")
+        stamp(trace, stage.replace("-", "_"), float(at))
+    return text[:match.start()], trace
+
+
+def trace_of(data, headers=None):
+    """The trace of a request's JSON body, else a new one with the id of its HEADER (if any)."""
+    trace = data.get("trace") if isinstance(data, dict) else None
+    if isinstance(trace, dict) and trace.get("id"):
+        trace.setdefault("hops", [])
+        return trace
+    return new_trace((headers or {}).get(HEADER))
+
+
+class HopCollector:
+    """
+    Per-hop latency histograms of finished signal traces.
+
+    Each pair of consecutive stamps of a trace is one hop ("fire_sent ->
+    fire_received"), plus "total" from the first to the last stamp. Hops
+    between machines include their clock offset. Finished traces are also
+    appended to a JSONL file when a path is given.
+    """
+
+    def __init__(self, path=None, samples=500):
+        """
+        Args:
+            path: Optional JSONL file of the finished traces
+            samples: Latest latencies kept per hop for the percentiles
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._counts = {}  # hop -> bucket counts, the last one past BUCKETS[-1]
+        self._samples = {}  # hop -> deque of the latest latencies
+        self.sample_size = samples
+        self.traces = 0
+
+    def record(self, trace):
+        """Add a finished trace to the histograms."""
+        hops = (trace or {}).get("hops") or []
+        if len(hops) < 2:
+            return
+        latencies = [(f"{a[0]} -> {b[0]}", b[1] - a[1]) for a, b in zip(hops, hops[1:])]
+        latencies.append(("total", hops[-1][1] - hops[0][1]))
+        with self._lock:
+            self.traces += 1
+            for hop, latency in latencies:
+                counts = self._counts.setdefault(hop, [0] * (len(BUCKETS) + 1))
+                counts[bisect.bisect_left(BUCKETS, latency)] += 1
+                self._samples.setdefault(hop, collections.deque(maxlen=self.sample_size)).append(latency)
+        if self.path is not None:
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(trace, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Error writing signal trace: {e}")
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary hop -> count, p50/p90/max seconds and the bucket counts
+            (upper bound in seconds -> count, "inf" for the rest)
+        """
+        with self._lock:
+            stats = {}
+            for hop, counts in self._counts.items():
+                samples = sorted(self._samples[hop])
+                stats[hop] = {
+                    "count": sum(counts),
+                    "p50": round(samples[len(samples) // 2], 3),
+                    "p90": round(samples[int(len(samples) * 0.9)], 3),
+                    "max": round(samples[-1], 3),
+                    "buckets": {str(bound): count for bound, count in zip(BUCKETS + ("inf",), counts)},
+                }
+            return stats
+
+    def format(self):
+        """The hop latencies as a short text for Telegram."""
+        stats = self.stats()
+        if not stats:
+            return "No finished signal traces yet"
+        lines = [f"⏱ Signal hops ({self.traces} signals, seconds)", ""]
+        for hop, hop_stats in stats.items():
+            lines.append(f"{hop}: p50 {hop_stats['p50']} p90 {hop_stats['p90']} max {hop_stats['max']}")
+        return "\n".join(lines)
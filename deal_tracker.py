@@ -0,0 +1,233 @@
+import collections
+import itertools
+import re
+import threading
+import time
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_asset(name):
+    """"eur/usd  otc" -> "EUR/USDOTC", None for an empty name."""
+    return "".join((name or "").upper().split()) or None
+
+
+def row_signature(row):
+    """Identity of a Closed list row: its key, the site's deal id, else its texts."""
+    if row.get("key"):
+        return row["key"]
+    if row.get("id"):
+        return ("id", row["id"])
+    return ("row", row.get("asset"), row.get("time"), tuple(row.get("values") or ()), row.get("result"))
+
+
+def row_numbers(row):
+    """Numbers shown in a row's value cells, e.g. [4.0, 7.6] for "₪4", "₪7.60"."""
+    numbers = []
+    for text in row.get("values") or ():
+        for match in NUMBER_PATTERN.findall((text or "").replace(",", "")):
+            numbers.append(float(match))
+    return numbers
+
+
+class DealTracker:
+    """
+    Deals placed by the bot, matched to the rows of the Closed list.
+
+    Rows can be handed over all at once or incrementally, only the new ones
+    (Clicker.read_new_closed_deals): the latest rows that matched nothing
+    are kept and tried again with the next ones.
+
+    A deal is recorded when it is placed, with its asset, amount, open time
+    and expiry. A Closed row is matched by the site's deal id when the page
+    has one, otherwise to the expired open deal on the same asset, preferring
+    a row that shows the bid amount. Every row is matched at most once and
+    rows that were already listed at baseline() are never matched, so an
+    older deal on the same asset is not taken for a new one.
+
+    One tracker is shared by every session of the account, since they all
+    show the same Closed list.
+    """
+
+    def __init__(self, history=200, recent_rows=50):
+        """
+        Args:
+            history: Settled deals kept for stats()
+            recent_rows: Unmatched rows kept for the next match()
+        """
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._open = []  # recorded deals without a result, oldest first
+        self._settled = collections.deque(maxlen=history)
+        self._claimed = set()  # signatures of matched and baseline rows
+        self._last = {}  # owner -> latest deal
+        self._recent = []  # unmatched rows, newest first
+        self._awaiting_row = collections.deque(maxlen=history)  # settled by settle(), row not seen yet
+        self.recent_rows = recent_rows
+        self.abandoned = 0
+
+    def record(self, asset, amount, action, time_left=None, deal_id=None, owner=None):
+        """
+        Record a deal that was just placed.
+
+        Args:
+            asset: Asset name as the deals list shows it
+            amount: Bid amount
+            action: "Buy" or "Sell"
+            time_left: Countdown of the deal in seconds, None if unknown (see set_expiry)
+            deal_id: The site's id of the deal, None if the page has none
+            owner: Who placed it (e.g. the signal id), for last()
+
+        Returns:
+            The deal dict; "result" is filled in once a Closed row matches it
+        """
+        now = time.time()
+        deal = {
+            "key": next(self._counter),
+            "id": deal_id,
+            "asset": asset,
+            "amount": amount,
+            "action": action,
+            "owner": owner,
+            "opened_at": now,
+            "expires_at": now + time_left if time_left else None,
+            "result": None,
+            "settled_at": None,
+            "row": None,
+        }
+        with self._lock:
+            self._open.append(deal)
+            self._last[owner] = deal
+        return deal
+
+    def set_expiry(self, deal, time_left):
+        """Set the expiry of a deal recorded without a countdown."""
+        with self._lock:
+            deal["expires_at"] = time.time() + time_left
+
+    def last(self, owner=None):
+        """The latest deal recorded for owner, None if there is none."""
+        with self._lock:
+            return self._last.get(owner)
+
+    def open_deals(self):
+        with self._lock:
+            return list(self._open)
+
+    def baseline(self, rows):
+        """Mark rows listed before the bot placed anything as not ours."""
+        with self._lock:
+            self._claimed.update(row_signature(row) for row in rows)
+
+    def match(self, rows, now=None):
+        """
+        Match Closed rows to the open deals.
+
+        Args:
+            rows: Closed list rows (all, or only the new ones), newest first,
+                with id, asset, time, values (texts of the value cells) and result
+            now: Optional time.time() of the read
+
+        Returns:
+            List of the deals that got their result
+        """
+        now = time.time() if now is None else now
+        settled = []
+        with self._lock:
+            fresh = [row for row in rows if row_signature(row) not in self._claimed]
+            known = {row_signature(row) for row in fresh}
+            fresh += [row for row in self._recent if row_signature(row) not in known]
+            page_has_ids = any(row.get("id") for row in rows)
+            # Rows of deals settle() already settled are claimed first, keeping their result
+            for deal in list(self._awaiting_row):
+                row = self._find(deal, fresh, page_has_ids, now)
+                if row is None:
+                    continue
+                fresh.remove(row)
+                self._claimed.add(row_signature(row))
+                deal["row"] = row
+                self._awaiting_row.remove(deal)
+                settled.append(deal)
+            for deal in sorted(self._open, key=lambda deal: deal["expires_at"] or float("inf")):
+                row = self._find(deal, fresh, page_has_ids, now)
+                if row is None:
+                    continue
+                fresh.remove(row)
+                self._claimed.add(row_signature(row))
+                deal["result"] = row.get("result")
+                deal["settled_at"] = now
+                deal["row"] = row
+                settled.append(deal)
+            for deal in settled:
+                if deal in self._open:
+                    self._open.remove(deal)
+                    self._settled.append(deal)
+            self._recent = fresh[:self.recent_rows]
+        return settled
+
+    def settle(self, deal, result, now=None):
+        """
+        Settle a deal whose result came from elsewhere (the market tap).
+        Its Closed row is still claimed by match() when it shows up, so that
+        it is not taken for a later deal on the same asset.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if deal not in self._open:
+                return
+            self._open.remove(deal)
+            deal["result"] = result
+            deal["settled_at"] = now
+            self._settled.append(deal)
+            self._awaiting_row.append(deal)
+
+    def abandon(self, deal, rows=()):
+        """
+        Give up on matching a deal, e.g. after its result was read another
+        way. Unclaimed rows on its asset are claimed so that they can not be
+        matched to a later deal.
+        """
+        asset = normalize_asset(deal["asset"])
+        with self._lock:
+            if deal in self._open:
+                self._open.remove(deal)
+                self.abandoned += 1
+            for row in list(rows) + self._recent:
+                if asset is not None and normalize_asset(row.get("asset")) == asset:
+                    self._claimed.add(row_signature(row))
+            self._recent = [row for row in self._recent if row_signature(row) not in self._claimed]
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the open deals and how long after expiry the
+            settled ones were matched (last/max/avg seconds)
+        """
+        with self._lock:
+            lags = [deal["settled_at"] - deal["expires_at"] for deal in self._settled if deal["expires_at"]]
+            return {
+                "open": [
+                    {"asset": deal["asset"], "amount": deal["amount"], "owner": deal["owner"],
+                     "expires_in": round(deal["expires_at"] - time.time(), 1) if deal["expires_at"] else None}
+                    for deal in self._open
+                ],
+                "settled": len(self._settled),
+                "abandoned": self.abandoned,
+                "settle_lag_seconds": {
+                    "last": round(lags[-1], 3) if lags else 0.0,
+                    "max": round(max(lags), 3) if lags else 0.0,
+                    "avg": round(sum(lags) / len(lags), 3) if lags else 0.0,
+                },
+            }
+
+    def _find(self, deal, rows, page_has_ids, now):
+        if deal["id"] and page_has_ids:
+            return next((row for row in rows if row.get("id") == deal["id"]), None)
+        asset = normalize_asset(deal["asset"])
+        # A deal can not be in the Closed list before it expires
+        if asset is None or deal["expires_at"] is None or now < deal["expires_at"] - 1:
+            return None
+        candidates = [row for row in rows if normalize_asset(row.get("asset")) == asset]
+        with_amount = [row for row in candidates if float(deal["amount"]) in row_numbers(row)]
+        candidates = with_amount or candidates
+        return candidates[0] if candidates else None
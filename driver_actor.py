@@ -0,0 +1,142 @@
+import contextlib
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from tracing import tracer
+
+# Lower runs first
+CONTROL = 0   # /kill and shutdown
+PLACE = 1     # currency selection, amount input, order placement
+SETTLE = 2    # countdown and result reads of a running trade
+STATUS = 3    # balance and other status queries
+
+PRIORITY_NAMES = {CONTROL: "control", PLACE: "place", SETTLE: "settle", STATUS: "status"}
+
+
+class DriverActor:
+    """
+    Single owner of the WebDriver.
+
+    Selenium is not thread safe, so every browser interaction runs on this
+    actor's thread, taken from a priority queue: order placement beats
+    settlement reads, which beat status queries. Work is either a whole
+    function (submit) or, once attach() hooked the driver, each WebDriver
+    command of any thread. A command's priority is the one set on the calling
+    thread with priority() (STATUS by default). Calls made from the actor
+    thread itself run inline. Queued functions run under the caller's
+    tracing span and every command is counted on the current one.
+    """
+
+    def __init__(self, name="driver-actor"):
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            priority: {"count": 0, "wait_total": 0.0, "wait_max": 0.0, "wait_last": 0.0}
+            for priority in PRIORITY_NAMES
+        }
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, priority, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the actor thread.
+
+        Args:
+            priority: CONTROL, PLACE, SETTLE or STATUS
+
+        Returns:
+            concurrent.futures.Future with fn's result or exception
+        """
+        future = Future()
+        if self.on_actor_thread():
+            # Nested call: queueing it would wait on ourselves
+            self._execute(future, fn, args, kwargs)
+            return future
+        self._queue.put((priority, next(self._counter), time.time(), future, fn, args, kwargs, tracer.current()))
+        return future
+
+    def call(self, priority, fn, *args, **kwargs):
+        """submit() and wait for the result."""
+        return self.submit(priority, fn, *args, **kwargs).result()
+
+    def attach(self, driver):
+        """
+        Route every command of driver through the actor. WebDriver.execute is
+        the single entry point of driver and WebElement commands alike.
+        """
+        execute = driver.execute
+
+        def actor_execute(driver_command, params=None):
+            tracer.command()
+            return self.call(self.current_priority(), execute, driver_command, params)
+
+        driver.execute = actor_execute
+        return driver
+
+    @contextlib.contextmanager
+    def priority(self, priority):
+        """Run the WebDriver commands of this thread's block at priority."""
+        previous = getattr(self._local, "priority", None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        priority = getattr(self._local, "priority", None)
+        return STATUS if priority is None else priority
+
+    def on_actor_thread(self):
+        return threading.current_thread() is self._thread
+
+    def depth(self):
+        """Number of calls waiting for the actor thread."""
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the queue depth and, per priority, the number of
+            calls and their queue wait (last/max/avg seconds)
+        """
+        with self._stats_lock:
+            per_priority = {
+                PRIORITY_NAMES[priority]: {
+                    "count": stat["count"],
+                    "wait_seconds": {
+                        "last": round(stat["wait_last"], 4),
+                        "max": round(stat["wait_max"], 4),
+                        "avg": round(stat["wait_total"] / stat["count"], 4) if stat["count"] else 0.0,
+                    },
+                }
+                for priority, stat in self._stats.items()
+            }
+        return {"depth": self.depth(), "priorities": per_priority}
+
+    def _run(self):
+        while True:
+            priority, _, enqueued_at, future, fn, args, kwargs, span = self._queue.get()
+            wait = time.time() - enqueued_at
+            with self._stats_lock:
+                stat = self._stats[priority]
+                stat["count"] += 1
+                stat["wait_total"] += wait
+                stat["wait_last"] = wait
+                stat["wait_max"] = max(stat["wait_max"], wait)
+            with tracer.adopt(span):
+                self._execute(future, fn, args, kwargs)
+
+    @staticmethod
+    def _execute(future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
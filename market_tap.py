@@ -0,0 +1,305 @@
+import base64
+import collections
+import json
+import re
+import threading
+import time
+
+# socket.io over engine.io: "42" event, "45<n>-" event with n binary attachments,
+# either optionally followed by a namespace ("/x,") and an ack id
+SOCKET_IO_HEADER = re.compile(r"^4(2|5(\d+)-)(/[^,]*,)?(\d*)")
+
+
+def stream_asset_key(name):
+    """"EUR/USD OTC", "EURUSD_otc" -> "EURUSDOTC", None for an empty name."""
+    return re.sub(r"[^A-Z0-9]", "", (name or "").upper()) or None
+
+
+def _field(data, *names):
+    if not isinstance(data, dict):
+        return None
+    for name in names:
+        if data.get(name) is not None:
+            return data[name]
+    return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def decode_balance(data):
+    balance = _number(_field(data, "balance", "amount"))
+    return [("balance", {"balance": balance})] if balance is not None else []
+
+
+def decode_assets(data):
+    # [[id, symbol, name, type, group, payout, ...], ...] or [{symbol, payout}, ...]
+    events = []
+    for asset in data if isinstance(data, list) else []:
+        if isinstance(asset, list) and len(asset) > 5:
+            symbol, payout = asset[1], _number(asset[5])
+        else:
+            symbol, payout = _field(asset, "symbol", "asset"), _number(_field(asset, "payout", "profit"))
+        if symbol and payout is not None:
+            events.append(("payout", {"asset": symbol, "payout": payout}))
+    return events
+
+
+def decode_stream(data):
+    # [[asset, timestamp, price], ...]
+    events = []
+    for quote in data if isinstance(data, list) else []:
+        if isinstance(quote, list) and len(quote) >= 3:
+            events.append(("quote", {"asset": quote[0], "price": _number(quote[2]), "at": _number(quote[1])}))
+    return events
+
+
+def _deal(data):
+    return {
+        "id": _field(data, "id", "ticket"),
+        "asset": _field(data, "asset", "symbol"),
+        "amount": _number(_field(data, "amount", "sum")),
+        "expires_at": _number(_field(data, "closeTimestamp", "closeTime", "expiration")),
+    }
+
+
+def decode_opened(data):
+    return [("deal_opened", _deal(data))] if isinstance(data, dict) else []
+
+
+def decode_closed(data):
+    # {"deals": [{id, asset, amount, profit}, ...]} or a list of deals
+    deals = _field(data, "deals") if isinstance(data, dict) else data
+    events = []
+    for deal in deals if isinstance(deals, list) else []:
+        closed = _deal(deal)
+        closed["payout"] = _number(_field(deal, "profit", "win", "payout"))
+        # Without a payout the result is unknown, the Closed list settles the deal
+        if closed["payout"] is not None:
+            events.append(("deal_closed", closed))
+    return events
+
+
+# socket.io event name -> decoder. The names are those of the site's stream;
+# unknown names are only counted (see stats()), so a changed protocol shows
+# up there and never breaks the DOM reads
+DECODERS = {
+    "successupdateBalance": decode_balance,
+    "updateAssets": decode_assets,
+    "updateStream": decode_stream,
+    "successopenOrder": decode_opened,
+    "successcloseOrder": decode_closed,
+}
+
+
+class MarketTap:
+    """
+    Real-time market and account state from the site's own websocket.
+
+    Chrome's performance log (enabled with the goog:loggingPrefs capability)
+    carries the DevTools Network.webSocketFrameReceived events. A background
+    thread drains it, decodes the socket.io frames with DECODERS into typed
+    events (payout, quote, balance, deal_opened, deal_closed) and keeps the
+    latest state in memory. Clicker reads from here while the tap is live
+    and scrapes the DOM otherwise.
+    """
+
+    def __init__(self, driver, poll_interval=0.2, decoders=None):
+        """
+        Args:
+            driver: WebDriver started with performance logging
+            poll_interval: Seconds between drains of the performance log
+            decoders: socket.io event name -> decoder, defaults to DECODERS
+        """
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.decoders = DECODERS if decoders is None else decoders
+        self._condition = threading.Condition()
+        self._pending_binary = None  # [name, data, attachments left, attachments]
+        self._thread = None
+
+        self.balance = None
+        self.payouts = {}  # stream_asset_key -> payout
+        self.quotes = {}  # stream_asset_key -> (price, at)
+        self.open_deals = {}  # id -> deal
+        self.closed_deals = collections.deque(maxlen=200)
+        self.last_frame_at = 0
+        self.counters = collections.Counter()
+        self.unknown_events = collections.Counter()
+
+    def start(self):
+        """Enable the Network domain and start draining frames."""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+        except Exception as e:
+            print(f"Error enabling network events for the market tap: {e}")
+            return False
+        self._thread = threading.Thread(target=self._run, name="market-tap", daemon=True)
+        self._thread.start()
+        return True
+
+    def live(self, max_silence=10):
+        """True if the site's websocket sent something in the last max_silence seconds."""
+        return time.time() - self.last_frame_at <= max_silence
+
+    def payout(self, asset):
+        """Latest payout of asset (any spelling, see stream_asset_key), None if unknown."""
+        with self._condition:
+            return self.payouts.get(stream_asset_key(asset))
+
+    def take_closed(self, asset, amount=None, since=0):
+        """
+        Take the oldest deal_closed event on asset not taken yet.
+
+        Args:
+            asset: Asset name, any spelling
+            amount: Bid amount the deal must have, if the stream reports one
+            since: Epoch seconds the deal was opened after
+
+        Returns:
+            The event dict (id, asset, amount, payout, at), None if there is none
+        """
+        key = stream_asset_key(asset)
+        with self._condition:
+            for closed in self.closed_deals:
+                if (closed["taken"] or closed["at"] < since or stream_asset_key(closed["asset"]) != key
+                        or (amount is not None and closed["amount"] is not None
+                            and float(closed["amount"]) != float(amount))):
+                    continue
+                closed["taken"] = True
+                return closed
+            return None
+
+    def wait(self, timeout):
+        """Block until the next decoded event or timeout."""
+        with self._condition:
+            self._condition.wait(timeout)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "live": self.live(),
+                "seconds_since_frame": round(time.time() - self.last_frame_at, 1) if self.last_frame_at else None,
+                "assets_with_payout": len(self.payouts),
+                "open_deals": len(self.open_deals),
+                **self.counters,
+                "unknown_events": dict(self.unknown_events.most_common(10)),
+            }
+
+    def poll(self):
+        """Drain the performance log once and apply the websocket frames in it."""
+        for entry in self.driver.get_log("performance"):
+            message = entry.get("message", "")
+            # Most entries are other network events, skip them before parsing
+            if "Network.webSocketFrameReceived" not in message:
+                continue
+            try:
+                response = json.loads(message)["message"]["params"]["response"]
+            except (ValueError, KeyError, TypeError):
+                self.counters["bad_entries"] += 1
+                continue
+            self.feed(response.get("opcode"), response.get("payloadData", ""))
+
+    def feed(self, opcode, payload):
+        """
+        Decode one websocket frame and apply its events.
+
+        Args:
+            opcode: 1 for text, 2 for binary (payload is base64)
+            payload: Frame payload as reported by DevTools
+
+        Returns:
+            List of (type, event) tuples
+        """
+        self.counters["frames"] += 1
+        self.last_frame_at = time.time()
+        message = self._decode_frame(opcode, payload)
+        if message is None:
+            return []
+        name, data = message
+        decoder = self.decoders.get(name)
+        if decoder is None:
+            self.unknown_events[name] += 1
+            return []
+        try:
+            events = decoder(data)
+        except Exception as e:
+            self.counters["decode_errors"] += 1
+            print(f"Error decoding {name} frame: {e}")
+            return []
+        self._apply(events)
+        return events
+
+    def _decode_frame(self, opcode, payload):
+        if opcode == 2:
+            return self._decode_attachment(payload)
+        header = SOCKET_IO_HEADER.match(payload or "")
+        if header is None:
+            return None  # engine.io ping/pong, connect and other control frames
+        try:
+            body = json.loads(payload[header.end():])
+        except ValueError:
+            self.counters["bad_frames"] += 1
+            return None
+        if not isinstance(body, list) or not body:
+            return None
+        name, data = body[0], body[1] if len(body) > 1 else None
+        if header.group(2):
+            # Binary event: the data follows in as many binary frames
+            self._pending_binary = [name, data, int(header.group(2)), []]
+            return None
+        return name, data
+
+    def _decode_attachment(self, payload):
+        pending = self._pending_binary
+        if pending is None:
+            self.counters["orphan_binary_frames"] += 1
+            return None
+        raw = base64.b64decode(payload or "")
+        # engine.io v3 prefixes binary messages with 0x04
+        if raw[:1] == b"\x04":
+            raw = raw[1:]
+        try:
+            attachment = json.loads(raw.decode("utf-8"))
+        except ValueError:
+            attachment = raw
+        pending[3].append(attachment)
+        pending[2] -= 1
+        if pending[2] > 0:
+            return None
+        self._pending_binary = None
+        name, data, _, attachments = pending
+        if isinstance(data, dict) and data.get("_placeholder"):
+            data = attachments[data.get("num", 0)]
+        return name, data
+
+    def _apply(self, events):
+        now = time.time()
+        with self._condition:
+            for kind, event in events:
+                self.counters[kind] += 1
+                if kind == "balance":
+                    self.balance = event["balance"]
+                elif kind == "payout":
+                    self.payouts[stream_asset_key(event["asset"])] = event["payout"]
+                elif kind == "quote":
+                    self.quotes[stream_asset_key(event["asset"])] = (event["price"], event["at"])
+                elif kind == "deal_opened":
+                    self.open_deals[event["id"]] = event
+                elif kind == "deal_closed":
+                    self.open_deals.pop(event["id"], None)
+                    self.closed_deals.append(dict(event, at=now, taken=False))
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                self.counters["poll_errors"] += 1
+                print(f"Error polling the market tap: {e}")
+            time.sleep(self.poll_interval)
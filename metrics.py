@@ -0,0 +1,176 @@
+import bisect
+import math
+import threading
+
+# Default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _Metric:
+    """
+    Base of Counter and Histogram: values are kept in one shard per thread.
+
+    A thread only ever writes its own shard (a dict created the first time
+    it records), so recording takes no lock and never waits for another
+    thread or for a scrape. render() sums the shards.
+
+    The web server runs every request on a new thread, so the shards of
+    threads that have ended are folded into one base total (when a new
+    shard is created and on every read) instead of piling up.
+    """
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        """
+        Args:
+            name: Prometheus metric name
+            help_text: HELP line
+            labelnames: Names of the labels, their values are passed in that order
+            registry: Registry to add to, the module's REGISTRY by default
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, shard) of the threads that recorded
+        self._base = {}  # folded shards of ended threads
+        self._lock = threading.Lock()  # shard list and base, never taken to record
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold_ended()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_ended(self):
+        # Lock held. An ended thread no longer writes its shard
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._base, shard.items())
+        self._shards = live
+
+    def _snapshot(self):
+        """The shards' items, copied; a shard may grow while it is read."""
+        with self._lock:
+            self._fold_ended()
+            items = list(self._merge({}, self._base.items()).items())
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            while True:
+                try:
+                    items.extend(list(shard.items()))
+                    break
+                except RuntimeError:
+                    continue
+        return items
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return sum(count for key, count in self._snapshot() if key == labels)
+
+    @staticmethod
+    def _merge(total, items):
+        for key, count in items:
+            total[key] = total.get(key, 0) + count
+        return total
+
+    def _samples(self):
+        totals = {}
+        for key, count in self._snapshot():
+            totals[key] = totals.get(key, 0) + count
+        return [f"{self.name}{self._labels(key)} {_format(count)}" for key, count in sorted(totals.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Bucket counts (the last one past the highest bound), sum
+            entry = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def _merge(self, total, items):
+        for key, (counts, value_sum) in items:
+            merged = total.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            for index, count in enumerate(list(counts)):
+                merged[0][index] += count
+            merged[1] += value_sum
+        return total
+
+    def _samples(self):
+        totals = {}
+        for key, (counts, total) in self._snapshot():
+            merged = totals.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            for index, count in enumerate(list(counts)):
+                merged[0][index] += count
+            merged[1] += total
+        lines = []
+        for key, (counts, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _format(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics exposed together, in the Prometheus text format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+REGISTRY = Registry()
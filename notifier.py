@@ -0,0 +1,123 @@
+import collections
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Notifier:
+    """
+    Background sender for notifications to telebot.
+
+    post() only appends to a bounded in-memory queue and returns, so the
+    trading thread never waits on telebot. One daemon thread delivers the
+    notifications in order over a keep-alive session, retrying failures with
+    backoff. When the queue is full the oldest notification is dropped.
+    Delivery lag, retries and drops are reported by stats().
+    """
+
+    def __init__(self, base_url="http://localhost:5001", maxsize=200, retries=3, backoff_seconds=0.5, timeout=5):
+        """
+        Args:
+            base_url: Base URL of telebot's notify server
+            maxsize: Notifications kept in memory before the oldest is dropped
+            retries: Extra delivery attempts after a failure
+            backoff_seconds: Wait before the first retry, doubled after each one
+            timeout: Seconds per delivery attempt
+        """
+        self.base_url = base_url.rstrip("/")
+        self.maxsize = maxsize
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._sent = 0
+        self._failed = 0
+        self._dropped = 0
+        self._retried = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._total_lag = 0.0
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    def post(self, path, payload):
+        """
+        Queue a JSON notification. Never blocks.
+
+        Args:
+            path: Endpoint path on telebot, e.g. "/notify-lost"
+            payload: JSON-serializable dict (not copied, pass a snapshot)
+        """
+        with self._condition:
+            if len(self._queue) >= self.maxsize:
+                dropped_path, _, _ = self._queue.popleft()
+                self._dropped += 1
+                print(f"Notifier queue full, dropped oldest {dropped_path} notification")
+            self._queue.append((path, payload, time.time()))
+            self._condition.notify()
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the queue depth, delivery counters and lag in seconds
+        """
+        with self._condition:
+            return {
+                "depth": len(self._queue),
+                "capacity": self.maxsize,
+                "sent": self._sent,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "retried": self._retried,
+                "lag_seconds": {
+                    "last": round(self._last_lag, 3),
+                    "max": round(self._max_lag, 3),
+                    "avg": round(self._total_lag / self._sent, 3) if self._sent else 0.0,
+                },
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                path, payload, enqueued_at = self._queue.popleft()
+
+            delivered = self._deliver(path, payload)
+
+            with self._condition:
+                if delivered:
+                    lag = time.time() - enqueued_at
+                    self._sent += 1
+                    self._last_lag = lag
+                    self._max_lag = max(self._max_lag, lag)
+                    self._total_lag += lag
+                else:
+                    self._failed += 1
+
+    def _deliver(self, path, payload):
+        url = self.base_url + path
+        delay = self.backoff_seconds
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._condition:
+                    self._retried += 1
+                time.sleep(delay)
+                delay *= 2
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code < 500:
+                    if response.status_code != 200:
+                        print(f"Notification to {path} rejected:", response.text)
+                    else:
+                        print(f"Notification sent to {path}:", response.text)
+                    return response.status_code == 200
+                print(f"Notification to {path} failed ({response.status_code}), attempt {attempt + 1}")
+            except requests.RequestException as e:
+                print(f"Error sending notification to {path}, attempt {attempt + 1}:", e)
+        return False
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Seconds a keep-alive connection may sit idle between requests
+IDLE_TIMEOUT = 30
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class NotifyServer:
+    """
+    Minimal JSON-over-HTTP/1.1 server running on an asyncio loop.
+
+    Used by telebot to receive notifications from the trading bot on the
+    Telethon loop itself, so handlers can await the Telegram client directly.
+    Connections are kept alive between requests.
+
+    Example:
+        server = NotifyServer()
+
+        @server.route('/notify-results')
+        async def notify_results(data):
+            return {"status": "success"}, 200
+
+        await server.start("0.0.0.0", 5001)
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.server = None
+
+    def route(self, path, methods=("POST",)):
+        """
+        Register a coroutine handler(data) -> (json_body, status) for path.
+        data is the decoded JSON request body (None if there is none).
+        """
+        def decorator(handler):
+            self.routes[path] = (handler, tuple(methods))
+            return handler
+        return decorator
+
+    async def start(self, host, port):
+        """Start listening. The server runs on the current loop until closed."""
+        self.server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Notify server listening on {host}:{port}")
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, {"error": "headers too large"}, 413, keep_alive=False)
+                    return
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, {"error": "bad request line"}, 400, keep_alive=False)
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    await self._respond(writer, {"error": "bad content-length"}, 400, keep_alive=False)
+                    return
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, {"error": "body too large"}, 413, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+                payload, status = await self._dispatch(method, target.split("?", 1)[0], body)
+                await self._respond(writer, payload, status, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        route = self.routes.get(path)
+        if route is None:
+            return {"error": "not found"}, 404
+        handler, methods = route
+        if method not in methods:
+            return {"error": "method not allowed"}, 405
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return {"error": "invalid JSON"}, 400
+        try:
+            return await handler(data)
+        except Exception as e:
+            print(f"Error handling {path}: {e}")
+            return {"error": str(e)}, 500
+
+    async def _respond(self, writer, payload, status, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
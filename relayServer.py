@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 import requests
 import os
+from correlation import stamp, to_footer, trace_of
 
 app = Flask(__name__)
 
@@ -12,14 +13,19 @@ TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
 def relay_message():
     """Simple endpoint that forwards WhatsApp messages directly to Telegram"""
     try:
-        # Get message from WhatsApp bot
+        # Get message from WhatsApp bot: {"text", "trace"}, or the bare text
         message_data = request.get_json()
+        trace = stamp(trace_of(message_data, request.headers), "relay_received")
+        if isinstance(message_data, dict) and "text" in message_data:
+            message_data = message_data["text"]
         
         # Format message as text
         if isinstance(message_data, str):
             telegram_message = f"📱 WhatsApp Message:\n\n{message_data}"
         else:
             telegram_message = f"📱 WhatsApp Message:\n\n{str(message_data)}"
+        # Telegram has no headers, telebot reads the trace back from the footer
+        telegram_message += to_footer(trace)
         
         # Send to Telegram using the Bot API
         telegram_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
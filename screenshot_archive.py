@@ -0,0 +1,242 @@
+import collections
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+# Frames are stored at most this wide (Pillow only)
+MAX_WIDTH = 960
+JPEG_QUALITY = 60
+
+
+class ScreenshotArchive:
+    """
+    Content-addressed store of screenshot frames with an index. Only the
+    frames before an error are stored (see ScreenshotRing.save()).
+
+    Each frame is downscaled to MAX_WIDTH and recompressed as JPEG (PNG as
+    grabbed when Pillow is not installed), then stored once under the hash
+    of its bytes in blobs/: only a frame identical to a stored one (a page
+    that did not change at all) reuses its blob. Frames are never matched by
+    similarity, a changed amount or result cell is too small to tell apart
+    from noise and every frame has to show the state it is labelled with.
+
+    The index is a JSONL journal of "frame" records (at, source, operation,
+    phase, sequence, blob) and "error" records (at, source, operation, message, the
+    blobs of the frames before it), replayed by load() and searched by
+    find(). prune() drops records older than max_age and then the oldest
+    until the blobs fit in max_bytes, deletes the blobs no record uses and
+    compacts the index.
+    """
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024, max_age=7 * 24 * 3600, prune_every=200):
+        """
+        Args:
+            directory: Folder of the index and the blobs
+            max_bytes: Disk budget of the blobs
+            max_age: Seconds a record is kept
+            prune_every: prune() after this many new records
+        """
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._records = collections.deque()  # oldest first
+        self._blob_sizes = {}  # blob -> bytes on disk
+        self._since_prune = 0
+        self.counters = collections.Counter()
+
+    def load(self):
+        """
+        Replay the index and apply the retention policy.
+
+        Returns:
+            Number of records restored
+        """
+        if os.path.exists(self.index_path):
+            with self._lock, open(self.index_path, encoding="utf-8") as index:
+                for line in index:
+                    try:
+                        self._records.append(json.loads(line))
+                    except ValueError:
+                        # A torn last line from a crash, ignore it
+                        continue
+        blobs_path = os.path.join(self.directory, "blobs")
+        for root, _, files in os.walk(blobs_path):
+            for name in files:
+                self._blob_sizes[name] = os.path.getsize(os.path.join(root, name))
+        self.prune()
+        return len(self._records)
+
+    def add(self, png, operation, phase=None, source=None, at=None, sequence=None):
+        """
+        Store a frame.
+
+        Args:
+            png: Screenshot as grabbed (PNG bytes)
+            operation: Operation it was taken for, e.g. "make_bid"
+            phase: "failed" or "error", None for a frame taken around the operation
+            source: Browser session it comes from
+            at: Epoch seconds it was taken, now by default
+            sequence: Capture request it serves (see ScreenshotRing)
+
+        Returns:
+            The blob name, None if it could not be stored
+        """
+        data, extension = self._encode(png)
+        blob = hashlib.sha1(data).hexdigest() + extension
+        with self._lock:
+            if blob in self._blob_sizes:
+                self.counters["duplicates"] += 1
+            elif not self._write_blob(blob, data):
+                return None
+            self._append({
+                "op": "frame", "at": time.time() if at is None else at, "source": source,
+                "operation": operation, "phase": phase, "sequence": sequence, "blob": blob,
+            })
+        self._maybe_prune()
+        return blob
+
+    def add_error(self, message, operation, blobs, source=None, at=None):
+        """Record an error and the frames (blob names) before it."""
+        with self._lock:
+            self._append({
+                "op": "error", "at": time.time() if at is None else at, "source": source,
+                "operation": operation, "message": message, "frames": [blob for blob in blobs if blob],
+            })
+        self._maybe_prune()
+
+    def find(self, operation=None, since=None, until=None, source=None, errors_only=False, limit=200):
+        """
+        Index records matching every given filter, newest first.
+
+        Returns:
+            List of records; blob paths are blob_path(record["blob"])
+        """
+        matches = []
+        with self._lock:
+            for record in reversed(self._records):
+                if len(matches) >= limit:
+                    break
+                if ((errors_only and record["op"] != "error")
+                        or (operation is not None and record.get("operation") != operation)
+                        or (source is not None and record.get("source") != source)
+                        or (since is not None and record["at"] < since)
+                        or (until is not None and record["at"] > until)):
+                    continue
+                matches.append(dict(record))
+        return matches
+
+    def blob_path(self, blob):
+        return os.path.join(self.directory, "blobs", blob[:2], blob)
+
+    def prune(self, now=None):
+        """
+        Apply the age and size limits.
+
+        Returns:
+            Number of blobs deleted
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._since_prune = 0
+            while self._records and self._records[0]["at"] < now - self.max_age:
+                self._records.popleft()
+            references = collections.Counter()
+            for record in self._records:
+                references.update(self._blobs_of(record))
+            used = sum(self._blob_sizes.get(blob, 0) for blob in references)
+            while self._records and used > self.max_bytes:
+                for blob in self._blobs_of(self._records.popleft()):
+                    references[blob] -= 1
+                    if references[blob] == 0:
+                        used -= self._blob_sizes.get(blob, 0)
+            deleted = 0
+            for blob in [blob for blob in self._blob_sizes if references[blob] <= 0]:
+                try:
+                    os.remove(self.blob_path(blob))
+                except OSError:
+                    pass
+                del self._blob_sizes[blob]
+                deleted += 1
+            self._compact()
+        self.counters["pruned_blobs"] += deleted
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "records": len(self._records),
+                "blobs": len(self._blob_sizes),
+                "bytes": sum(self._blob_sizes.values()),
+                "pillow": PILLOW_AVAILABLE,
+                **self.counters,
+            }
+
+    @staticmethod
+    def _blobs_of(record):
+        return [record["blob"]] if record["op"] == "frame" else record.get("frames", [])
+
+    @staticmethod
+    def _encode(png):
+        if not PILLOW_AVAILABLE:
+            return png, ".png"
+        try:
+            image = Image.open(io.BytesIO(png))
+            image.load()
+        except Exception as e:
+            print(f"Error decoding screenshot, storing it as grabbed: {e}")
+            return png, ".png"
+        if image.width > MAX_WIDTH:
+            image = image.resize((MAX_WIDTH, round(image.height * MAX_WIDTH / image.width)))
+        output = io.BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        return output.getvalue(), ".jpg"
+
+    def _write_blob(self, blob, data):
+        path = self.blob_path(blob)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(data)
+        except OSError as e:
+            print(f"Error writing screenshot: {e}")
+            return False
+        self._blob_sizes[blob] = len(data)
+        self.counters["blobs_written"] += 1
+        return True
+
+    def _maybe_prune(self):
+        self._since_prune += 1
+        if self._since_prune >= self.prune_every:
+            self.prune()
+
+    def _append(self, record):
+        self._records.append(record)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as index:
+                index.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Error writing screenshot index: {e}")
+
+    def _compact(self):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as index:
+                for record in self._records:
+                    index.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Error compacting screenshot index: {e}")
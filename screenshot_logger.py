@@ -0,0 +1,221 @@
+import collections
+import os
+import threading
+import time
+
+# Frames kept per browser, the ones before an error are what gets saved
+RING_SIZE = 20
+# Requests closer together than this share one frame
+MIN_INTERVAL = 0.5
+# How long a grab waits for the driver actor to have no queued calls
+IDLE_WAIT = 2.0
+ERROR_DIRECTORY = "screenshots"
+
+
+class ScreenshotRing:
+    """
+    The last frames of one browser, grabbed in the background.
+
+    A capture request only notes the operation and wakes the grabber thread,
+    so the trading path does not wait for the screenshot. The grabber
+    coalesces requests closer than min_interval, waits (up to IDLE_WAIT) for
+    the driver actor to have nothing queued and takes the screenshot at the
+    actor's STATUS priority, so trading commands always run first. Frames go
+    to a bounded ring in memory; only save() writes them, with a last frame
+    of the error state, to disk.
+
+    A frame therefore shows the page when it was grabbed, usually after the
+    operation that asked for it has run, never reliably before it. Frames
+    are labelled with their capture time and the sequence number of the
+    latest request they serve, not with "before"/"after"; only "failed" and
+    "error" are kept, those frames are taken after the failure.
+
+    With an archive (ScreenshotArchive) save() stores the ring's frames there
+    instead of in a folder and records the error in the archive's index. A
+    stored frame only keeps its blob name, so a frame before two errors is
+    stored once.
+    """
+
+    def __init__(self, driver, actor=None, capacity=RING_SIZE, min_interval=MIN_INTERVAL,
+                 directory=ERROR_DIRECTORY, archive=None, source=None):
+        """
+        Args:
+            driver: WebDriver to grab from (attached to actor, if any)
+            actor: DriverActor of driver, None for a driver used directly
+            capacity: Frames kept
+            min_interval: Seconds between two grabs
+            directory: Where save() writes without an archive
+            archive: Optional ScreenshotArchive save() stores the frames in
+            source: Name of the browser session, kept in the archive
+        """
+        self.driver = driver
+        self.actor = actor
+        self.min_interval = min_interval
+        self.directory = directory
+        self.archive = archive
+        self.source = source
+        self.frames = collections.deque(maxlen=capacity)  # (taken_at, sequence, operation, phase, png, blob)
+        self._requests = collections.deque(maxlen=capacity)  # (sequence, operation, phase)
+        self._sequence = 0
+        self._errors = collections.deque()  # (at, message, operation)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._last_grab = 0
+        self.counters = collections.Counter()
+        self._thread = threading.Thread(target=self._run, name="screenshot-ring", daemon=True)
+        self._thread.start()
+
+    def request(self, operation, phase=None):
+        """Ask for a frame of operation (phase "failed" after a failure, else None), returns at once."""
+        with self._lock:
+            self._sequence += 1
+            self._requests.append((self._sequence, operation, phase))
+        self.counters["requests"] += 1
+        self._wakeup.set()
+
+    def save(self, error_message, operation):
+        """Write the ring and a frame of the error state to disk, in the background."""
+        self._errors.append((time.time(), error_message, operation))
+        self._wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            size = sum(len(frame[4]) for frame in self.frames if frame[4] is not None)
+            return {"frames": len(self.frames), "bytes": size, **self.counters}
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._errors:
+                # Errors skip the rate limit, the frame of the failure is the one that matters
+                self._requests.clear()
+                with self._lock:
+                    sequence = self._sequence
+                self._grab(sequence, self._errors[-1][2], "error")
+                while self._errors:
+                    self._write(*self._errors.popleft())
+                continue
+            if not self._requests:
+                continue
+            time.sleep(max(0, self._last_grab + self.min_interval - time.time()))
+            # Coalesced: one frame for every request so far, labelled with the latest
+            sequence, operation, phase = self._requests.pop()
+            self._requests.clear()
+            self._grab(sequence, operation, phase)
+
+    def _grab(self, sequence, operation, phase):
+        started = time.time()
+        while self.actor is not None and self.actor.depth() and time.time() - started < IDLE_WAIT:
+            time.sleep(0.05)
+        try:
+            png = self.driver.get_screenshot_as_png()
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Error taking screenshot: {e}")
+            return
+        finally:
+            self._last_grab = time.time()
+        with self._lock:
+            self.frames.append((self._last_grab, sequence, operation, phase, png, None))
+        self.counters["frames"] += 1
+
+    def _archive_frame(self, frame):
+        taken_at, sequence, operation, phase, png, blob = frame
+        if blob is not None:
+            return frame
+        blob = self.archive.add(png, operation, phase, self.source, at=taken_at, sequence=sequence)
+        if blob is None:
+            return frame
+        stored = (taken_at, sequence, operation, phase, None, blob)
+        with self._lock:
+            # The ring may have moved on since it was copied
+            for index, current in enumerate(self.frames):
+                if current is frame:
+                    self.frames[index] = stored
+                    break
+        return stored
+
+    def _write(self, at, error_message, operation):
+        with self._lock:
+            frames = list(self.frames)
+        if self.archive is not None:
+            frames = [self._archive_frame(frame) for frame in frames]
+            self.archive.add_error(error_message, operation, [frame[5] for frame in frames], self.source, at=at)
+            # Frames the archive could not store are written as without one
+            frames = [frame for frame in frames if frame[4] is not None]
+            if not frames:
+                self.counters["saved"] += 1
+                return
+        folder = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(at))}_{operation}")
+        try:
+            os.makedirs(folder, exist_ok=True)
+            for index, (taken_at, sequence, frame_operation, phase, png, _) in enumerate(frames):
+                # Capture time (ms) and request sequence, see the class docstring
+                taken = time.strftime('%H%M%S', time.localtime(taken_at)) + f".{int(taken_at * 1000) % 1000:03d}"
+                name = f"{index:02d}_{taken}_{sequence:05d}_{frame_operation}{'_' + phase if phase else ''}.png"
+                with open(os.path.join(folder, name), "wb") as file:
+                    file.write(png)
+            with open(os.path.join(folder, "error.txt"), "w", encoding="utf-8") as file:
+                file.write(f"{operation}: {error_message}\n")
+        except OSError as e:
+            print(f"Error saving screenshots: {e}")
+            return
+        self.counters["saved"] += 1
+        print(f"Saved {len(frames)} screenshots of {operation} to {folder}")
+
+
+_rings = []
+_local = threading.local()
+
+
+def register_driver(driver, actor=None, **options):
+    """
+    Capture from driver. Calls made on actor's thread, or on a thread that
+    called bind_driver(driver), use its ring; other threads use the first
+    registered driver's.
+
+    Returns:
+        The ScreenshotRing
+    """
+    ring = ScreenshotRing(driver, actor, **options)
+    _rings.append(ring)
+    return ring
+
+
+def bind_driver(driver):
+    """Make the calling thread's captures use driver's ring."""
+    _local.ring = next((ring for ring in _rings if ring.driver is driver), None)
+
+
+def _current_ring():
+    for ring in _rings:
+        if ring.actor is not None and ring.actor.on_actor_thread():
+            return ring
+    ring = getattr(_local, "ring", None)
+    if ring is not None:
+        return ring
+    return _rings[0] if _rings else None
+
+
+def capture_before_critical_operation(operation_name):
+    # Grabbed once the actor's queue drains, so not the state before the operation
+    ring = _current_ring()
+    if ring is not None:
+        ring.request(operation_name)
+
+
+def capture_after_critical_operation(operation_name, success=True):
+    ring = _current_ring()
+    if ring is not None:
+        ring.request(operation_name, None if success else "failed")
+
+
+def capture_error_state(error_message, operation_name):
+    ring = _current_ring()
+    if ring is not None:
+        ring.save(error_message, operation_name)
+
+
+def stats():
+    return [ring.stats() for ring in _rings]
@@ -0,0 +1,172 @@
+import threading
+import time
+
+from driver_actor import CONTROL
+
+
+def conflict_keys(signal):
+    """
+    Resources a signal's trade holds while it runs.
+
+    Two signals conflict when they trade the same currency or come from the
+    same signal group; conflicting signals never run at the same time.
+
+    Args:
+        signal: Signal dict from telebot
+
+    Returns:
+        Set of hashable keys
+    """
+    keys = set()
+    currency = signal.get("currancy")
+    if currency:
+        keys.add(("currency", currency.strip().upper()))
+    group = signal.get("source_chat")
+    if group:
+        keys.add(("group", group))
+    return keys
+
+
+class TradingSession:
+    """
+    One independently initialized browser: its driver, the actor that owns
+    it, its Clicker and its currency tabs. Every worker of a session trades
+    one signal at a time; several workers share the browser, one currency
+    tab per chain, taking turns on the page through clicker.page_lock.
+    """
+
+    def __init__(self, name, driver, actor, clicker, tab_pool):
+        self.name = name
+        self.driver = driver
+        self.actor = actor
+        self.clicker = clicker
+        self.tab_pool = tab_pool
+        self.chains = 0
+
+    def quit(self):
+        """Close the browser, ahead of anything queued for it."""
+        self.actor.call(CONTROL, self.driver.quit)
+
+    def stats(self):
+        stats = self.actor.stats()
+        stats["name"] = self.name
+        stats["chains"] = self.chains
+        stats["currency_tabs"] = self.tab_pool.stats()
+        if self.clicker.market is not None:
+            stats["market_tap"] = self.clicker.market.stats()
+        return stats
+
+
+class Chain:
+    """A signal being traded: the session trading it and the execution data reported to telebot."""
+
+    def __init__(self, signal, session):
+        self.signal = signal
+        self.session = session
+        self.keys = conflict_keys(signal)
+        self.started_at = time.time()
+        self.execution_data = None
+
+    @property
+    def signal_id(self):
+        return self.signal["signal_id"]
+
+    @property
+    def clicker(self):
+        return self.session.clicker
+
+
+class SessionPool:
+    """
+    Schedules queued signals onto free sessions.
+
+    Every session has worker threads blocked in next_chain(). A worker takes
+    the earliest queued signal that conflicts with no running chain, so
+    signals on different currencies from different groups run their
+    martingale chains in parallel, while a conflicting signal waits in the
+    queue until the chain holding its currency or group ends. Since no two
+    running chains trade the same asset, their deals are told apart in the
+    shared Closed list (see DealTracker).
+    """
+
+    def __init__(self, signal_queue):
+        """
+        Args:
+            signal_queue: SignalQueue the workers take signals from
+        """
+        self.signal_queue = signal_queue
+        self.sessions = []
+        self._lock = threading.Lock()
+        self._running = {}  # signal_id -> Chain
+        self._held = set()  # conflict keys of the running chains
+
+    def add(self, session):
+        self.sessions.append(session)
+
+    def primary(self):
+        """The first session, for account-wide queries such as the balance."""
+        return self.sessions[0] if self.sessions else None
+
+    def next_chain(self, session):
+        """
+        Block until a signal session may trade arrives.
+
+        Args:
+            session: Free TradingSession asking for work
+
+        Returns:
+            Chain of the signal, already holding its conflict keys
+        """
+        claimed = []
+
+        def accept(signal):
+            chain = Chain(signal, session)
+            with self._lock:
+                if chain.keys & self._held:
+                    return False
+                self._held |= chain.keys
+                self._running[chain.signal_id] = chain
+            claimed.append(chain)
+            return True
+
+        self.signal_queue.get(accept=accept)
+        session.chains += 1
+        return claimed[-1]
+
+    def finish(self, chain):
+        """Release a chain's conflict keys and let waiting workers look at the queue again."""
+        with self._lock:
+            self._held -= chain.keys
+            if self._running.get(chain.signal_id) is chain:
+                del self._running[chain.signal_id]
+        self.signal_queue.wakeup()
+
+    def is_running(self, signal_id):
+        with self._lock:
+            return signal_id in self._running
+
+    def running(self):
+        """
+        Returns:
+            List of {"signal_id", "session", "seconds"} for the running chains
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                {"signal_id": signal_id, "session": chain.session.name,
+                 "seconds": round(now - chain.started_at, 1)}
+                for signal_id, chain in self._running.items()
+            ]
+
+    def quit_all(self):
+        for session in self.sessions:
+            try:
+                session.quit()
+            except Exception as e:
+                print(f"Error quitting {session.name}: {e}")
+
+    def stats(self):
+        return {
+            "sessions": [session.stats() for session in self.sessions],
+            "running": self.running(),
+        }
@@ -0,0 +1,369 @@
+import re
+import string
+from functools import lru_cache
+from datetime import datetime, timedelta
+
+# Telegram caps messages at 4096 characters, anything longer is not a signal
+MAX_SIGNAL_LENGTH = 4096
+
+WHATSAPP_HEADER = "📱 WhatsApp Message:"
+
+# Compile a regex to detect Hebrew characters
+hebrew_pattern = re.compile(r'[\u0590-\u05FF]')
+
+# Every pattern is compiled once. Each one starts with a literal, is anchored
+# or is guarded by a lookbehind, so no match attempt rescans a run of
+# characters that an earlier attempt already consumed: parsing is linear in
+# the length of the message, which is capped at MAX_SIGNAL_LENGTH.
+_LEADING_OTC = re.compile(r'([A-Za-z0-9]+)\s+OTC', re.IGNORECASE)
+_OTC_WORD = re.compile(r'[^\w]([A-Za-z0-9]+)[\s]+OTC')
+_EMOJI = re.compile(r'[\U00010000-\U0010ffff]', flags=re.UNICODE)
+_EXPIRATION_KEYWORD = re.compile(r'תוקף|תפוגה|Expiration', re.IGNORECASE)
+_DIGITS = re.compile(r'\d+')
+_LEVEL_HE = re.compile(r'רמה\s+(?:\d️⃣|\d+)\s+בשעה\s+(\d{1,2}:\d{2})', re.UNICODE)
+_LEVEL_HE_WHATSAPP = re.compile(r'רמה\s+(?:\d️⃣|\d+)?\s+בשעה\s+(\d{1,2}:\d{2})')
+_LEVEL_EN = re.compile(r'(?<!\d)(\d+)️⃣\s+level(?:\s+\d+)?\s+at\s+(\d{1,2}:\d{2})')
+_LEVEL_EN_PLAIN = re.compile(r'level\s+(\d+)\s+at\s+(\d{1,2}:\d{2})', re.IGNORECASE)
+_ENTRY_HE = re.compile(r'כניסה\s+בשעה\s+(\d{1,2}:\d{2})')
+_ENTRY_EN = re.compile(r'Entry at\s+(\d{1,2}:\d{2})', re.IGNORECASE)
+_ENTRY_HE_SHORT = re.compile(r'כניסה(?:\s*בשעה)?\s*(\d{1,2}:\d{2})')
+
+# Characters matched by [A-Z] under re.IGNORECASE
+_PAIR_LETTERS = frozenset(string.ascii_letters + "\u0130\u0131\u017f\u212a")
+
+_SELL_MARKERS = ("למטה", "למכור", "🔴", "🟥")
+_BUY_MARKERS = ("למעלה", "קנה", "🟢", "🟩")
+
+
+def maybe_reverse(text: str) -> str:
+    """
+    If the text contains Hebrew characters, reverse it.
+    """
+    if hebrew_pattern.search(text):
+        return text[::-1]
+    return text
+
+
+def _find_pair(text: str):
+    """
+    Find the first currency pair like "EUR/USD".
+
+    Equivalent to re.search(r'([A-Z]{2,})/([A-Z]{2,})', text, re.IGNORECASE)
+    but only looks at the letters around each slash, instead of backtracking
+    over every run of letters in the message.
+
+    Returns:
+        Tuple: (base, quote), None if no pair is found
+    """
+    slash = text.find("/")
+    while slash != -1:
+        start = slash
+        while start > 0 and text[start - 1] in _PAIR_LETTERS:
+            start -= 1
+        end = slash + 1
+        while end < len(text) and text[end] in _PAIR_LETTERS:
+            end += 1
+        if slash - start >= 2 and end - slash - 1 >= 2:
+            return text[start:slash], text[slash + 1:end]
+        slash = text.find("/", slash + 1)
+    return None
+
+
+def _find_expiration(line: str):
+    """
+    Find the first "<keyword> ... <digits>M" expiration in a line.
+
+    Equivalent to re.search(r'(?:תוקף|תפוגה|Expiration)[^\\d]*(\\d+)M', line,
+    re.IGNORECASE) but every character is scanned at most once: keywords that
+    share the same following digit run are only checked once.
+
+    Returns:
+        The minutes as a string, None if not found
+    """
+    checked_until = -1
+    for keyword in _EXPIRATION_KEYWORD.finditer(line):
+        if keyword.end() <= checked_until:
+            continue
+        digits = _DIGITS.search(line, keyword.end())
+        if digits is None:
+            return None
+        if line[digits.end():digits.end() + 1] in ("M", "m"):
+            return digits.group()
+        checked_until = digits.start()
+    return None
+
+
+def _find_action(text: str):
+    if any(marker in text for marker in _SELL_MARKERS) or "SELL" in text.upper():
+        return "Sell"
+    if any(marker in text for marker in _BUY_MARKERS) or "BUY" in text.upper():
+        return "Buy"
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _shift_time(time_str: str, hours: int) -> str:
+    time_obj = datetime.strptime(time_str, '%H:%M')
+    # Apply time zone conversion if needed
+    if hours != 0:
+        time_obj = time_obj + timedelta(hours=hours)
+    return time_obj.strftime('%H:%M')
+
+
+def _convert_time(time_str: str, hours: int, label: str) -> str:
+    try:
+        return _shift_time(time_str, hours)
+    except Exception as e:
+        print(f"Error converting {label} time: {e}")
+        return time_str
+
+
+def parse_signal(message_text: str, chat_title: str, time_conversion_hours: int = 0,
+                 source_timezone: str = "UTC+0") -> dict:
+    """
+    Parse a Hebrew or English trading signal.
+
+    The message is split into lines once to count level lines, and each
+    remaining pattern runs at most once over the text, only when the keyword
+    it needs is present.
+
+    Args:
+        message_text: The message text (already passed through maybe_reverse)
+        chat_title: Title of the source chat, stored as source_chat
+        time_conversion_hours: Hours added to entry and martingale times
+        source_timezone: Reported as original_timezone when times are converted
+
+    Returns:
+        dict: Extracted signal data, None if the message exceeds MAX_SIGNAL_LENGTH
+    """
+    if len(message_text) > MAX_SIGNAL_LENGTH:
+        return None
+
+    lower_text = message_text.lower()
+    has_level_he = "רמה" in message_text
+    has_level_en = "level" in lower_text
+
+    # --- Line based level counts (lines mentioning both a level and a time) ---
+    levels_hebrew = 0
+    fallback_levels = 0
+    if has_level_he or has_level_en:
+        for line in lower_text.split('\n'):
+            if has_level_he and "רמה" in line and "בשעה" in line:
+                levels_hebrew += 1
+            if has_level_en and "level" in line and "at" in line:
+                fallback_levels += 1
+
+    # Check if "OTC" appears in the message
+    is_otc = "OTC" in message_text
+
+    # --- Extract currency ---
+    currency = None
+    pair = _find_pair(message_text)
+    if pair:
+        # Pairs like EUR/USD, or BHD/CNY OTC
+        currency = (pair[0] + pair[1]).lower()
+    else:
+        # Single currency followed by OTC at the start (like "Litecoin OTC")
+        leading_otc = _LEADING_OTC.match(message_text)
+        if leading_otc:
+            currency = leading_otc.group(1).lower()
+            is_otc = True
+        else:
+            # Currency after the first emoji of the first line (like "🌎 US100")
+            first_line = message_text.split('\n', 1)[0]
+            if _EMOJI.search(first_line):
+                parts = _EMOJI.split(first_line)
+                if len(parts) > 1:
+                    potential_currency = parts[1].strip()
+                    if "OTC" in potential_currency:
+                        currency = potential_currency.split("OTC")[0].strip().lower()
+                        is_otc = True
+                    else:
+                        currency = potential_currency.lower()
+
+            if currency is None and is_otc:
+                otc_match = _OTC_WORD.search(message_text)
+                if otc_match:
+                    currency = otc_match.group(1).lower()
+
+    # --- Determine action ---
+    action = _find_action(message_text)
+
+    # --- Extract bid wait time ---
+    minutes = _find_expiration(message_text)
+    bid_wait_time = f"M{minutes}" if minutes is not None else None
+
+    # --- Extract martingale levels ---
+    martingale_matches = _LEVEL_HE.findall(message_text) if has_level_he else []
+    levels_english = []
+    if has_level_en:
+        if "️⃣" in message_text and "level" in message_text:
+            levels_english = _LEVEL_EN.findall(message_text)
+        if not levels_english:
+            levels_english = _LEVEL_EN_PLAIN.findall(message_text)
+
+    if martingale_matches:
+        levels = len(martingale_matches)
+        martingale_times = martingale_matches
+    elif levels_english:
+        levels = len(levels_english)
+        martingale_times = [time for _, time in levels_english]
+    else:
+        levels = levels_hebrew + fallback_levels
+        martingale_times = []
+
+    # --- Extract entry time ---
+    entry_match = None
+    has_entry_he = "כניסה" in message_text
+    if has_entry_he and "בשעה" in message_text:
+        entry_match = _ENTRY_HE.search(message_text)
+    if not entry_match:
+        entry_match = _ENTRY_EN.search(message_text)
+    if not entry_match and has_entry_he:
+        entry_match = _ENTRY_HE_SHORT.search(message_text)
+
+    entry_time = None
+    if entry_match:
+        entry_time = _convert_time(entry_match.group(1), time_conversion_hours, "entry")
+
+    # Convert martingale times based on source timezone
+    converted_martingale_times = [
+        _convert_time(time_str, time_conversion_hours, "martingale")
+        for time_str in martingale_times
+    ]
+
+    result = {
+        "currancy": currency,
+        "action": action,
+        "levels": levels,
+        "bid_wait_time": bid_wait_time,
+        "entry_time": entry_time,
+        "source_chat": chat_title,
+        "is_otc": is_otc
+    }
+
+    # Add martingale times if available
+    if converted_martingale_times:
+        result["martingale_times"] = converted_martingale_times
+        result["original_timezone"] = source_timezone
+        result["converted_to_utc_plus2"] = True
+
+    return result
+
+
+def parse_whatsapp_message(message_text: str) -> dict:
+    """
+    Extract trading data from messages that start with "📱 WhatsApp Message:"
+
+    Args:
+        message_text: The full message text
+
+    Returns:
+        dict: Dictionary with extracted trading signal data or None if not a WhatsApp message
+    """
+    if WHATSAPP_HEADER not in message_text or len(message_text) > MAX_SIGNAL_LENGTH:
+        return None
+
+    lines = message_text.strip().split('\n')
+    if len(lines) < 3:  # Need at least 3 lines (header, maybe empty line, currency)
+        return None
+
+    header_index = -1
+    for i, line in enumerate(lines):
+        if WHATSAPP_HEADER in line:
+            header_index = i
+            break
+
+    if header_index == -1:
+        return None
+
+    # The currency line is the first non-empty line after the header
+    currency_index = -1
+    for i in range(header_index + 1, min(header_index + 4, len(lines))):
+        if lines[i].strip():
+            currency_index = i
+            break
+
+    if currency_index == -1:
+        return None
+
+    currency_line = lines[currency_index].strip()
+
+    result = {
+        "currancy": None,
+        "action": None,
+        "levels": 0,
+        "bid_wait_time": None,
+        "entry_time": None,
+        "is_otc": "OTC" in currency_line,
+        "source_chat": "WhatsApp"
+    }
+
+    pair = _find_pair(currency_line)
+    if pair:
+        result["currancy"] = (pair[0] + pair[1]).lower()
+    elif result["is_otc"]:
+        result["currancy"] = currency_line.split("OTC")[0].strip().lower()
+    else:
+        result["currancy"] = currency_line.lower()
+
+    martingale_times = []
+    for line in lines:
+        if result["bid_wait_time"] is None:
+            minutes = _find_expiration(line)
+            if minutes is not None:
+                result["bid_wait_time"] = f"M{minutes}"
+
+        if result["action"] is None:
+            result["action"] = _find_action(line)
+
+        if result["entry_time"] is None and "כניסה" in line:
+            entry_match = _ENTRY_HE.search(line) or _ENTRY_HE_SHORT.search(line)
+            if entry_match:
+                result["entry_time"] = entry_match.group(1)
+
+        if "רמה" in line:
+            martingale_match = _LEVEL_HE_WHATSAPP.search(line)
+            if martingale_match:
+                martingale_times.append(martingale_match.group(1))
+
+    result["levels"] = len(martingale_times)
+    if martingale_times:
+        result["martingale_times"] = martingale_times
+
+    return result
+
+
+def format_bid_message(data: dict) -> str:
+    """
+    Format the extracted data into a readable message to send to the target chat.
+    """
+    action_emoji = "🟢 BUY" if data["action"] == "Buy" else "🔴 SELL"
+    message = f"📊 עסקה בדרך!📊\n\n"
+    message += f"📊 Trading Signal Alert 📊\n\n"
+    
+    # Format currency display
+    currency_display = data['currancy'].upper() if data['currancy'] else 'Unknown'
+    
+    # Add OTC indicator if applicable
+    if data.get('is_otc', False):
+        message += f"💱 Pair: {currency_display} OTC\n"
+    else:
+        message += f"💱 Pair: {currency_display}\n"
+        
+    message += f"{action_emoji}\n"
+    message += f"⏱️ Expiration: {data['bid_wait_time']}\n"
+    message += f"⏰ Entry at: {data['entry_time']} (UTC+2)\n\n"
+    
+    if data.get("martingale_times"):
+        message += "🔄 Martingale Levels:\n"
+        for i, time in enumerate(data["martingale_times"], 1):
+            message += f"  Level {i}: {time}\n"
+    elif data.get("levels", 0) > 0:
+        message += f"🔄 Martingale Levels: {data['levels']}\n"
+    
+    # Add source chat information
+    if data.get("source_chat"):
+        message += f"\nSource: {data['source_chat']}"
+    
+    return message
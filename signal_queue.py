@@ -0,0 +1,269 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+# An entry time this far behind the clock is tomorrow's (e.g. 00:05 armed at 23:58)
+ROLLOVER_SECONDS = 12 * 60 * 60
+
+
+def entry_deadline(signal, now=None):
+    """
+    Get the entry deadline of a signal as an epoch timestamp.
+
+    Args:
+        signal: Signal dict as sent by telebot (entry_time is "HH:MM", today
+            or, when more than ROLLOVER_SECONDS have passed since, tomorrow)
+        now: Optional datetime used as "today" (defaults to datetime.now())
+
+    Returns:
+        Epoch seconds of the entry time, None if the signal has no valid entry_time
+    """
+    entry_time = signal.get("entry_time")
+    if not entry_time:
+        return None
+    try:
+        now = now or datetime.now()
+        entry_time_obj = datetime.strptime(entry_time, '%H:%M')
+        entry_time_obj = entry_time_obj.replace(year=now.year, month=now.month, day=now.day)
+        if (now - entry_time_obj).total_seconds() > ROLLOVER_SECONDS:
+            entry_time_obj += timedelta(days=1)
+        return entry_time_obj.timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class SignalQueue:
+    """
+    Bounded priority queue of pending signals, earliest entry deadline first.
+
+    Signals whose entry time has already passed (beyond grace_seconds) are
+    dropped both on admission and when they reach the head of the queue.
+    A signal with the same signal_id as a queued one replaces it. When the
+    queue is full, a new signal evicts the queued signal with the latest
+    deadline if it is due earlier, otherwise it is rejected.
+
+    A signal put with ready_at is not handed out before that time (or before
+    release()), so an armed signal does not take a worker long before its
+    entry time and signals due earlier are served first in the meantime.
+    """
+
+    def __init__(self, maxsize=20, grace_seconds=30, on_drop=None):
+        """
+        Args:
+            maxsize: Most queued signals
+            grace_seconds: How long past its entry time a signal is still handed out
+            on_drop: Optional callable(signal_id, reason) for queued signals that
+                leave the queue without get() ("evicted", "expired", "cancelled").
+                Called with the queue locked
+        """
+        self.maxsize = maxsize
+        self.grace_seconds = grace_seconds
+        self.on_drop = on_drop
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+        self.enqueued = 0
+        self.dequeued = 0
+        self.replaced = 0
+        self.dropped = {}
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    def _is_expired(self, entry, now):
+        return entry["deadline"] is not None and entry["deadline"] + self.grace_seconds < now
+
+    def _drop(self, reason, signal_id=None):
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        if signal_id is not None and self.on_drop is not None:
+            try:
+                self.on_drop(signal_id, reason)
+            except Exception as e:
+                print(f"Error in signal drop callback: {e}")
+
+    def note_drop(self, reason):
+        """Count a signal dropped by the consumer (e.g. loss limit reached)."""
+        with self._condition:
+            self._drop(reason)
+
+    def put(self, signal, ready_at=None):
+        """
+        Admit a signal into the queue.
+
+        Args:
+            signal: Signal dict, must contain "signal_id"
+            ready_at: Optional epoch seconds before which get() skips it
+
+        Returns:
+            Tuple: (accepted, reason)
+        """
+        now = time.time()
+        deadline = entry_deadline(signal)
+        entry = {
+            "signal": signal,
+            "deadline": deadline,
+            "enqueued_at": now,
+            "ready_at": ready_at,
+            "removed": False,
+        }
+
+        with self._condition:
+            if self._is_expired(entry, now):
+                self._drop("expired")
+                return False, "entry time already passed"
+
+            signal_id = signal["signal_id"]
+            previous = self._entries.pop(signal_id, None)
+            if previous is not None:
+                previous["removed"] = True
+                self.replaced += 1
+
+            if len(self._entries) >= self.maxsize:
+                latest_id, latest = max(
+                    self._entries.items(),
+                    key=lambda item: self._sort_key(item[1])
+                )
+                if self._sort_key(entry) >= self._sort_key(latest):
+                    self._drop("full")
+                    return False, "queue is full"
+                latest["removed"] = True
+                del self._entries[latest_id]
+                self._drop("evicted", latest_id)
+
+            self._entries[signal_id] = entry
+            heapq.heappush(self._heap, (self._sort_key(entry), next(self._counter), entry))
+            self.enqueued += 1
+            self._condition.notify_all()
+            return True, "queued"
+
+    def _sort_key(self, entry):
+        # Signals without an entry time are due as soon as they arrive
+        return entry["deadline"] if entry["deadline"] is not None else entry["enqueued_at"]
+
+    def get(self, timeout=None, accept=None):
+        """
+        Remove and return the signal with the earliest deadline.
+
+        Args:
+            timeout: Maximum time to block in seconds, None to wait forever
+            accept: Optional callable(signal) -> bool, called with the queue
+                locked. Signals it refuses stay queued and the next one is
+                tried, e.g. to skip signals that conflict with running trades
+
+        Returns:
+            The signal dict, or None on timeout
+        """
+        end_time = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                skipped = []
+                next_ready = None
+                try:
+                    while self._heap:
+                        item = heapq.heappop(self._heap)
+                        entry = item[2]
+                        if entry["removed"]:
+                            continue
+                        now = time.time()
+                        if self._is_expired(entry, now):
+                            del self._entries[entry["signal"]["signal_id"]]
+                            self._drop("expired", entry["signal"]["signal_id"])
+                            continue
+                        if entry["ready_at"] is not None and entry["ready_at"] > now:
+                            next_ready = entry["ready_at"] if next_ready is None else min(next_ready, entry["ready_at"])
+                            skipped.append(item)
+                            continue
+                        if accept is not None and not accept(entry["signal"]):
+                            skipped.append(item)
+                            continue
+                        del self._entries[entry["signal"]["signal_id"]]
+
+                        wait = now - entry["enqueued_at"]
+                        self.dequeued += 1
+                        self.last_wait = wait
+                        self.max_wait = max(self.max_wait, wait)
+                        self.total_wait += wait
+                        return entry["signal"]
+                finally:
+                    for item in skipped:
+                        heapq.heappush(self._heap, item)
+
+                remaining = None if end_time is None else end_time - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                if next_ready is not None:
+                    until_ready = max(0, next_ready - time.time())
+                    remaining = until_ready if remaining is None else min(remaining, until_ready)
+                self._condition.wait(remaining)
+
+    def release(self, signal_id):
+        """
+        Make a queued signal ready now, e.g. when it is fired early.
+
+        Returns:
+            True if the signal was queued
+        """
+        with self._condition:
+            entry = self._entries.get(signal_id)
+            if entry is None:
+                return False
+            entry["ready_at"] = None
+            self._condition.notify_all()
+            return True
+
+    def remove(self, signal_id):
+        """
+        Drop a queued signal, e.g. when it is cancelled.
+
+        Returns:
+            True if the signal was queued
+        """
+        with self._condition:
+            entry = self._entries.pop(signal_id, None)
+            if entry is None:
+                return False
+            entry["removed"] = True
+            self._drop("cancelled", signal_id)
+            return True
+
+    def wakeup(self):
+        """Make blocked get() calls look at the queue again, e.g. after a conflict ended."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def pending(self):
+        """
+        List queued signals in deadline order.
+
+        Returns:
+            List of signal dicts
+        """
+        with self._condition:
+            entries = sorted(self._entries.values(), key=self._sort_key)
+            return [entry["signal"] for entry in entries]
+
+    def stats(self):
+        """
+        Queue depth, wait times and drop counts.
+
+        Returns:
+            Dictionary of queue statistics
+        """
+        with self._condition:
+            return {
+                "depth": len(self._entries),
+                "capacity": self.maxsize,
+                "enqueued": self.enqueued,
+                "dequeued": self.dequeued,
+                "replaced": self.replaced,
+                "dropped": dict(self.dropped),
+                "wait_seconds": {
+                    "last": round(self.last_wait, 3),
+                    "max": round(self.max_wait, 3),
+                    "avg": round(self.total_wait / self.dequeued, 3) if self.dequeued else 0.0,
+                },
+            }
@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+
+
+class SignalScheduler:
+    """
+    Central scheduler for pending signal triggers.
+
+    Pending triggers live in one heap keyed by fire time and are run by a
+    single asyncio task, so no handler coroutine has to sleep until its entry
+    time. Each trigger has a key (the signal_id): scheduling an existing key
+    replaces it and cancel removes it. Every change is appended to a small
+    JSONL journal which is replayed on startup, so a restart keeps the
+    schedule.
+    """
+
+    def __init__(self, journal_path, on_due, grace_seconds=30):
+        """
+        Args:
+            journal_path: Path of the JSONL journal file
+            on_due: Coroutine function called as on_due(key, payload) when a trigger is due
+            grace_seconds: How late a restored trigger may still fire
+        """
+        self.journal_path = journal_path
+        self.on_due = on_due
+        self.grace_seconds = grace_seconds
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._journal_lines = 0
+
+    def schedule(self, key, fire_at, payload):
+        """
+        Schedule (or replace) a trigger.
+
+        Args:
+            key: Unique signal key
+            fire_at: Epoch seconds at which the trigger is due
+            payload: JSON-serializable data passed to on_due
+
+        Returns:
+            True if an existing trigger with the same key was replaced
+        """
+        replaced = key in self._entries
+        self._push(key, fire_at, payload)
+        self._append({"op": "schedule", "key": key, "fire_at": fire_at, "payload": payload})
+        self._wakeup.set()
+        return replaced
+
+    def cancel(self, key):
+        """
+        Cancel a pending trigger.
+
+        Returns:
+            True if the key was pending
+        """
+        if self._entries.pop(key, None) is None:
+            return False
+        self._append({"op": "cancel", "key": key})
+        self._wakeup.set()
+        return True
+
+    def pending(self):
+        """
+        List pending triggers, soonest first.
+
+        Returns:
+            List of (key, fire_at, payload) tuples
+        """
+        entries = sorted(self._entries.items(), key=lambda item: item[1][1])
+        return [(key, fire_at, payload) for key, (_, fire_at, payload) in entries]
+
+    def load(self):
+        """
+        Replay the journal and compact it. Triggers that are more than
+        grace_seconds late are dropped.
+
+        Returns:
+            List of restored (key, fire_at, payload) tuples
+        """
+        if not os.path.exists(self.journal_path):
+            return []
+
+        restored = {}
+        with open(self.journal_path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash, ignore it
+                    continue
+                if record.get("op") == "schedule":
+                    restored[record["key"]] = (record["fire_at"], record["payload"])
+                else:
+                    restored.pop(record.get("key"), None)
+
+        now = time.time()
+        for key, (fire_at, payload) in restored.items():
+            if fire_at + self.grace_seconds >= now:
+                self._push(key, fire_at, payload)
+        self._compact()
+        self._wakeup.set()
+        return self.pending()
+
+    async def run(self):
+        """Fire due triggers forever. Run as a single task on the client loop."""
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, seq, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != seq:
+                    continue  # Cancelled or replaced
+                del self._entries[key]
+                self._append({"op": "done", "key": key})
+                asyncio.ensure_future(self._fire(key, entry[2]))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key, payload):
+        try:
+            await self.on_due(key, payload)
+        except Exception as e:
+            print(f"Error firing scheduled signal {key}: {e}")
+
+    def _push(self, key, fire_at, payload):
+        seq = next(self._counter)
+        self._entries[key] = (seq, fire_at, payload)
+        heapq.heappush(self._heap, (fire_at, seq, key))
+
+    def _append(self, record):
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as journal:
+                journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal_lines += 1
+            # Keep the journal small: rewrite it once it is mostly history
+            if self._journal_lines > 100 and self._journal_lines > 4 * len(self._entries):
+                self._compact()
+        except OSError as e:
+            print(f"Error writing scheduler journal: {e}")
+
+    def _compact(self):
+        tmp_path = self.journal_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as journal:
+                for key, fire_at, payload in self.pending():
+                    record = {"op": "schedule", "key": key, "fire_at": fire_at, "payload": payload}
+                    journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.journal_path)
+            self._journal_lines = len(self._entries)
+        except OSError as e:
+            print(f"Error compacting scheduler journal: {e}")
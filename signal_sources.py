@@ -0,0 +1,136 @@
+from signal_parser import parse_signal, parse_whatsapp_message
+
+
+class SignalSource:
+    """
+    A signal group format: which chats it comes from, their time zone and the
+    grammar used to parse their messages.
+
+    Adding a new signal group means subclassing this (or instantiating it with
+    other values) and registering it on the SourceRegistry.
+    """
+
+    def __init__(self, name, time_conversion_hours=0, source_timezone="UTC+0", title_keywords=()):
+        """
+        Args:
+            name: Short name of the source (e.g. "vip")
+            time_conversion_hours: Hours added to the group's times to get UTC+2
+            source_timezone: The group's own time zone, reported with martingale times
+            title_keywords: Chat title substrings that identify the group when
+                its chat id is not registered
+        """
+        self.name = name
+        self.time_conversion_hours = time_conversion_hours
+        self.source_timezone = source_timezone
+        self.title_keywords = title_keywords
+
+    def matches_title(self, chat_title):
+        return any(keyword in chat_title for keyword in self.title_keywords)
+
+    def parse(self, message_text, chat_title):
+        """
+        Parse a message of this source.
+
+        Args:
+            message_text: The message text (already passed through maybe_reverse)
+            chat_title: Title of the chat the message came from
+
+        Returns:
+            dict: Extracted signal data, None if the message is not parsable
+        """
+        return parse_signal(message_text, chat_title, self.time_conversion_hours, self.source_timezone)
+
+
+class WhatsAppRelaySource(SignalSource):
+    """Messages relayed from WhatsApp by relayServer.py ("📱 WhatsApp Message:" header)."""
+
+    def __init__(self):
+        super().__init__("whatsapp")
+
+    def parse(self, message_text, chat_title):
+        return parse_whatsapp_message(message_text)
+
+
+class SourceRegistry:
+    """
+    Maps chat ids to signal sources.
+
+    A chat is resolved once: by its registered chat id, else by the first
+    source whose title keywords match, else to the default source. The result
+    is cached per chat id so later messages skip the lookup.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.sources = {}
+        self._chat_sources = {}
+        self._cache = {}
+
+    def register(self, source, chat_ids=()):
+        """
+        Add a source, optionally bound to explicit chat ids.
+
+        Args:
+            source: SignalSource instance
+            chat_ids: Chat ids whose messages always use this source
+        """
+        self.sources[source.name] = source
+        for chat_id in chat_ids:
+            self._chat_sources[chat_id] = source
+        self._cache.clear()
+
+    def bind_chats(self, mapping):
+        """
+        Bind chat ids to registered sources from a "chat_id:name,..." string,
+        e.g. the SIGNAL_SOURCE_CHATS environment variable.
+        """
+        for item in mapping.split(","):
+            if not item.strip():
+                continue
+            chat_id, _, name = item.strip().rpartition(":")
+            source = self.sources.get(name)
+            if source is None or not chat_id:
+                print(f"Ignoring signal source binding: {item}")
+                continue
+            try:
+                chat_id = int(chat_id)
+            except ValueError:
+                print(f"Ignoring signal source binding with a bad chat id: {item}")
+                continue
+            self._chat_sources[chat_id] = source
+        self._cache.clear()
+
+    def resolve(self, chat_id, chat_title):
+        """
+        Get the source of a chat.
+
+        Returns:
+            The SignalSource to parse the chat's messages with
+        """
+        source = self._cache.get(chat_id)
+        if source is not None:
+            return source
+
+        source = self._chat_sources.get(chat_id)
+        if source is None:
+            source = next(
+                (candidate for candidate in self.sources.values() if candidate.matches_title(chat_title)),
+                self.default
+            )
+        if chat_id is not None:
+            self._cache[chat_id] = source
+        print(f"Chat {chat_title} (ID: {chat_id}) uses signal source: {source.name}")
+        return source
+
+
+def default_registry():
+    """
+    Registry with the signal groups currently in use.
+    """
+    registry = SourceRegistry(default=SignalSource("default"))
+    # UTC+7, convert to UTC+2 (-5 hours)
+    registry.register(SignalSource("vip", -5, "UTC+7", title_keywords=("VIP SIGNAL №6",)))
+    # UTC-4, convert to UTC+2 (+6 hours)
+    registry.register(SignalSource("martingale", 6, "UTC-4", title_keywords=("Martingale signals",)))
+    registry.register(WhatsAppRelaySource())
+    return registry
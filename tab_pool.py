@@ -0,0 +1,154 @@
+import collections
+import time
+
+
+class CurrencyTabPool:
+    """
+    Browser tabs with a currency already selected, one per (currency, OTC)
+    pair, for the most recently traded pairs.
+
+    A pair that has a tab is selected with a switch_to.window and a check of
+    the page's current symbol, instead of the currency search, selection and
+    page reload. A pair without a tab takes the original tab first, then a
+    new tab while the pool has room, then the least recently used tab.
+    """
+
+    def __init__(self, clicker, capacity=4):
+        """
+        Args:
+            clicker: Clicker of the shared driver
+            capacity: Most tabs kept open
+        """
+        self.clicker = clicker
+        self.capacity = capacity
+        self._tabs = collections.OrderedDict()  # (currency, is_otc) -> {"handle", "symbol"}, LRU first
+        self._spare = []  # Open tabs without a currency (the original one)
+        self._current = None  # Handle this pool last switched to
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def driver(self):
+        return self.clicker.driver
+
+    def select(self, currency, is_otc=True):
+        """
+        Show currency in the current tab.
+
+        Args:
+            currency: Currency name as in the signal
+            is_otc: Whether to select the OTC version
+
+        Returns:
+            True if the currency is selected, False otherwise
+        """
+        if not self._spare and not self._tabs:
+            self._spare.append(self.driver.current_window_handle)
+        key = (currency.strip().upper(), bool(is_otc))
+
+        tab = self._tabs.get(key)
+        if tab is not None:
+            if (self._switch(tab["handle"]) and tab["symbol"] is not None
+                    and self._current_symbol() == tab["symbol"]):
+                self._tabs.move_to_end(key)
+                self.hits += 1
+                print(f"Currency tab hit for {currency} (OTC: {is_otc})")
+                return True
+            print(f"Currency tab for {currency} is stale, selecting again")
+            del self._tabs[key]
+            if tab["handle"] in self.driver.window_handles:
+                self._spare.append(tab["handle"])
+
+        self.misses += 1
+        handle = self._free_tab()
+        if handle is None or not self._switch(handle):
+            return False
+        if not self._select_in_page(currency, is_otc):
+            self._spare.append(handle)
+            return False
+        self._tabs[key] = {"handle": handle, "symbol": self._wait_for_symbol()}
+        return True
+
+    def ensure(self, currency, is_otc=True):
+        """
+        select(), without any browser command when the pair's tab is the one
+        this pool switched to last. For chains sharing the browser, before
+        every placement.
+        """
+        tab = self._tabs.get((currency.strip().upper(), bool(is_otc)))
+        if tab is not None and tab["handle"] == self._current:
+            return True
+        return self.select(currency, is_otc)
+
+    def warm(self, pairs):
+        """
+        Prepare tabs ahead of time, e.g. for the most traded pairs.
+
+        Args:
+            pairs: Iterable of (currency, is_otc)
+        """
+        for currency, is_otc in list(pairs)[:self.capacity]:
+            if not self.select(currency, is_otc):
+                print(f"Could not warm a tab for {currency} (OTC: {is_otc})")
+
+    def stats(self):
+        return {
+            "tabs": [f"{currency}{' OTC' if is_otc else ''}" for currency, is_otc in self._tabs],
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _free_tab(self):
+        open_handles = self.driver.window_handles
+        while self._spare:
+            handle = self._spare.pop()
+            if handle in open_handles:
+                return handle
+        if len(self._tabs) < self.capacity:
+            url = self.driver.current_url
+            self.driver.switch_to.new_window('tab')
+            self.driver.get(url)
+            self._current = self.driver.current_window_handle
+            return self._current
+        # Repurpose the least recently used tab
+        key, tab = self._tabs.popitem(last=False)
+        print(f"Evicting currency tab {key[0]} (OTC: {key[1]})")
+        return tab["handle"]
+
+    def _switch(self, handle):
+        try:
+            self.driver.switch_to.window(handle)
+        except Exception as e:
+            print(f"Error switching to tab {handle}: {e}")
+            self._current = None
+            return False
+        self._current = handle
+        # Page state (snapshot, deal feed) belongs to the tab
+        self.clicker.invalidate_snapshot()
+        self.clicker.last_countdown = None
+        self.clicker.open_deals = None
+        return True
+
+    def _current_symbol(self):
+        state = self.clicker.snapshot(max_age=0)
+        return state["symbol"] if state is not None else None
+
+    def _wait_for_symbol(self, timeout=5):
+        # The symbol is rendered by the page's scripts after the reload
+        deadline = time.time() + timeout
+        while True:
+            symbol = self._current_symbol()
+            if symbol or time.time() >= deadline:
+                return symbol
+            time.sleep(0.2)
+
+    def _select_in_page(self, currency, is_otc):
+        # The search, selection and reload initial_script always did
+        self.clicker.open_currency_component()
+        time.sleep(1)
+        if not self.clicker.set_currency(currency, is_otc):
+            return False
+        time.sleep(2)
+        self.clicker.refresh_page()
+        return True
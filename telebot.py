@@ -1,14 +1,18 @@
 import asyncio
-import re
 import os
-import requests
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from telethon import TelegramClient, events
 from telethon.tl.functions.channels import JoinChannelRequest
-from flask import Flask, request, jsonify
-import threading
-import asyncio
 from dotenv import load_dotenv
+from signal_queue import entry_deadline
+from signal_scheduler import SignalScheduler
+from signal_parser import maybe_reverse, format_bid_message, WHATSAPP_HEADER
+from signal_sources import default_registry
+from app_client import AppClient
+from notify_server import NotifyServer
+from telegram_outbox import TelegramOutbox
+from correlation import HEADER, HopCollector, new_trace, split_footer, stamp
 telethon_loop = None
 # Load environment variables from .env file
 
@@ -19,42 +23,58 @@ priority_group = ""
 
 
 load_dotenv()
-app = Flask(__name__)
+# Receives the trading bot's notifications on the Telethon loop
+notify_server = NotifyServer()
+NOTIFY_PORT = 5001
 # Replace these with your own values from my.telegram.org
 api_id = "Your api Id"
 api_hash = 'Your api -hash'
 session_name = 'telegram session name'
 client = TelegramClient(session_name, api_id, api_hash)
+# All outgoing text messages go through the outbox (rate limits, FloodWait,
+# a loss chain coalesced into one edited message)
+outbox = TelegramOutbox(client)
+# Coalesce key of the lost-level messages and the result closing the chain,
+# one per signal since chains of different signals run in parallel
+def loss_chain_key(signal_id):
+    return f"loss-chain:{signal_id}" if signal_id else "loss-chain"
 
 # Target chat for sending bid details (replace with your desired chat ID or username)
 TARGET_CHAT = "@Your telegram target chat"  # Change this to your target chat
 TARGET_JSON_CHAT = "@your telegram chat for notifying the results"
-# Compile a regex to detect Hebrew characters
-hebrew_pattern = re.compile(r'[\u0590-\u05FF]')
+# Signal group formats, bound to chat ids via SIGNAL_SOURCE_CHATS="chat_id:name,..."
+# (names: vip, martingale, whatsapp). Unbound chats are matched by title.
+signal_sources = default_registry()
+signal_sources.bind_chats(os.getenv("SIGNAL_SOURCE_CHATS", ""))
+# Seconds before entry_time at which the armed signal is fired
+FIRE_LEAD_SECONDS = 1
+# Journal of pending signal triggers, replayed on startup
+SCHEDULER_JOURNAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scheduled_signals.jsonl")
+# Pooled, non-blocking client for the trading bot (app.py)
+app_client = AppClient(os.getenv("TRADING_BOT_URL", "http://localhost:5000"))
+# Per-hop latencies of signals from ingestion to their result, shown by /latency
+hop_collector = HopCollector(os.path.join(os.path.dirname(os.path.abspath(__file__)), "signal_traces.jsonl"))
 
-@app.route('/notify-results', methods=['POST'])
-def json_endpoint():
-    data = request.get_json()
-    # Use the captured telethon_loop here
-    asyncio.run_coroutine_threadsafe(handle_bid_json(data), telethon_loop)
-    return jsonify({"status": "success"}), 200
+# The handlers run on the Telethon loop: schedule the Telegram sends and
+# answer right away
+@notify_server.route('/notify-results')
+async def json_endpoint(data):
+    asyncio.ensure_future(handle_bid_json(data or {}))
+    return {"status": "success"}, 200
 
-@app.route('/notify-lost', methods=['POST'])
-def notify_lost_endpoint():
-    data = request.get_json()
+@notify_server.route('/notify-lost')
+async def notify_lost_endpoint(data):
+    data = data or {}
     bid_value = data.get("bid_value", "Unknown")
     iteration = data.get("iteration", "Unknown")
-    # Schedule the async lost bid notification
-    asyncio.run_coroutine_threadsafe(handle_bid_lost(bid_value,iteration), telethon_loop)
-    return jsonify({"status": "success"}), 200
+    asyncio.ensure_future(handle_bid_lost(bid_value, iteration, data.get("signal_id")))
+    return {"status": "success"}, 200
 
 
-@app.route('/notify-deal', methods=['POST'])
-def notify_deal_endpoint():
-    data = request.get_json()
-    # Schedule the asynchronous processing using telethon_loop
-    asyncio.run_coroutine_threadsafe(handle_deal_details(data), telethon_loop)
-    return jsonify({"status": "success"}), 200
+@notify_server.route('/notify-deal')
+async def notify_deal_endpoint(data):
+    asyncio.ensure_future(handle_deal_details(data or {}))
+    return {"status": "success"}, 200
 
 
 # --- Async function to handle deal details ---
@@ -70,201 +90,112 @@ async def handle_deal_details(deal_data: dict):
       - timestamp: when the deal occurred (or any other relevant info)
     """
     bid_message = format_bid_message(deal_data)
-    # Format the message to be sent to the group
-    try:
-        await client.send_message(TARGET_CHAT, bid_message)
-        print(f"Sent bid details to {TARGET_CHAT}")
-    except Exception as e:
-        print(f"Error sending message to target chat: {e}")
+    outbox.post(TARGET_CHAT, bid_message)
+
+async def handle_bid_lost(bid_value, i, signal_id=None):
+    """
+    Processes the lost bid notification.
+    It sends a simple message to the target group containing the bid value.
+    """
+    message = f"❌     Iteration Number {i}     Lost : {bid_value}     ❌"
+    # Each lost level extends the same message until the result arrives
+    outbox.post(TARGET_JSON_CHAT, message, coalesce_key=loss_chain_key(signal_id))
 
-# Add this to your group_message_handler function
+async def send_message_to_user(message: str):
+    outbox.post(TARGET_CHAT, message)
 
-def extract_whatsapp_message(message_text: str) -> dict:
+async def arm_signal(json_data: dict) -> bool:
     """
-    Specialized function to extract trading data from messages that start with "📱 WhatsApp Message:"
+    Send a parsed signal to the trading bot's /arm endpoint.
     
-    Args:
-        message_text: The full message text
-        
     Returns:
-        dict: Dictionary with extracted trading signal data or None if not a WhatsApp message
+        True if the signal was armed
     """
-    if "📱 WhatsApp Message:" not in message_text:
-        return None  # Not a WhatsApp message, don't process
-    
-    # Split the message into lines
-    lines = message_text.strip().split('\n')
-    if len(lines) < 3:  # Need at least 3 lines (header, maybe empty line, currency)
-        return None  # Not enough content
-    
-    # Find the WhatsApp header line
-    header_index = -1
-    for i, line in enumerate(lines):
-        if "📱 WhatsApp Message:" in line:
-            header_index = i
-            break
-    
-    if header_index == -1:
-        return None
-    
-    # Search for the currency line - it should be the first non-empty line after the header
-    currency_index = -1
-    for i in range(header_index + 1, min(header_index + 4, len(lines))):
-        if i < len(lines) and lines[i].strip():  # If line is not empty
-            currency_index = i
-            break
-    
-    if currency_index == -1:
-        return None  # No currency line found
-        
-    currency_line = lines[currency_index].strip()
-    
-    # Initialize result data
-    result = {
-        "currancy": None,
-        "action": None,
-        "levels": 0,
-        "bid_wait_time": None,
-        "entry_time": None,
-        "is_otc": "OTC" in currency_line,
-        "source_chat": "WhatsApp"
-    }
-    
-    # Extract currency
-    # Handle currency pair with slash (like EUR/USD)
-    currency_match = re.search(r'([A-Z]{2,})/([A-Z]{2,})', currency_line, re.IGNORECASE)
-    if currency_match:
-        result["currancy"] = (currency_match.group(1) + currency_match.group(2)).lower()
-    elif result["is_otc"]:
-        # Extract the part before "OTC"
-        parts = currency_line.split("OTC")
-        result["currancy"] = parts[0].strip().lower()
-    else:
-        # Just use the whole line as currency
-        result["currancy"] = currency_line.lower()
-    
-    # Extract bid wait time (expiration)
-    for line in lines:
-        time_match = re.search(r'(?:תוקף|תפוגה|Expiration)[^\d]*(\d+)M', line, re.IGNORECASE)
-        if time_match:
-            minutes = time_match.group(1)
-            result["bid_wait_time"] = f"M{minutes}"
-            break
-    
-    # Extract action
-    for line in lines:
-        if "למטה" in line or "למכור" in line or "SELL" in line.upper() or "🔴" in line or "🟥" in line:
-            result["action"] = "Sell"
-            break
-        elif ("למעלה" in line or "BUY" in line.upper() or "קנה" in line or
-              "🟢" in line or "🟩" in line):
-            result["action"] = "Buy"
-            break
-    
-    # Extract entry time
-    for line in lines:
-        entry_match = re.search(r'כניסה\s+בשעה\s+(\d{1,2}:\d{2})', line)
-        if entry_match:
-            result["entry_time"] = entry_match.group(1)
-            break
-        
-        # Try simpler Hebrew pattern if previous pattern doesn't match
-        entry_match = re.search(r'כניסה(?:\s*בשעה)?\s*(\d{1,2}:\d{2})', line)
-        if entry_match:
-            result["entry_time"] = entry_match.group(1)
-            break
-    
-    # Count and extract martingale levels
-    martingale_times = []
-    for line in lines:
-        # Match Hebrew format
-        martingale_match = re.search(r'רמה\s+(?:\d️⃣|\d+)?\s+בשעה\s+(\d{1,2}:\d{2})', line)
-        if martingale_match:
-            martingale_times.append(martingale_match.group(1))
-    
-    result["levels"] = len(martingale_times)
-    if martingale_times:
-        result["martingale_times"] = martingale_times
-    
-    return result
+    trace = stamp(json_data.get("trace"), "arm_sent")
+    try:
+        response = await app_client.post("/arm", json=json_data, headers={HEADER: trace["id"]} if trace else None)
+        response_text = response.text.strip()
+        print("Sent JSON to arm, response:", response.text)
+        if response_text.lower() == "lost more then allowed, no more betting for today.":
+            await send_message_to_user(response_text)
+        return response.status_code == 200
+    except Exception as e:
+        print("Error arming signal:", e)
+        return False
 
-async def handle_bid_lost(bid_value, i):
+async def fire_signal(signal_id: str, json_data: dict):
     """
-    Processes the lost bid notification.
-    It sends a simple message to the target group containing the bid value.
+    Fire an armed signal. Called by the scheduler just before the entry time.
     """
-    message = f"❌     Iteration Number {i}     Lost : {bid_value}     ❌"
+    trace = json_data.get("trace") or {}
     try:
-        await client.send_message(TARGET_JSON_CHAT, message)
-        print(f"Sent lost bid message to {TARGET_JSON_CHAT}: {message}")
+        response = await app_client.post(
+            "/fire", json={"signal_id": signal_id, "fire_sent_at": round(time.time(), 3)},
+            headers={HEADER: trace["id"]} if trace.get("id") else None,
+        )
+        print("Fired signal, response:", response.text)
     except Exception as e:
-        print(f"Error sending lost bid message: {e}")
+        print("Error firing signal:", e)
 
-async def send_message_to_user(message: str):
+scheduler = SignalScheduler(SCHEDULER_JOURNAL, fire_signal)
+
+async def call_app(path: str, user_message: str = None):
+    """
+    GET a trading bot endpoint and log the response. If user_message is
+    given it is sent to the user, followed by the response text.
+    """
     try:
-        await client.send_message(TARGET_CHAT, message)
-        print("Message sent to user chat:", message)
+        response = await app_client.get(path)
+        print(f"Triggered {path} endpoint, response:", response.text)
+        if user_message is not None:
+            await send_message_to_user(f"{user_message} {response.text}".strip())
     except Exception as e:
-        print("Error sending message to user chat:", e)
+        print(f"Error triggering {path} endpoint:", e)
 
-def maybe_reverse(text: str) -> str:
+def format_pending_signals() -> str:
     """
-    If the text contains Hebrew characters, reverse it.
+    Format the scheduler's pending triggers for the /pending command.
     """
-    if hebrew_pattern.search(text):
-        return text[::-1]
-    return text
-
+    pending = scheduler.pending()
+    if not pending:
+        return "⏳ No pending signals ⏳"
+    message = f"⏳ Pending Signals ({len(pending)}) ⏳\n\n"
+    for key, fire_at, json_data in pending:
+        fire_time = datetime.fromtimestamp(fire_at).strftime('%H:%M:%S')
+        currency = (json_data.get("currancy") or "Unknown").upper()
+        message += f"{key}: {currency} {json_data.get('action')} at {fire_time}\n"
+    return message
 
 
-def extract_data(message_text: str, chat_title: str) -> dict:
+def extract_data(message_text: str, chat_title: str, chat_id: int = None) -> dict:
     """
     Extracts trading signal data from Telegram messages in different formats.
-    Handle different time zones based on chat_title:
+    The format and time zone come from the chat's signal source (see
+    signal_sources.default_registry), resolved once per chat id:
     - "VIP SIGNAL №6": UTC+7, convert to UTC+2 (-5 hours)
     - "Martingale signals": UTC-4, convert to UTC+2 (+6 hours)
     - Other sources: No time conversion needed
     """
     global groups,on_prioritize_logic,priority_group
     processed_text = maybe_reverse(message_text)
-    if processed_text.strip().startswith("📱 WhatsApp Message:"):
-        whatsapp_data = extract_whatsapp_message(processed_text)
+    if processed_text.strip().startswith(WHATSAPP_HEADER):
+        whatsapp_data = signal_sources.sources["whatsapp"].parse(processed_text, chat_title)
         if whatsapp_data and whatsapp_data["currancy"] is not None:
             print("Extracted WhatsApp message data:", whatsapp_data)
             return whatsapp_data
         
     # Handle special command messages
+    # extract_data runs on the Telethon loop, so app calls go to tasks
     if processed_text.strip() == "/testtest":
-        try:
-            response = requests.get("http://localhost:5000/test")
-            print("Triggered test endpoint, response:", response.text)
-        except Exception as e:
-            print("Error triggering test endpoint:", e)
+        asyncio.ensure_future(call_app("/test"))
         return  # Skip further processing for this message
     
     if processed_text.strip() == "/kill":
-        try:
-            response = requests.get("http://localhost:5000/kill")
-            print("Triggered kill endpoint, response:", response.text)
-        except Exception as e:
-            print("Error triggering kill endpoint:", e)
-        try:
-            send_message_to_user("process killed")
-        except Exception as e:
-            print("Error sending kill message to group chat:", e)
+        asyncio.ensure_future(call_app("/kill", "process killed"))
         return  # Skip further processing for this message
         
     if processed_text.strip() == "/gb":
-        try:
-            response = requests.get("http://localhost:5000/get-balance")
-            print("Triggered kill endpoint, response:", response.text)
-            try:
-                message = "your current balance is" + str(response)
-                send_message_to_user(message)
-            except Exception as e:
-                print("Error sending kill message to group chat:", e)
-        except Exception as e:
-            print("Error triggering kill endpoint:", e)
+        asyncio.ensure_future(call_app("/get-balance", "your current balance is"))
         return  # Skip further processing for this message
     
     if processed_text.strip().startswith("/pri"):
@@ -306,9 +237,6 @@ def extract_data(message_text: str, chat_title: str) -> dict:
         except Exception as e:
             print("Error sending group message to group chat:", e)
         return
-    # Determine time conversion based on chat_title
-    time_conversion_hours = 0
-    source_timezone = "UTC+0"
     if on_prioritize_logic:
         print("in if on_prioritize_logic: ")
         if not chat_title.startswith(priority_group):
@@ -318,175 +246,10 @@ def extract_data(message_text: str, chat_title: str) -> dict:
             except Exception as e:
                 print("Error sending group message to group chat:", e)
             return
-    if "VIP SIGNAL №6" in chat_title:
-        time_conversion_hours = -5  # Convert from UTC+7 to UTC+2
-        source_timezone = "UTC+7"
-    elif "Martingale signals" in chat_title:
-        time_conversion_hours = 6  # Convert from UTC-4 to UTC+2
-        source_timezone = "UTC-4"
-    
-    # Check if "OTC" appears in the message
-    is_otc = "OTC" in processed_text
     
-    # --- Extract currency ---
-    currency = None
-    
-    # Check for currency pair with slash format (like BHD/CNY)
-    currency_match = re.search(r'([A-Z]{2,})/([A-Z]{2,})', processed_text, re.IGNORECASE)
-    if currency_match:
-        if is_otc:
-            # For OTC pairs like BHD/CNY OTC, use both parts
-            currency = (currency_match.group(1) + currency_match.group(2)).lower()
-        else:
-            # For regular pairs like EUR/USD
-            currency = (currency_match.group(1) + currency_match.group(2)).lower()
-    else:
-        # Try to extract single currency followed by OTC (like "Litecoin OTC")
-        otc_currency_match = re.search(r'^([A-Za-z0-9]+)\s+OTC', processed_text, re.IGNORECASE)
-        if otc_currency_match:
-            currency = otc_currency_match.group(1).lower()
-            is_otc = True
-        else:
-            # Extract currency from the first line for any message format
-            lines = processed_text.split('\n')
-            first_line = lines[0] if len(lines) > 0 else processed_text
-            
-            # Try to extract currency based on common patterns
-            # Pattern 1: Currency after emoji and space (like "🌎 US100")
-            emoji_pattern = re.compile(r'[\U00010000-\U0010ffff]', flags=re.UNICODE)
-            emojis = emoji_pattern.findall(first_line)
-            
-            if emojis:
-                # Split by emoji
-                parts = emoji_pattern.split(first_line)
-                if len(parts) > 1:
-                    # Get the text after the first emoji
-                    potential_currency = parts[1].strip()
-                    
-                    # Handle case where OTC is in the same part (like "EUR/USD OTC")
-                    if "OTC" in potential_currency:
-                        currency = potential_currency.split("OTC")[0].strip().lower()
-                        is_otc = True
-                    else:
-                        currency = potential_currency.lower()
-            
-            # Pattern 2: OTC specific extraction if not found yet
-            if currency is None and is_otc:
-                otc_match = re.search(r'[^\w]([A-Za-z0-9]+)[\s]+OTC', processed_text)
-                if otc_match:
-                    currency = otc_match.group(1).lower()
-
-    # --- Determine action ---
-    # For Hebrew: "למטה" means Sell, "למעלה" or "קנה" means Buy, "למכור" means Sell
-    # For English: check for "SELL" or "BUY" or emoji indicators
-    if "למטה" in processed_text or "למכור" in processed_text or "SELL" in processed_text.upper() or "🔴" in processed_text or "🟥" in processed_text:
-        action = "Sell"
-    elif ("למעלה" in processed_text or "BUY" in processed_text.upper() or "קנה" in processed_text or
-          "🟢" in processed_text or "🟩" in processed_text):
-        action = "Buy"
-    else:
-        action = None
-
-    # --- Extract bid wait time ---
-    # Accepts "תוקף", "תפוגה", or "Expiration" followed by a number.
-    bid_wait_time = None
-    time_match = re.search(r'(?:תוקף|תפוגה|Expiration)[^\d]*(\d+)M', processed_text, re.IGNORECASE)
-    if time_match:
-        minutes = time_match.group(1)
-        bid_wait_time = f"M{minutes}"
-    
-    # --- Extract martingale levels ---
-    # New pattern for Hebrew format with emoji numbers (e.g., "רמה 1️⃣ בשעה 19:30")
-    martingale_regex = re.compile(r'רמה\s+(?:\d️⃣|\d+)\s+בשעה\s+(\d{1,2}:\d{2})', re.UNICODE)
-    martingale_matches = martingale_regex.findall(processed_text)
-    
-    # Older patterns for fallback
-    levels_hebrew = re.findall(r'^(?=.*רמה)(?=.*בשעה).*$', processed_text, re.MULTILINE)
-    levels_english = re.findall(r'(\d+)️⃣\s+level(?:\s+\d+)?\s+at\s+(\d{1,2}:\d{2})', processed_text)
-    
-    if not levels_english:
-        # Try alternative pattern without emoji (just in case)
-        alt_levels = re.findall(r'level\s+(\d+)\s+at\s+(\d{1,2}:\d{2})', processed_text, re.IGNORECASE)
-        if alt_levels:
-            levels_english = alt_levels
-    
-    # Determine number of levels and times based on available matches
-    if martingale_matches:
-        levels = len(martingale_matches)
-        martingale_times = martingale_matches
-    elif levels_english:
-        levels = len(levels_english)
-        martingale_times = [time for _, time in levels_english]
-    else:
-        # Fallback to the older pattern if emoji pattern doesn't match
-        fallback_levels = re.findall(r'^(?=.*level)(?=.*at).*$', processed_text, re.IGNORECASE | re.MULTILINE)
-        levels = len(levels_hebrew) + len(fallback_levels)
-        martingale_times = []
-    
-    # --- Extract entry time ---
-    # Try Hebrew pattern first for the new formats
-    entry_match = re.search(r'כניסה\s+בשעה\s+(\d{1,2}:\d{2})', processed_text)
-    if not entry_match:
-        # Look for English "Entry at" pattern
-        entry_match = re.search(r'Entry at\s+(\d{1,2}:\d{2})', processed_text, re.IGNORECASE)
-    if not entry_match:
-        # Try with the emoji variant
-        entry_match = re.search(r'⏺️?\s*Entry at\s+(\d{1,2}:\d{2})', processed_text, re.IGNORECASE)
-    if not entry_match:
-        # Try simpler Hebrew pattern if previous patterns don't match
-        entry_match = re.search(r'כניסה(?:\s*בשעה)?\s*(\d{1,2}:\d{2})', processed_text)
-    
-    entry_time = None
-    if entry_match:
-        entry_time_str = entry_match.group(1)
-        try:
-            # Parse entry time
-            entry_time_obj = datetime.strptime(entry_time_str, '%H:%M')
-            
-            # Apply time zone conversion if needed
-            if time_conversion_hours != 0:
-                entry_time_obj = entry_time_obj + timedelta(hours=time_conversion_hours)
-            
-            # Format the adjusted time
-            entry_time = entry_time_obj.strftime('%H:%M')
-        except Exception as e:
-            print(f"Error converting entry time: {e}")
-            entry_time = entry_time_str
-    
-    # Convert martingale times based on source timezone
-    converted_martingale_times = []
-    for time_str in martingale_times:
-        try:
-            # Parse martingale time
-            martingale_time_obj = datetime.strptime(time_str, '%H:%M')
-            
-            # Apply time zone conversion if needed
-            if time_conversion_hours != 0:
-                martingale_time_obj = martingale_time_obj + timedelta(hours=time_conversion_hours)
-            
-            # Format the adjusted time
-            converted_martingale_times.append(martingale_time_obj.strftime('%H:%M'))
-        except Exception as e:
-            print(f"Error converting martingale time: {e}")
-            converted_martingale_times.append(time_str)
-            
-    result = {
-        "currancy": currency,
-        "action": action,
-        "levels": levels,
-        "bid_wait_time": bid_wait_time,
-        "entry_time": entry_time,
-        "source_chat": chat_title,
-        "is_otc": is_otc
-    }
-    
-    # Add martingale times if available
-    if converted_martingale_times:
-        result["martingale_times"] = converted_martingale_times
-        result["original_timezone"] = source_timezone
-        result["converted_to_utc_plus2"] = True
-        
-    return result
+    # Parse with the one grammar of the chat's signal source
+    source = signal_sources.resolve(chat_id, chat_title)
+    return source.parse(processed_text, chat_title)
 
 async def handle_bid_json(json_data: dict):
     """
@@ -528,45 +291,12 @@ async def handle_bid_json(json_data: dict):
     f"📈 Bid Gain: {bid_gain}\n"
     )
 
-    try:
-        await client.send_message(TARGET_JSON_CHAT, message)
-        print(f"Sent JSON bid message to {TARGET_JSON_CHAT}")
-    except Exception as e:
-        print(f"Error sending JSON bid message: {e}")
-
-def format_bid_message(data: dict) -> str:
-    """
-    Format the extracted data into a readable message to send to the target chat.
-    """
-    action_emoji = "🟢 BUY" if data["action"] == "Buy" else "🔴 SELL"
-    message = f"📊 עסקה בדרך!📊\n\n"
-    message += f"📊 Trading Signal Alert 📊\n\n"
-    
-    # Format currency display
-    currency_display = data['currancy'].upper() if data['currancy'] else 'Unknown'
+    # The result closes the chain's message started by handle_bid_lost
+    outbox.post(TARGET_JSON_CHAT, message, coalesce_key=loss_chain_key(json_data.get("signal_id")), close=True)
     
-    # Add OTC indicator if applicable
-    if data.get('is_otc', False):
-        message += f"💱 Pair: {currency_display} OTC\n"
-    else:
-        message += f"💱 Pair: {currency_display}\n"
-        
-    message += f"{action_emoji}\n"
-    message += f"⏱️ Expiration: {data['bid_wait_time']}\n"
-    message += f"⏰ Entry at: {data['entry_time']} (UTC+2)\n\n"
-    
-    if data.get("martingale_times"):
-        message += "🔄 Martingale Levels:\n"
-        for i, time in enumerate(data["martingale_times"], 1):
-            message += f"  Level {i}: {time}\n"
-    elif data.get("levels", 0) > 0:
-        message += f"🔄 Martingale Levels: {data['levels']}\n"
-    
-    # Add source chat information
-    if data.get("source_chat"):
-        message += f"\nSource: {data['source_chat']}"
-    
-    return message
+    trace = json_data.get("trace")
+    if trace:
+        hop_collector.record(stamp(trace, "result_received"))
 
 async def main():
     global telethon_loop
@@ -575,8 +305,19 @@ async def main():
     # Start the client (authenticate if necessary)
     await client.start()
     
+    # Only accept notifications once the client can send them
+    await notify_server.start("0.0.0.0", NOTIFY_PORT)
+    
     # Join the channel or group
     await client(JoinChannelRequest('kobeShay'))
+    
+    # Restore triggers from before a restart and re-arm them (the trading
+    # bot replaces queued signals with the same signal_id)
+    for signal_id, fire_at, json_data in scheduler.load():
+        print("Restored scheduled signal", signal_id)
+        await arm_signal(json_data)
+    asyncio.ensure_future(scheduler.run())
+    asyncio.ensure_future(outbox.run())
 
     # Handler for new messages in all chats
     @client.on(events.NewMessage())
@@ -586,14 +327,20 @@ async def main():
         chat_title = event.chat.title if hasattr(event.chat, 'title') else "Private chat"
         
         print(f"Message from: {chat_title} (ID: {chat_id})")
-        message_text = event.message.message
+        # Relayed messages carry the trace of their WhatsApp ingestion in a
+        # footer, other signals enter the system here
+        message_text, trace = split_footer(event.message.message)
+        if trace is None:
+            trace = new_trace()
+        stamp(trace, "telegram_posted", event.message.date.timestamp())
+        stamp(trace, "telebot_received")
         processed_text = maybe_reverse(message_text)
         print("New message received:")
         print(processed_text)
         
         if processed_text.strip() == "/kill":
             try:
-                response = requests.get("http://localhost:5000/kill")
+                response = await app_client.get("/kill")
                 print("Triggered kill endpoint, response:", response.text)
             except Exception as e:
                 print("Error triggering kill endpoint:", e)
@@ -602,7 +349,7 @@ async def main():
         
         if processed_text.strip() == "/gb":
             try:
-                response = requests.get("http://localhost:5000/get-balance")
+                response = await app_client.get("/get-balance")
                 # Parse the JSON response
                 data = response.json()
                 print("data is", data)
@@ -617,7 +364,7 @@ async def main():
         
         if processed_text.strip() == "/money":
             try:
-                response = requests.get("http://localhost:5000/get-current-gain")
+                response = await app_client.get("/get-current-gain")
                 # Parse the JSON response
                 data = response.json()
                 print("data is", data)
@@ -630,6 +377,58 @@ async def main():
             await send_message_to_user(message)
             return
         
+        if processed_text.strip() == "/queue":
+            try:
+                response = await app_client.get("/queue-stats")
+                data = response.json()
+                print("data is", data)
+                message = (
+                    f"📥 Signal Queue 📥\n\n"
+                    f"Pending: {data.get('depth')}/{data.get('capacity')}\n"
+                    f"Processing: {data.get('is_processing')}\n"
+                    f"Dropped: {data.get('dropped')}\n"
+                    f"Wait (avg/max): {data['wait_seconds']['avg']}s / {data['wait_seconds']['max']}s"
+                )
+            except Exception as e:
+                print("Error triggering queue-stats endpoint:", e)
+                message = "Error retrieving queue stats"
+            outbox_stats = outbox.stats()
+            message += (
+                f"\n\n📤 Outbox 📤\n\n"
+                f"Pending: {outbox_stats['depth']}\n"
+                f"Flood waits: {outbox_stats.get('flood_waits', 0)}"
+            )
+            await send_message_to_user(message)
+            return
+        
+        if processed_text.strip() == "/pending":
+            await send_message_to_user(format_pending_signals())
+            return
+        
+        if processed_text.strip() == "/latency":
+            await send_message_to_user(hop_collector.format())
+            return
+        
+        if processed_text.strip().startswith("/cancel"):
+            # Expected format: "/cancel <signal_id>"
+            parts = processed_text.strip().split()
+            if len(parts) < 2:
+                await send_message_to_user("Please provide a signal id, see /pending")
+            else:
+                # The trading bot may already hold it: queued, or prepared and waiting for /fire
+                scheduled = scheduler.cancel(parts[1])
+                try:
+                    response = await app_client.post("/cancel", json={"signal_id": parts[1]})
+                    armed = response.status_code == 200
+                except Exception as e:
+                    print("Error triggering cancel endpoint:", e)
+                    armed = False
+                if scheduled or armed:
+                    await send_message_to_user(f"Signal {parts[1]} cancelled")
+                else:
+                    await send_message_to_user(f"Signal {parts[1]} is not pending")
+            return
+        
         if processed_text.strip().startswith("/loss-limit"):
             # Expected format: "/loss-limit <limit_value>"
             parts = processed_text.strip().split()
@@ -639,7 +438,7 @@ async def main():
                 limit_value = parts[1]
                 try:
                     data = {"limit": limit_value}
-                    response = requests.post("http://localhost:5000/loss-limit", json=data)
+                    response = await app_client.post("/loss-limit", json=data)
                     print("Triggered loss-limit endpoint, response:", response.text)
                     await send_message_to_user(response.text)
                 except Exception as e:
@@ -653,16 +452,16 @@ async def main():
             help_message += "/kill - Terminate the process\n"
             help_message += "/gb - Get current balance\n"
             help_message += "/money - Show money earned today\n"  
+            help_message += "/queue - Show pending signals, drops and the outbox\n"
+            help_message += "/pending - Show scheduled signal triggers\n"
+            help_message += "/latency - Show where the seconds of a signal go\n"
+            help_message += "/cancel x - Cancel the scheduled signal x\n"
             help_message += "/pri x - taking deals only from x\n"  
             help_message += "/endP - cancel priority group\n"  
             help_message += "/groups - show the signals groups\n"
             help_message += "/gay - Show you gay"
             
-            try:
-                await client.send_message(TARGET_CHAT, help_message)
-                print(f"Sent help message to {TARGET_CHAT}")
-            except Exception as e:
-                print(f"Error sending help message: {e}")
+            outbox.post(TARGET_CHAT, help_message)
             return
         if processed_text.strip() == "/gay":
             try:
@@ -689,7 +488,7 @@ async def main():
                 print(f"Error sending image: {e}")
             return
         # Extract data from the message text, passing the chat_title
-        json_data = extract_data(processed_text, chat_title)
+        json_data = extract_data(processed_text, chat_title, chat_id)
         if json_data is None:
         # Early return if no data is extracted (e.g., kill command)
             return
@@ -706,54 +505,30 @@ async def main():
             bid_message = format_bid_message(json_data)
             
             # Send the bid details to the target chat
-            try:
-                await client.send_message(TARGET_CHAT, bid_message)
-                print(f"Sent bid details to {TARGET_CHAT}")
-            except Exception as e:
-                print(f"Error sending message to target chat: {e}")
+            outbox.post(TARGET_CHAT, bid_message)
             
-            # Parse the extracted entry time into a datetime object
-            now = datetime.now()
-            try:
-                # Assume the extracted entry time is in HH:MM 24-hour format
-                # (already converted to UTC+2 in extract_data)
-                entry_time_obj = datetime.strptime(json_data["entry_time"], '%H:%M')
-                # Set the date to today (assuming the entry is today)
-                entry_time_obj = entry_time_obj.replace(year=now.year, month=now.month, day=now.day)
-            except Exception as e:
-                print("Error parsing entry time:", e)
+            # Arm the trading bot right away so currency selection, payout
+            # read and amount prefill are done before the entry time
+            json_data["signal_id"] = f"{chat_id}:{event.message.id}"
+            json_data["trace"] = stamp(trace, "parsed")
+            if not await arm_signal(json_data):
                 return
             
-            # Calculate time difference in seconds between now and entry time
-            diff_seconds = (entry_time_obj - now).total_seconds()
-            print(f"Time until entry: {diff_seconds} seconds")
-            
-            # Calculate delay to trigger the external server: 10 seconds before entry time
-            delay = max(0, diff_seconds - 10)
-            
-            # Wait until 10 seconds before the entry time
-            await asyncio.sleep(delay)
+            # Assume the extracted entry time is in HH:MM 24-hour format
+            # (already converted to UTC+2 in extract_data) and is today
+            entry_ts = entry_deadline(json_data)
+            if entry_ts is None:
+                print("Error parsing entry time:", json_data["entry_time"])
+                return
+            print(f"Time until entry: {entry_ts - time.time()} seconds")
             
-            # Trigger the external server with the JSON data
-            try:
-                response = requests.post("http://localhost:5000/trigger", json=json_data)
-                response_text = response.text.strip()
-                print("Sent JSON to client, response:", response.text)
-                if response_text.lower() == "lost more then allowed, no more betting for today.":
-                    await send_message_to_user(response_text)
-            except Exception as e:
-                print("Error sending JSON:", e)
+            # Fire just before the entry time, only the Buy/Sell click is left
+            scheduler.schedule(json_data["signal_id"], entry_ts - FIRE_LEAD_SECONDS, json_data)
         else:
             print("Incomplete data. Not triggering the external server or sending notification.")
 
     print("Userbot is running. Press Ctrl+C to stop.")
     await client.run_until_disconnected()
 
-def run_flask():
-    app.run(host="0.0.0.0", port=5001)
-    
 if __name__ == '__main__':
-    flask_thread = threading.Thread(target=run_flask)
-    flask_thread.daemon = True
-    flask_thread.start()
     asyncio.run(main())
@@ -0,0 +1,171 @@
+import asyncio
+import collections
+import time
+
+from telethon.errors import FloodWaitError
+
+# Telegram's message length limit, longer coalesced messages start a new one
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramOutbox:
+    """
+    Single outgoing queue for the bot's Telegram messages.
+
+    Every chat has its own queue and token bucket, so a burst of result
+    messages in one chat never delays signal echoes in another. Each send
+    runs as its own task, one at a time per chat, so a send that Telethon
+    holds for a short FloodWait (under the client's flood_sleep_threshold)
+    only holds its chat. A FloodWait raised to the outbox pauses only the
+    chat it was raised for, and the message is retried after the wait.
+
+    Messages posted with the same coalesce_key are merged: while one is still
+    queued the new text is appended to it, and once it has been sent later
+    texts are added by editing that message (within coalesce_seconds). A
+    4-level loss chain therefore shows up as one message growing level by
+    level. Posting with close=True ends the group.
+    """
+
+    def __init__(self, client, rate_per_second=1.0, burst=3, coalesce_seconds=300):
+        """
+        Args:
+            client: Connected TelegramClient
+            rate_per_second: Sustained messages (or edits) per second per chat
+            burst: Messages a chat may send at once after being idle
+            coalesce_seconds: How long a sent message keeps collecting texts
+        """
+        self.client = client
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.coalesce_seconds = coalesce_seconds
+        self._queues = {}
+        self._buckets = {}
+        self._blocked_until = {}
+        self._open = {}
+        self._sending = {}  # chat -> its send task
+        self._wakeup = None
+        self._counters = collections.Counter()
+
+    def post(self, chat, text, coalesce_key=None, close=False):
+        """
+        Queue a message. Call from the client's loop; never waits.
+
+        Args:
+            chat: Target chat (id or username)
+            text: Message text
+            coalesce_key: Messages with the same key in the same chat are merged
+            close: Stop merging further messages into this key's group
+        """
+        queue = self._queues.setdefault(chat, collections.deque())
+        last = queue[-1] if queue else None
+        if len(queue) == 1 and chat in self._sending:
+            # Being sent: text added now would be dropped with it, queue it
+            # behind, it is merged by editing the sent message
+            last = None
+        if (coalesce_key is not None and last is not None and last["key"] == coalesce_key
+                and not last["close"] and len(last["text"]) + len(text) < MAX_MESSAGE_LENGTH):
+            last["text"] += "\n" + text
+            last["close"] = close
+            self._counters["coalesced"] += 1
+        else:
+            queue.append({"text": text, "key": coalesce_key, "close": close})
+        self._wake()
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the queue depth (total and per chat) and counters
+        """
+        per_chat = {str(chat): len(queue) for chat, queue in self._queues.items() if queue}
+        now = time.time()
+        return {
+            "depth": sum(per_chat.values()),
+            "per_chat": per_chat,
+            "flood_blocked": [str(chat) for chat, until in self._blocked_until.items() if until > now],
+            **self._counters,
+        }
+
+    async def run(self):
+        """Send queued messages forever. Run as a single task on the client loop."""
+        while True:
+            self._wakeup_event().clear()
+            now = time.time()
+            next_at = None
+            for chat, queue in list(self._queues.items()):
+                if not queue or chat in self._sending:
+                    continue
+                ready_at = max(self._blocked_until.get(chat, 0), self._token_ready_at(chat, now))
+                if ready_at <= now:
+                    # The task wakes the loop when it is done
+                    self._sending[chat] = asyncio.ensure_future(self._send_head(chat, queue))
+                    continue
+                if ready_at is not None:
+                    next_at = ready_at if next_at is None else min(next_at, ready_at)
+
+            timeout = None if next_at is None else max(0, next_at - time.time())
+            if timeout == 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup_event().wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_head(self, chat, queue):
+        item = queue[0]
+        self._take_token(chat)
+        try:
+            await self._deliver(chat, item)
+        except FloodWaitError as e:
+            # Keep the message at the head and retry after the wait
+            self._blocked_until[chat] = time.time() + e.seconds
+            self._counters["flood_waits"] += 1
+            print(f"Flood wait of {e.seconds}s for chat {chat}, {len(queue)} message(s) held")
+            return
+        except Exception as e:
+            self._counters["failed"] += 1
+            print(f"Error sending message to {chat}: {e}")
+        finally:
+            del self._sending[chat]
+            self._wake()
+        queue.popleft()
+
+    async def _deliver(self, chat, item):
+        key = item["key"]
+        open_message = self._open.get((chat, key)) if key is not None else None
+        now = time.time()
+        if (open_message is not None and now - open_message["at"] <= self.coalesce_seconds
+                and len(open_message["text"]) + len(item["text"]) < MAX_MESSAGE_LENGTH):
+            text = open_message["text"] + "\n" + item["text"]
+            await self.client.edit_message(chat, open_message["message"], text)
+            open_message.update(text=text, at=now)
+            self._counters["edited"] += 1
+            print(f"Edited message in {chat}")
+        else:
+            message = await self.client.send_message(chat, item["text"])
+            self._counters["sent"] += 1
+            print(f"Sent message to {chat}")
+            if key is not None:
+                self._open[(chat, key)] = {"message": message, "text": item["text"], "at": now}
+        if key is not None and item["close"]:
+            self._open.pop((chat, key), None)
+
+    def _token_ready_at(self, chat, now):
+        tokens, updated = self._buckets.get(chat, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate_per_second)
+        self._buckets[chat] = (tokens, now)
+        if tokens >= 1:
+            return now
+        return now + (1 - tokens) / self.rate_per_second
+
+    def _take_token(self, chat):
+        tokens, updated = self._buckets[chat]
+        self._buckets[chat] = (tokens - 1, updated)
+
+    def _wakeup_event(self):
+        # Created lazily so it belongs to the client's loop
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def _wake(self):
+        self._wakeup_event().set()
@@ -0,0 +1,204 @@
+import collections
+import contextlib
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    """One timed operation: its parent, attributes and WebDriver commands."""
+
+    __slots__ = ("id", "parent", "name", "thread", "start", "duration", "attrs",
+                 "commands", "commands_total", "error")
+
+    def __init__(self, span_id, parent, name, attrs):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+        self.commands = 0  # WebDriver commands issued in this span itself
+        self.commands_total = 0  # ... and in its children
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "parent": self.parent.id if self.parent is not None else None,
+            "name": self.name,
+            "thread": self.thread,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "commands": self.commands,
+            "commands_total": self.commands_total,
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """
+    Nested spans per thread, kept in memory and exported as JSONL or in the
+    Chrome trace-event format (chrome://tracing, Perfetto) for flame graphs.
+
+    A span's parent is the innermost open span of its thread, or the span
+    adopted with adopt(): DriverActor runs submitted functions under the
+    caller's span, so spans of Clicker methods executed on the actor thread
+    nest under the trading thread's. command() counts a WebDriver command on
+    the current span; on close a span adds its total to its parent's and is
+    passed to every function in listeners, on the thread that ran it.
+    """
+
+    def __init__(self, capacity=20000):
+        """
+        Args:
+            capacity: Finished spans kept for export
+        """
+        self.enabled = True
+        self.listeners = []
+        self._local = threading.local()
+        self._counter = itertools.count(1)
+        self._finished = collections.deque(maxlen=capacity)
+        self._written = 0  # spans finished before the writer's last flush
+        self._finished_count = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Innermost open span of this thread (or the adopted one), None if there is none."""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            return stack[-1]
+        return getattr(self._local, "adopted", None)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Time the block as a span named name, with attrs."""
+        if not self.enabled:
+            yield None
+            return
+        span = Span(next(self._counter), self.current(), name, attrs)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            stack.pop()
+            span.commands_total += span.commands
+            if span.parent is not None:
+                span.parent.commands_total += span.commands_total
+            with self._lock:
+                self._finished.append(span)
+                self._finished_count += 1
+            for listener in self.listeners:
+                try:
+                    listener(span)
+                except Exception as e:
+                    print(f"Error in span listener: {e}")
+
+    @contextlib.contextmanager
+    def adopt(self, parent):
+        """Parent the spans this thread opens in the block to parent (from another thread)."""
+        previous = getattr(self._local, "adopted", None)
+        self._local.adopted = parent
+        try:
+            yield
+        finally:
+            self._local.adopted = previous
+
+    def annotate(self, **attrs):
+        """Add attributes to the current span."""
+        span = self.current()
+        if span is not None:
+            span.attrs.update(attrs)
+
+    def command(self):
+        """Count a WebDriver command on the current span."""
+        span = self.current()
+        if span is not None:
+            span.commands += 1
+
+    def spans(self, since=0):
+        """Finished spans, oldest first, that finished after the first since ones."""
+        with self._lock:
+            spans = list(self._finished)
+            skip = max(0, since - (self._finished_count - len(spans)))
+            return spans[skip:], self._finished_count
+
+    def export_jsonl(self, path, since=0):
+        """
+        Append finished spans to a JSONL file.
+
+        Returns:
+            Count to pass as since next time, so that every span is written once
+        """
+        spans, count = self.spans(since)
+        try:
+            with open(path, "a", encoding="utf-8") as file:
+                for span in spans:
+                    file.write(json.dumps(span.as_dict(), ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            print(f"Error writing trace: {e}")
+            return since
+        return count
+
+    def chrome_trace(self):
+        """Finished spans as a Chrome trace-event JSON object."""
+        spans, _ = self.spans()
+        threads = {}
+        events = []
+        for span in spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            events.append({
+                "name": span.name, "cat": span.name.split(".")[0], "ph": "X", "pid": os.getpid(), "tid": tid,
+                "ts": round(span.start * 1e6), "dur": round(span.duration * 1e6),
+                "args": dict(span.attrs, commands=span.commands, commands_total=span.commands_total,
+                             parent=span.parent.id if span.parent is not None else None, error=span.error),
+            })
+        for thread, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def start_writer(self, path, interval=5.0):
+        """Append new spans to path every interval seconds, in the background."""
+        def write():
+            while True:
+                time.sleep(interval)
+                self._written = self.export_jsonl(path, self._written)
+
+        threading.Thread(target=write, name="trace-writer", daemon=True).start()
+
+
+# The process-wide tracer
+tracer = Tracer()
+
+
+def traced(name=None):
+    """Decorator: run the function in a span, named after it by default."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_methods(cls):
+    """Class decorator: trace every public method defined by cls as "<Class>.<method>"."""
+    for attribute, value in list(vars(cls).items()):
+        if not attribute.startswith("_") and inspect.isfunction(value):
+            setattr(cls, attribute, traced(f"{cls.__name__}.{attribute}")(value))
+    return cls
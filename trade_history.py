@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+from deal_tracker import NUMBER_PATTERN, row_signature
+
+
+def payout_of(text):
+    """Amount paid out by a closed deal, e.g. 7.6 for "₪7.60", 0.0 for a loss."""
+    numbers = NUMBER_PATTERN.findall((text or "").replace(",", ""))
+    return float(numbers[0]) if numbers else 0.0
+
+
+class TradeHistory:
+    """
+    Local store of the account's closed deals.
+
+    Every Closed list row read by a session (incrementally, or in bulk by
+    Clicker.harvest_closed_deals) is appended once to a JSONL journal, keyed
+    by its identity, so the same row read again or by another session is not
+    stored twice. Rows matched to a deal the bot placed also get that deal's
+    amount, action and owner, which is what reconcile() compares
+    session_gain against. The journal is replayed by load().
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Path of the JSONL journal file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._rows = {}  # key -> record, in the order rows were first seen
+
+    def load(self):
+        """
+        Replay the journal.
+
+        Returns:
+            Number of rows restored
+        """
+        if not os.path.exists(self.path):
+            return 0
+        with self._lock, open(self.path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash, ignore it
+                    continue
+                if record.get("op") == "row":
+                    self._rows.setdefault(record["key"], record)
+                elif record.get("op") == "deal" and record.get("key") in self._rows:
+                    self._rows[record["key"]]["deal"] = record["deal"]
+            return len(self._rows)
+
+    def add(self, rows, source="poll"):
+        """
+        Store the rows that are not stored yet.
+
+        Args:
+            rows: Closed list rows (dicts with key or id, asset, time, values, result)
+            source: "poll", "harvest" or "baseline", kept with the row
+
+        Returns:
+            Number of new rows
+        """
+        now = time.time()
+        records = []
+        with self._lock:
+            for row in rows:
+                key = self._key(row)
+                if key in self._rows:
+                    continue
+                record = {
+                    "op": "row", "key": key, "asset": row.get("asset"), "time": row.get("time"),
+                    "values": row.get("values") or [], "result": row.get("result"),
+                    "seen_at": now, "source": source, "deal": None,
+                }
+                self._rows[key] = record
+                records.append(record)
+            self._append(records)
+        return len(records)
+
+    def attach_deal(self, row, deal):
+        """Record which of the bot's deals a stored row is."""
+        summary = {
+            "amount": deal["amount"], "action": deal["action"], "owner": deal["owner"],
+            "opened_at": deal["opened_at"], "settled_at": deal["settled_at"],
+        }
+        with self._lock:
+            record = self._rows.get(self._key(row))
+            if record is None:
+                return
+            record["deal"] = summary
+            self._append([{"op": "deal", "key": record["key"], "deal": summary}])
+
+    def reconcile(self, since=0):
+        """
+        The site's own results for the bot's deals settled since a time.
+
+        Args:
+            since: Epoch seconds, e.g. when this session started
+
+        Returns:
+            Dictionary with the number of deals, wins and losses and
+            site_gain, the sum of payout minus amount
+        """
+        deals = wins = 0
+        site_gain = 0.0
+        with self._lock:
+            for record in self._rows.values():
+                deal = record.get("deal")
+                if deal is None or (deal.get("settled_at") or 0) < since:
+                    continue
+                payout = payout_of(record["result"])
+                deals += 1
+                wins += payout > 0
+                site_gain += payout - deal["amount"]
+        return {"deals": deals, "wins": wins, "losses": deals - wins, "site_gain": round(site_gain, 2)}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": len(self._rows),
+                "with_deal": sum(1 for record in self._rows.values() if record.get("deal")),
+            }
+
+    @staticmethod
+    def _key(row):
+        key = row.get("key") or row_signature(row)
+        return key if isinstance(key, str) else json.dumps(key, ensure_ascii=False)
+
+    def _append(self, records):
+        if not records:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as journal:
+                for record in records:
+                    journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Error writing trade history: {e}")
@@ -6,6 +6,7 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from correlation import HEADER, new_trace, stamp
 
 # -------------------- WhatsApp Bot Logic --------------------
 
@@ -56,9 +57,12 @@ async def monitor_whatsapp(driver):
         if message and message not in processed_messages:
             print("New message detected:")
             print(message)
+            # The signal enters the system here: its correlation id follows it to the settled deal
+            trace = stamp(new_trace(), "whatsapp_seen")
             try:
                 # Send to cloud relay server instead of localhost
-                response = requests.post(RELAY_SERVER_URL, json=message)
+                response = requests.post(RELAY_SERVER_URL, json={"text": message, "trace": trace},
+                                         headers={HEADER: trace["id"]})
                 print(f"Sent message to relay server, response: {response.status_code}")
                 if response.status_code != 200:
                     print(f"Error response: {response.text}")